@@ -0,0 +1,189 @@
+"""Account lookup, password hashing policy, session tokens and rate limits.
+
+* ``find_accounts()`` resolves an email against teachers and students in one
+  indexed query through the ``accounts`` view.
+* Passwords are hashed with the method in PASSWORD_HASH_METHOD; hashes made
+  with any other parameters are upgraded transparently on the next login.
+* ``issue_token()``/``verify_token()`` give dashboards a signed, expiring
+  session token instead of keeping credentials around. The token names the
+  account's school, which selects the database its requests use.
+* ``RateLimiter`` caps failed login attempts per IP and per account so
+  brute-force traffic is rejected before any hashing work is done. Only
+  failures count, since a whole school may log in through one proxy
+  address. Limits are kept in process memory, i.e. per gunicorn worker.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import metrics
+from db import get_db, transaction, DEFAULT_TENANT
+
+# Any werkzeug method string, e.g. "scrypt" or "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+# Concurrent hash verifications per worker; the rest wait briefly or get 503
+MAX_CONCURRENT_VERIFICATIONS = int(os.environ.get('MAX_CONCURRENT_VERIFICATIONS', os.cpu_count() or 1))
+VERIFICATION_WAIT_SECONDS = 2
+
+TOKEN_MAX_AGE = int(os.environ.get('SESSION_TOKEN_MAX_AGE', 12 * 3600))
+TOKEN_SALT = 'session-token'
+
+_method_prefix = None
+_verification_slots = threading.BoundedSemaphore(MAX_CONCURRENT_VERIFICATIONS)
+
+
+class VerificationBusy(Exception):
+    """Raised when every verification slot stayed busy"""
+
+
+def hash_password(password):
+    """Hash a password with the configured policy"""
+    with metrics.timed('hash'):
+        return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def _policy_prefix():
+    """The fully expanded method string hashes should start with"""
+    global _method_prefix
+    if _method_prefix is None:
+        _method_prefix = hash_password('').split('$', 1)[0]
+    return _method_prefix
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _policy_prefix()
+
+
+def verify_password(password_hash, password):
+    """Check a password, holding one of the bounded verification slots"""
+    if not _verification_slots.acquire(timeout=VERIFICATION_WAIT_SECONDS):
+        raise VerificationBusy()
+    try:
+        with metrics.timed('hash'):
+            return check_password_hash(password_hash, password)
+    finally:
+        _verification_slots.release()
+
+
+ACCOUNT_COLUMNS = ('role', 'account_id', 'name', 'email', 'password_hash', 'class', 'section', 'roll_no')
+
+
+FIND_ACCOUNTS_QUERY = f'''
+    SELECT {', '.join(ACCOUNT_COLUMNS)} FROM accounts WHERE email = ?
+    ORDER BY role = 'student'
+'''
+
+
+def find_accounts(email):
+    """Return teacher then student accounts registered with an email"""
+    cursor = get_db().cursor()
+    cursor.execute(FIND_ACCOUNTS_QUERY, (email,))
+    return [dict(zip(ACCOUNT_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def find_account(role, account_id):
+    """Return one account by role and ID, or None"""
+    cursor = get_db().cursor()
+    cursor.execute(f'''
+        SELECT {', '.join(ACCOUNT_COLUMNS)} FROM accounts
+        WHERE role = ? AND account_id = ?
+    ''', (role, account_id))
+    row = cursor.fetchone()
+    return dict(zip(ACCOUNT_COLUMNS, row)) if row else None
+
+
+def rehash(account, password):
+    """Store a fresh hash for an account made under an older policy"""
+    with transaction() as cursor:
+        if account['role'] == 'teacher':
+            cursor.execute('UPDATE teachers SET password_hash = ? WHERE id = ?',
+                           (hash_password(password), account['account_id']))
+        else:
+            cursor.execute('UPDATE students SET password_hash = ? WHERE student_id = ?',
+                           (hash_password(password), account['account_id']))
+
+
+def _serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT)
+
+
+def issue_token(secret_key, account, tenant=DEFAULT_TENANT):
+    """Sign a session token identifying an account and its school"""
+    return _serializer(secret_key).dumps({'role': account['role'], 'id': account['account_id'], 'tenant': tenant})
+
+
+def verify_token(secret_key, token):
+    """Return the {role, id, tenant} in a valid token, or None"""
+    try:
+        session_account = _serializer(secret_key).loads(token, max_age=TOKEN_MAX_AGE)
+    except (BadSignature, SignatureExpired):
+        return None
+    # Tokens issued before schools had their own databases belong to the default one
+    session_account.setdefault('tenant', DEFAULT_TENANT)
+    return session_account
+
+
+class RateLimiter:
+    """Sliding-window counter of events per key"""
+
+    def __init__(self, limit, window_seconds):
+        self.limit = limit
+        self.window = window_seconds
+        self._events = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _prune(self, events, now):
+        while events and events[0] <= now - self.window:
+            events.popleft()
+
+    def retry_after(self, key):
+        """Seconds until key may try again, or 0 if it is under the limit"""
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(key)
+            if not events:
+                return 0
+            self._prune(events, now)
+            if len(events) < self.limit:
+                return 0
+            return max(1, int(events[0] + self.window - now) + 1)
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.setdefault(key, deque())
+            self._prune(events, now)
+            events.append(now)
+            if now - self._last_sweep > self.window:
+                self._sweep(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+    def _sweep(self, now):
+        # Drop idle keys so memory stays bounded under spraying attacks
+        for key in [k for k, events in self._events.items() if not events or events[-1] <= now - self.window]:
+            del self._events[key]
+        self._last_sweep = now
+
+
+# Failed logins count against the client IP and the account
+ip_limiter = RateLimiter(int(os.environ.get('LOGIN_FAILURES_PER_IP', 100)), 60)
+account_limiter = RateLimiter(int(os.environ.get('LOGIN_FAILURES_PER_ACCOUNT', 5)), 300)
+
+
+def throttle(client_ip, email):
+    """Seconds a login attempt must wait, or 0"""
+    return max(ip_limiter.retry_after(client_ip), account_limiter.retry_after(email))
+
+
+def login_failed(client_ip, email):
+    ip_limiter.hit(client_ip)
+    account_limiter.hit(email)
@@ -0,0 +1,260 @@
+"""Attendance analytics over a class's whole history: absence streaks and at-risk students.
+
+``load_history()`` reads every present mark of a teacher's students in one
+query and packs it into a bitset per student, one bit per school day of the
+class's calendars (see school_calendar), as a ``History``. ``compute()``
+then works out streaks, rolling percentages and class comparisons for the
+whole class at once with NumPy, where answering the same questions in SQL
+takes several queries per student. Streaks and percentages count only the
+school days of each student's own calendar.
+
+Histories stop at the day before today, so during the day only roster and
+calendar edits change them. They are cached per school, teacher and day,
+keyed by the roster and school-day index versions, and the first request
+each morning loads them again; thresholds and the rolling window are
+applied per request on top of the cached bits. Offline scans synced late
+for an earlier day show up the next morning, or straight away with
+``refresh=True``.
+
+A student counts from the earlier of their enrolment (``created_at``) and
+their first mark, so students who joined mid-year are not flagged for the
+days before they arrived, and one never marked present is absent on every
+school day since enrolment.
+"""
+import os
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+import metrics
+from db import get_db, current_tenant
+from school_calendar import calendar_of, index_version
+from student_cache import LocalCache
+from student_routes import roster_version
+
+# A student is at risk after this many school days absent in a row, or with
+# overall or recent attendance below AT_RISK_PERCENTAGE
+AT_RISK_STREAK = int(os.environ.get('AT_RISK_STREAK', 3))
+AT_RISK_PERCENTAGE = float(os.environ.get('AT_RISK_PERCENTAGE', 75))
+
+# School days (of any of the class's calendars) in the rolling ("recent")
+# attendance percentage
+ANALYTICS_WINDOW = int(os.environ.get('ANALYTICS_WINDOW', 20))
+
+# Class histories kept per process; each is replaced the next school day
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', 256))
+
+# Bit per student per school day, packed 8 days to a byte along each row.
+# dates is every school day of any of the class's calendars; scheduled has a
+# row of bits per calendar and calendar_of picks each student's row.
+History = namedtuple('History', ('students', 'dates', 'bits', 'scheduled', 'calendar_of', 'enrolled_from'))
+
+Metrics = namedtuple('Metrics', (
+    'present', 'possible', 'percentage', 'recent_percentage', 'previous_percentage',
+    'current_streak', 'longest_streak', 'groups', 'group_of', 'class_percentage',
+    'class_recent_percentage'))
+
+histories = LocalCache(ANALYTICS_CACHE_SIZE, 24 * 3600)
+
+
+def load_history(cursor, teacher_id, as_of):
+    """Pack a teacher's students' present marks up to as_of into a History"""
+    cursor.execute('''
+        SELECT student_id, name, class, section, roll_no, substr(created_at, 1, 10)
+        FROM students WHERE teacher_id = ? ORDER BY student_id
+    ''', (teacher_id,))
+    students = cursor.fetchall()
+    # One row per student with all of their marks, read from the present-marks index
+    cursor.execute('''
+        SELECT a.student_id, COUNT(*), group_concat(a.date) FROM attendance a
+        JOIN students s ON s.student_id = a.student_id
+        WHERE s.teacher_id = ? AND a.status = 'present' AND a.date <= ?
+        GROUP BY a.student_id
+    ''', (teacher_id, as_of.isoformat()))
+    marks = cursor.fetchall()
+    if marks:
+        marked_ids, counts, marked_dates = zip(*marks)
+        marked = np.array(','.join(marked_dates).split(','), dtype='datetime64[D]')
+    else:
+        marked = np.array([], dtype='datetime64[D]')
+    created = np.array([row[5] or as_of.isoformat() for row in students], dtype='datetime64[D]')
+    # From the earliest enrolment or mark, so a student who was never marked
+    # present still has every school day since they joined counted as absent
+    start = np.concatenate([created, marked, [np.datetime64(as_of, 'D')]]).min()
+
+    # Each class/section's calendar, and its school days since then
+    sections = sorted({(row[2], row[3]) for row in students})
+    calendar_for = {key: tuple(calendar_of(cursor, *key)) for key in sections}
+    calendars = sorted(set(calendar_for.values()))
+    schedules = []
+    for class_name, section in calendars:
+        cursor.execute('''
+            SELECT group_concat(date) FROM school_days
+            WHERE class = ? AND section = ? AND date BETWEEN ? AND ?
+        ''', (class_name, section, str(start), as_of.isoformat()))
+        days = cursor.fetchone()[0]
+        schedules.append(np.array(days.split(','), dtype='datetime64[D]') if days
+                         else np.array([], dtype='datetime64[D]'))
+    dates = np.unique(np.concatenate(schedules)) if schedules else np.array([], dtype='datetime64[D]')
+    scheduled = np.zeros((len(calendars), len(dates)), dtype=bool)
+    for k, days in enumerate(schedules):
+        scheduled[k, np.searchsorted(dates, days)] = True
+
+    presence = np.zeros((len(students), len(dates)), dtype=bool)
+    if marks and len(dates):
+        # Rows are in student_id order, so each student's row is a binary search;
+        # marks on days no calendar has school are dropped
+        ids = np.array([row[0] for row in students])
+        rows = np.repeat(np.searchsorted(ids, np.array(marked_ids)), counts)
+        columns = np.minimum(np.searchsorted(dates, marked), len(dates) - 1)
+        school = dates[columns] == marked
+        presence[rows[school], columns[school]] = True
+
+    enrolled = np.searchsorted(dates, created)
+    first_mark = np.full(len(students), len(dates))
+    if len(dates):
+        first_mark = np.where(presence.any(axis=1), presence.argmax(axis=1), len(dates))
+    calendar_index = {calendar: k for k, calendar in enumerate(calendars)}
+    return History(students, dates, np.packbits(presence, axis=1), np.packbits(scheduled, axis=1),
+                   np.array([calendar_index[calendar_for[(row[2], row[3])]] for row in students], dtype=int),
+                   np.minimum(enrolled, first_mark))
+
+
+def percentages(present, possible):
+    """Rounded percentages, NaN where there were no school days"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(possible > 0, np.round(present * 100.0 / possible, 1), np.nan)
+
+
+def compute(history, window=ANALYTICS_WINDOW):
+    """Streaks, overall and rolling percentages and class averages for every student"""
+    days = len(history.dates)
+    presence = np.unpackbits(history.bits, axis=1, count=days).astype(bool)
+    scheduled = np.unpackbits(history.scheduled, axis=1, count=days).astype(bool)
+    index = np.arange(days)
+    # School days of each student's own calendar since they enrolled
+    expected = scheduled[history.calendar_of] & (index >= history.enrolled_from[:, None])
+    attended = presence & expected
+    absent = expected & ~presence
+
+    # Streaks count the student's own school days, so a day only another
+    # calendar has school neither breaks nor lengthens one: own_days is how
+    # many have passed by each column, last_break the last one attended
+    own_days = expected.cumsum(axis=1)
+    last_break = np.maximum.accumulate(np.where(attended, index, -1), axis=1)
+    padded = np.concatenate([np.zeros((len(presence), 1), dtype=int), own_days], axis=1)
+    since_break = own_days - np.take_along_axis(padded, last_break + 1, axis=1)
+    longest = np.where(absent, since_break, 0).max(axis=1, initial=0)
+    current = since_break[:, -1] if days else np.zeros(len(presence), dtype=int)
+
+    # Prefix sums give any window's totals with one subtraction
+    cumulative_present = np.concatenate([np.zeros((len(presence), 1), dtype=int),
+                                         attended.cumsum(axis=1)], axis=1)
+    cumulative_possible = np.concatenate([np.zeros((len(presence), 1), dtype=int), own_days], axis=1)
+
+    def window_totals(cumulative, end):
+        return cumulative[:, end] - cumulative[:, max(end - window, 0)]
+
+    present = cumulative_present[:, days]
+    possible = cumulative_possible[:, days]
+    recent_present = window_totals(cumulative_present, days)
+    recent_possible = window_totals(cumulative_possible, days)
+    earlier = max(days - window, 0)
+    previous = percentages(window_totals(cumulative_present, earlier),
+                           window_totals(cumulative_possible, earlier))
+
+    # Class/section averages, pooled over the students in each
+    sections = np.array([(row[2], row[3]) for row in history.students], dtype=str).reshape(-1, 2)
+    groups, group_of = np.unique(sections, axis=0, return_inverse=True)
+    group_of = group_of.reshape(-1)
+
+    def pooled(values):
+        return np.bincount(group_of, weights=values, minlength=len(groups))
+
+    return Metrics(present, possible, percentages(present, possible),
+                   percentages(recent_present, recent_possible), previous, current, longest,
+                   groups, group_of, percentages(pooled(present), pooled(possible)),
+                   percentages(pooled(recent_present), pooled(recent_possible)))
+
+
+def class_history(teacher_id, as_of, refresh=False):
+    """The cached History for a teacher's class, loading it on a miss"""
+    cursor = get_db().cursor()
+    key = (f'analytics:{current_tenant()}:{teacher_id}:{as_of}:{roster_version(cursor, teacher_id)}:'
+           f'{index_version(cursor)}')
+    history = None if refresh else histories.get(key)
+    if history is None:
+        history = load_history(cursor, teacher_id, as_of)
+        if ANALYTICS_CACHE_SIZE:
+            histories.put(key, history)
+    return history
+
+
+def _number(value):
+    return None if np.isnan(value) else float(value)
+
+
+def at_risk(teacher_id, streak=AT_RISK_STREAK, threshold=AT_RISK_PERCENTAGE,
+            window=ANALYTICS_WINDOW, everyone=False, refresh=False, today=None):
+    """At-risk students in a teacher's class (or every student) with the class averages"""
+    as_of = (today or date.today()) - timedelta(days=1)
+    with metrics.timed('analytics'):
+        history = class_history(teacher_id, as_of, refresh)
+        result = compute(history, window)
+
+    reasons = {
+        'absence_streak': result.current_streak >= streak,
+        'low_attendance': result.percentage < threshold,
+        'recent_drop': result.recent_percentage < threshold,
+    }
+    flagged = np.logical_or.reduce(list(reasons.values()))
+    group_flagged = np.bincount(result.group_of, weights=flagged, minlength=len(result.groups))
+
+    # Longest current streak first, then lowest attendance
+    order = np.lexsort((np.nan_to_num(result.percentage, nan=101.0), -result.current_streak))
+    students = []
+    for i in order:
+        if not (everyone or flagged[i]):
+            continue
+        student_id, name, class_name, section, roll_no, _ = history.students[i]
+        group = result.group_of[i]
+        percentage = _number(result.percentage[i])
+        class_percentage = _number(result.class_percentage[group])
+        students.append({
+            'student_id': student_id,
+            'name': name,
+            'class': class_name,
+            'section': section,
+            'roll_no': roll_no,
+            'at_risk': bool(flagged[i]),
+            'reasons': [reason for reason, hit in reasons.items() if hit[i]],
+            'current_streak': int(result.current_streak[i]),
+            'longest_streak': int(result.longest_streak[i]),
+            'present': int(result.present[i]),
+            'school_days': int(result.possible[i]),
+            'percentage': percentage,
+            'recent_percentage': _number(result.recent_percentage[i]),
+            'previous_percentage': _number(result.previous_percentage[i]),
+            'class_percentage': class_percentage,
+            'vs_class': (round(percentage - class_percentage, 1)
+                         if percentage is not None and class_percentage is not None else None),
+        })
+
+    return {
+        'teacher_id': teacher_id,
+        'from': str(history.dates[0]) if len(history.dates) else None,
+        'as_of': str(history.dates[-1]) if len(history.dates) else None,
+        'school_days': len(history.dates),
+        'window': window,
+        'thresholds': {'streak': streak, 'percentage': threshold},
+        'classes': [{
+            'class': str(class_name),
+            'section': str(section),
+            'students': int(np.count_nonzero(result.group_of == g)),
+            'at_risk': int(group_flagged[g]),
+            'percentage': _number(result.class_percentage[g]),
+            'recent_percentage': _number(result.class_recent_percentage[g]),
+        } for g, (class_name, section) in enumerate(result.groups)],
+        'students': students,
+    }
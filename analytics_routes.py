@@ -0,0 +1,27 @@
+"""Attendance analytics: absence streaks and at-risk students per class"""
+import logging
+
+from flask import Blueprint, request, jsonify
+
+bp = Blueprint('analytics', __name__)
+
+@bp.route('/analytics/at_risk/<int:teacher_id>', methods=['GET'])
+def at_risk(teacher_id):
+    """Students on an absence streak or below the attendance threshold, with class averages"""
+    try:
+        # NumPy loads with the first analytics request, not at startup
+        import analytics
+        
+        streak = request.args.get('streak', analytics.AT_RISK_STREAK, type=int)
+        threshold = request.args.get('threshold', analytics.AT_RISK_PERCENTAGE, type=float)
+        window = request.args.get('window', analytics.ANALYTICS_WINDOW, type=int)
+        if streak < 1 or window < 1 or not 0 <= threshold <= 100:
+            return jsonify({'error': 'streak and window must be positive, threshold 0-100'}), 400
+        
+        everyone = request.args.get('all', '').lower() in ('1', 'true')
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true')
+        return jsonify(analytics.at_risk(teacher_id, streak, threshold, window, everyone, refresh)), 200
+    
+    except Exception as e:
+        logging.error(f"Error computing at-risk students: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,366 @@
+"""ASGI entry point serving the same API from an asyncio event loop.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The endpoints scanners and dashboards hit all day - login, mark_attendance,
+weekly_report, generate_qr, the /events stream - and the sheet upload are
+async handlers on aiosqlite (see async_db.py), so one process can hold
+thousands of open connections while they wait on the database. CPU-bound work leaves the
+event loop: password checks run in the thread pool (hashlib releases the
+GIL), QR rendering in the shared process pool and sheet imports on the
+background job runner (jobs.py).
+
+Every other route is served by the Flask app in app.py through a WSGI
+adapter, which runs it on a worker thread, so both entry points expose the
+same API and share the school databases, migrations and mail queues. Each
+async route runs against the caller's school (``tenant_route``), resolved
+the same way as in app.py.
+"""
+import os
+import base64
+import asyncio
+import logging
+import functools
+import time
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route, Mount
+
+import accounts
+import db
+import events
+import metrics
+import qr_cache
+import qr_tokens
+import student_cache
+from async_db import pools
+from student_import import check_extension, InvalidSheetError
+from workers import get_process_pool
+from app import app as flask_app
+from attendance_routes import weekly_report_body, WEEKLY_ATTENDANCE_QUERY, scan_student_id
+from auth_routes import complete_login
+from qr_routes import qr_response_etag, qr_response_body
+from student_routes import sheet_upload_path, queue_sheet_import
+from web import resolve_tenant, qr_signer, forwarded_client, may_view_student
+
+# Threads the WSGI adapter runs Flask routes on
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 16))
+
+
+def error(message, status, headers=None):
+    return JSONResponse({'error': message}, status, headers)
+
+
+async def json_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def etag_matches(header, key):
+    tags = {tag.strip().removeprefix('W/').strip('"') for tag in header.split(',')}
+    return key in tags or '*' in tags
+
+
+def session_account(request):
+    """{role, id, tenant} from the bearer token (or ?token= for EventSource), or None"""
+    token = request.query_params.get('token')
+    header = request.headers.get('authorization', '')
+    if header.startswith('Bearer '):
+        token = header[len('Bearer '):]
+    return accounts.verify_token(flask_app.secret_key, token) if token else None
+
+
+def tenant_route(handler):
+    """Run an async route against the caller's school database"""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        requested = request.headers.get('x-school') or request.query_params.get('school')
+        try:
+            tenant = resolve_tenant(session_account(request), requested)
+        except db.UnknownTenant:
+            return error('Unknown school', 404)
+        token = db.set_tenant(tenant)
+        try:
+            return await handler(request)
+        finally:
+            db.reset_tenant(token)
+    return wrapper
+
+
+@tenant_route
+async def login(request):
+    """Login for both teachers and students"""
+    try:
+        data = await json_body(request)
+        email = data.get('email')
+        password = data.get('password')
+
+        if not all([email, password]):
+            return error('Email and password are required', 400)
+
+        # Reject throttled clients before doing any hashing work
+        client_ip = forwarded_client(request.headers.get('x-forwarded-for'),
+                                     request.client.host if request.client else 'unknown')
+        retry_after = accounts.throttle(client_ip, email)
+        if retry_after:
+            return error('Too many login attempts, please try again later', 429,
+                         {'Retry-After': str(retry_after)})
+
+        pool = await pools.get()
+        async with pool.read() as conn:
+            rows = await conn.execute_fetchall(accounts.FIND_ACCOUNTS_QUERY, (email,))
+
+        for row in rows:
+            account = dict(zip(accounts.ACCOUNT_COLUMNS, row))
+            if await run_in_threadpool(accounts.verify_password, account['password_hash'], password):
+                return JSONResponse(await run_in_threadpool(complete_login, account, email, password))
+
+        accounts.login_failed(client_ip, email)
+        return error('Invalid email or password', 401)
+
+    except accounts.VerificationBusy:
+        return error('Server busy, please try again', 503, {'Retry-After': '1'})
+
+    except Exception as e:
+        logging.error(f"Error during login: {e}")
+        return error('Internal server error', 500)
+
+
+@tenant_route
+async def mark_attendance(request):
+    """Mark attendance for a student from a scanned QR token or student ID"""
+    try:
+        data = await json_body(request)
+
+        # Forged or expired codes are rejected before any database work
+        try:
+            student_id = scan_student_id(data)
+        except qr_tokens.InvalidQRToken as e:
+            return error(str(e), 403)
+
+        if not student_id:
+            return error('Student ID is required', 400)
+
+        pool = await pools.get()
+        student = await student_cache.get_profile_async(pool, student_id)
+
+        if not student:
+            return error('Student not found', 404)
+
+        # Mark attendance; the unique (student_id, date) index rejects repeats
+        today = datetime.now().strftime('%Y-%m-%d')
+        async with pool.transaction() as conn:
+            cursor = await conn.execute('''
+                INSERT INTO attendance (student_id, date) VALUES (?, ?)
+                ON CONFLICT (student_id, date) DO NOTHING
+            ''', (student_id, today))
+            marked = cursor.rowcount == 1
+
+        if not marked:
+            return error('Attendance already marked for today', 400)
+
+        events.attendance_marked(student_id, student.name, student.teacher_id, today)
+        return JSONResponse({'message': f'Attendance marked successfully for {student.name}'})
+
+    except Exception as e:
+        logging.error(f"Error marking attendance: {e}")
+        return error('Internal server error', 500)
+
+
+@tenant_route
+async def weekly_report(request):
+    """Get weekly attendance report for a student"""
+    try:
+        student_id = request.path_params['student_id']
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=6)
+
+        pool = await pools.get()
+        student = await student_cache.get_profile_async(pool, student_id)
+        if not student:
+            return error('Student not found', 404)
+        async with pool.read() as conn:
+            records = await conn.execute_fetchall(
+                WEEKLY_ATTENDANCE_QUERY,
+                (student.class_name, student.section, student_id,
+                 start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+
+        return JSONResponse(weekly_report_body(student_id, student, records))
+
+    except Exception as e:
+        logging.error(f"Error generating weekly report: {e}")
+        return error('Internal server error', 500)
+
+
+@tenant_route
+async def generate_qr(request):
+    """Generate QR code for a student"""
+    try:
+        student_id = request.path_params['student_id']
+        account = session_account(request)
+        if not account:
+            return error('Invalid or expired session', 401)
+        if not may_view_student(account, student_id):
+            return error("Not allowed to view this student's QR code", 403)
+
+        pool = await pools.get()
+        student = await student_cache.get_profile_async(pool, student_id)
+
+        if not student:
+            return error('Student not found', 404)
+
+        token = qr_signer.sign(student_id)
+        etag = qr_response_etag(token, student)
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+
+        if etag_matches(request.headers.get('if-none-match', ''), etag):
+            return Response(status_code=304, headers=headers)
+
+        png = await run_in_threadpool(qr_cache.cached, student_id, token)
+        if png is None:
+            png = await asyncio.get_running_loop().run_in_executor(
+                get_process_pool(), qr_cache.render_png, token)
+            await run_in_threadpool(qr_cache.store, student_id, token, png)
+
+        qr_base64 = base64.b64encode(png).decode()
+
+        return JSONResponse(qr_response_body(student_id, student, qr_base64, token), headers=headers)
+
+    except Exception as e:
+        logging.error(f"Error generating QR code: {e}")
+        return error('Internal server error', 500)
+
+
+@tenant_route
+async def add_students_excel(request):
+    """Queue an import of students from an Excel or CSV file; poll /jobs/<id> for the results"""
+    try:
+        form = await request.form()
+        file = form.get('file')
+        teacher_id = form.get('teacher_id')
+
+        if file is None or isinstance(file, str):
+            return error('No file uploaded', 400)
+
+        if not teacher_id:
+            return error('Teacher ID is required', 400)
+
+        if file.filename == '':
+            return error('No file selected', 400)
+
+        try:
+            check_extension(file.filename)
+        except InvalidSheetError as e:
+            return error(str(e), 400)
+
+        filepath = sheet_upload_path(file.filename)
+        content = await file.read()
+
+        # The import itself runs on the job runner; only the save and enqueue happen here
+        def save_and_queue():
+            with open(filepath, 'wb') as f:
+                f.write(content)
+            return queue_sheet_import(filepath, teacher_id)
+
+        job_id = await run_in_threadpool(save_and_queue)
+        return JSONResponse({'message': 'Job queued', 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}, 202,
+                            headers={'Location': f'/jobs/{job_id}'})
+
+    except Exception as e:
+        logging.error(f"Error adding students from Excel: {e}")
+        return error('Internal server error', 500)
+
+
+async def event_stream(request):
+    """Stream attendance and roster events for the logged-in account (SSE)"""
+    account = session_account(request)
+    if not account:
+        return error('Invalid or expired session', 401)
+
+    subscription = events.broker.subscribe(events.account_topics(account),
+                                           request.headers.get('last-event-id'),
+                                           events.AsyncSubscription)
+
+    async def stream():
+        try:
+            yield events.stream_preamble()
+            while True:
+                batch = await subscription.get()
+                if not batch:
+                    yield events.heartbeat()
+                for event in batch:
+                    yield event.encode()
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+class RequestMetrics:
+    """Record latency for the async routes (Flask records its own)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            if isinstance(route, Route):
+                label = route.path.replace('{', '<').replace('}', '>')
+                metrics.requests_total.inc(scope['method'], label, str(status[0]))
+                metrics.request_duration.observe(time.perf_counter() - start, scope['method'], label)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # School pools open on first use
+    try:
+        yield
+    finally:
+        await pools.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/login', login, methods=['POST']),
+        Route('/mark_attendance', mark_attendance, methods=['POST']),
+        Route('/weekly_report/{student_id}', weekly_report, methods=['GET']),
+        Route('/generate_qr/{student_id}', generate_qr, methods=['GET']),
+        Route('/add_students_excel', add_students_excel, methods=['POST']),
+        Route('/events', event_stream, methods=['GET']),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    middleware=[
+        Middleware(RequestMetrics),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
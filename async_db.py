@@ -0,0 +1,136 @@
+"""Asyncio SQLite access for the ASGI entry point (asgi.py).
+
+Mirrors db.py for coroutines: connections are opened through aiosqlite with
+the same PRAGMAs, a few of them serve reads concurrently, and writes go
+through a single connection under ``transaction()`` (BEGIN IMMEDIATE), so
+the event loop never blocks on SQLite.
+
+``pools`` keeps one such pool per school, opened (and migrated) on first
+use; beyond MAX_OPEN_TENANTS the least recently used idle pool is closed.
+"""
+import os
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+import db
+
+# Connections reading in parallel; aiosqlite runs each one in its own thread
+READ_CONNECTIONS = int(os.environ.get('ASYNC_DB_READERS', 4))
+
+
+class AsyncConnectionPool:
+    def __init__(self, path=None, readers=READ_CONNECTIONS):
+        self.path = path
+        self.readers = readers
+        self._idle = None
+        self._writer = None
+        self._write_lock = None
+        self._connections = []
+        self.borrowed = 0
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(
+            self.path or db.DB_PATH,
+            timeout=db.BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            cached_statements=db.STATEMENT_CACHE_SIZE,
+            factory=db.TimedConnection,
+        )
+        for name, value in db.PRAGMAS:
+            await conn.execute(f'PRAGMA {name} = {value}')
+        self._connections.append(conn)
+        return conn
+
+    async def open(self):
+        self._idle = asyncio.Queue()
+        for _ in range(self.readers):
+            self._idle.put_nowait(await self._connect())
+        self._writer = await self._connect()
+        self._write_lock = asyncio.Lock()
+
+    async def close(self):
+        connections, self._connections = self._connections, []
+        for conn in connections:
+            await conn.close()
+
+    @asynccontextmanager
+    async def read(self):
+        """Borrow a connection for reads"""
+        self.borrowed += 1
+        try:
+            conn = await self._idle.get()
+            try:
+                yield conn
+            finally:
+                self._idle.put_nowait(conn)
+        finally:
+            self.borrowed -= 1
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run a block of writes in a single IMMEDIATE transaction"""
+        self.borrowed += 1
+        try:
+            async with self._write_lock:
+                await self._writer.execute('BEGIN IMMEDIATE')
+                try:
+                    yield self._writer
+                except BaseException:
+                    await self._writer.rollback()
+                    raise
+                else:
+                    await self._writer.commit()
+        finally:
+            self.borrowed -= 1
+
+
+class TenantPools:
+    """One AsyncConnectionPool per school database"""
+
+    def __init__(self, max_open=db.MAX_OPEN_TENANTS):
+        self.max_open = max_open
+        self._pools = OrderedDict()
+        self._lock = None
+
+    async def get(self, tenant=None):
+        """Pool for a school (the current one by default), opening it if needed"""
+        tenant = tenant or db.current_tenant()
+        pool = self._pools.get(tenant)
+        if pool is not None:
+            self._pools.move_to_end(tenant)
+            return pool
+        if tenant != db.DEFAULT_TENANT and not db.tenant_exists(tenant):
+            raise db.UnknownTenant(tenant)
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            pool = self._pools.get(tenant)
+            if pool is None:
+                path = db.tenant_path(tenant)
+                await asyncio.to_thread(db.ensure_migrated, path)
+                pool = AsyncConnectionPool(path)
+                await pool.open()
+                self._pools[tenant] = pool
+                await self._evict()
+        return pool
+
+    async def _evict(self):
+        """Close least recently used pools nobody is using, down to max_open"""
+        for tenant, pool in list(self._pools.items()):
+            if len(self._pools) <= self.max_open:
+                break
+            if not pool.borrowed:
+                del self._pools[tenant]
+                await pool.close()
+
+    async def close(self):
+        pools, self._pools = list(self._pools.values()), OrderedDict()
+        for pool in pools:
+            await pool.close()
+
+
+pools = TenantPools()
@@ -0,0 +1,369 @@
+"""QR scan attendance (single, batched and offline sync) and attendance reports"""
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, request, jsonify
+
+import events
+import metrics
+import qr_tokens
+import rollups
+import student_cache
+from db import get_db, transaction
+from school_calendar import CALENDAR_OF
+from web import qr_signer, ALLOW_UNSIGNED_SCANS, parse_school_day_range
+
+bp = Blueprint('attendance', __name__)
+
+def scan_student_id(scan, scanned_at=None):
+    """Student ID from a scan's signed QR token, or its bare student_id when allowed"""
+    token = scan.get('token')
+    if token:
+        return qr_signer.verify(token, scanned_at.timestamp() if scanned_at else None)
+    student_id = scan.get('student_id')
+    if student_id:
+        if not ALLOW_UNSIGNED_SCANS:
+            raise qr_tokens.InvalidQRToken('A signed QR code is required')
+        metrics.unsigned_scans.inc()
+        logging.warning(f"Accepted unsigned scan for {student_id}")
+    return student_id
+
+@bp.route('/mark_attendance', methods=['POST'])
+def mark_attendance():
+    """Mark attendance for a student from a scanned QR token or student ID"""
+    try:
+        data = request.get_json() or {}
+        
+        # Forged or expired codes are rejected before any database work
+        try:
+            student_id = scan_student_id(data)
+        except qr_tokens.InvalidQRToken as e:
+            return jsonify({'error': str(e)}), 403
+        
+        if not student_id:
+            return jsonify({'error': 'Student ID is required'}), 400
+        
+        # Check if student exists
+        student = student_cache.get_profile(student_id)
+        
+        if not student:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        # Mark attendance; the unique (student_id, date) index rejects repeats
+        today = datetime.now().strftime('%Y-%m-%d')
+        with transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO attendance (student_id, date) VALUES (?, ?)
+                ON CONFLICT (student_id, date) DO NOTHING
+            ''', (student_id, today))
+            marked = cursor.rowcount == 1
+        
+        if not marked:
+            return jsonify({'error': 'Attendance already marked for today'}), 400
+        
+        events.attendance_marked(student_id, student.name, student.teacher_id, today)
+        return jsonify({'message': f'Attendance marked successfully for {student.name}'}), 200
+    
+    except Exception as e:
+        logging.error(f"Error marking attendance: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Limits for batched scanner uploads
+MAX_BATCH_SIZE = 1000
+MAX_SCAN_AGE = timedelta(days=7)
+MAX_SCAN_CLOCK_SKEW = timedelta(minutes=5)
+SQL_CHUNK_SIZE = 500
+
+def parse_scan_time(value, now):
+    """Parse a client scan timestamp into local time, or None if unusable"""
+    if not value:
+        return now
+    try:
+        scanned_at = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone().replace(tzinfo=None)
+    if scanned_at > now + MAX_SCAN_CLOCK_SKEW or scanned_at < now - MAX_SCAN_AGE:
+        return None
+    return min(scanned_at, now)
+
+def fetch_students(cursor, student_ids):
+    """Look up (name, teacher_id) for many student IDs with chunked IN queries"""
+    students = {}
+    student_ids = list(student_ids)
+    for i in range(0, len(student_ids), SQL_CHUNK_SIZE):
+        chunk = student_ids[i:i + SQL_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'SELECT student_id, name, teacher_id FROM students WHERE student_id IN ({placeholders})',
+                       chunk)
+        students.update((row[0], (row[1], row[2])) for row in cursor.fetchall())
+    return students
+
+def resolve_scans(scans, now):
+    """Check each scan's token and time; returns per-scan results (None while
+    pending) and the (index, student_id, scanned_at) scans left to record"""
+    results = [None] * len(scans)
+    pending = []
+    for i, scan in enumerate(scans):
+        if not isinstance(scan, dict):
+            results[i] = {'student_id': None, 'status': 'invalid', 'error': 'Student ID is required'}
+            continue
+        scanned_at = parse_scan_time(scan.get('scanned_at'), now)
+        if scanned_at is None:
+            results[i] = {'student_id': scan.get('student_id'), 'status': 'invalid',
+                          'error': 'Invalid scan timestamp'}
+            continue
+        # Windowed codes are checked against the scan time, which is also the attendance date
+        try:
+            student_id = scan_student_id(scan, scanned_at)
+        except qr_tokens.InvalidQRToken as e:
+            results[i] = {'student_id': scan.get('student_id'), 'status': 'invalid', 'error': str(e)}
+            continue
+        if not student_id or not isinstance(student_id, str):
+            results[i] = {'student_id': student_id, 'status': 'invalid', 'error': 'Student ID is required'}
+            continue
+        pending.append((i, student_id, scanned_at))
+    return results, pending
+
+def record_scans(cursor, pending, results, students):
+    """Insert attendance for pending scans inside a transaction, filling in
+    their results; returns the (student_id, date, marked_at) rows added"""
+    names = {student_id: student[0] for student_id, student in students.items()}
+    
+    # Marks that already exist for the dates in this batch
+    keys = {(student_id, scanned_at.strftime('%Y-%m-%d'))
+            for _, student_id, scanned_at in pending if student_id in names}
+    existing = set()
+    for day in {d for _, d in keys}:
+        ids = [s for s, d in keys if d == day]
+        for j in range(0, len(ids), SQL_CHUNK_SIZE):
+            chunk = ids[j:j + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT student_id, date FROM attendance
+                WHERE date = ? AND student_id IN ({placeholders})
+            ''', [day] + chunk)
+            existing.update(cursor.fetchall())
+    
+    rows = []
+    for i, student_id, scanned_at in pending:
+        if student_id not in names:
+            results[i] = {'student_id': student_id, 'status': 'not_found', 'error': 'Student not found'}
+            continue
+        key = (student_id, scanned_at.strftime('%Y-%m-%d'))
+        if key in existing:
+            results[i] = {'student_id': student_id, 'name': names[student_id],
+                          'date': key[1], 'status': 'already_marked'}
+            continue
+        existing.add(key)
+        # marked_at is stored in UTC like CURRENT_TIMESTAMP
+        marked_at = scanned_at.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        rows.append((student_id, key[1], marked_at))
+        results[i] = {'student_id': student_id, 'name': names[student_id],
+                      'date': key[1], 'status': 'marked'}
+    
+    cursor.executemany('''
+        INSERT INTO attendance (student_id, date, marked_at) VALUES (?, ?, ?)
+        ON CONFLICT (student_id, date) DO NOTHING
+    ''', rows)
+    return rows
+
+def summarize_scans(results):
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return summary
+
+@bp.route('/mark_attendance_batch', methods=['POST'])
+def mark_attendance_batch():
+    """Mark attendance for a batch of scans in one transaction"""
+    try:
+        data = request.get_json() or {}
+        # Accept {"scans": [{"token" or "student_id", "scanned_at"}]} or {"student_ids": [...]}
+        scans = data.get('scans')
+        if scans is None:
+            scans = [{'student_id': sid} for sid in data.get('student_ids') or []]
+        
+        if not isinstance(scans, list) or not scans:
+            return jsonify({'error': 'A list of scans is required'}), 400
+        if len(scans) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} scans per batch'}), 400
+        
+        results, pending = resolve_scans(scans, datetime.now())
+        students = fetch_students(get_db().cursor(), {student_id for _, student_id, _ in pending})
+        
+        with transaction() as cursor:
+            rows = record_scans(cursor, pending, results, students)
+        
+        for student_id, day, _ in rows:
+            events.attendance_marked(student_id, students[student_id][0], students[student_id][1], day)
+        
+        summary = summarize_scans(results)
+        return jsonify({
+            'message': f"Marked attendance for {summary.get('marked', 0)} of {len(scans)} scans",
+            'summary': summary,
+            'results': results
+        }), 200
+    
+    except Exception as e:
+        logging.error(f"Error marking batch attendance: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Offline scan IDs are remembered past the oldest scan time accepted, so a
+# retry can never be recorded as a new scan
+MAX_CLIENT_ID_LENGTH = 64
+SYNC_RETENTION = MAX_SCAN_AGE + timedelta(days=1)
+
+def stored_sync_results(cursor, client_ids):
+    """Results already given for offline scan IDs, keyed by ID"""
+    stored = {}
+    client_ids = list(client_ids)
+    for i in range(0, len(client_ids), SQL_CHUNK_SIZE):
+        chunk = client_ids[i:i + SQL_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'SELECT client_id, result FROM sync_scans WHERE client_id IN ({placeholders})', chunk)
+        stored.update((client_id, json.loads(result)) for client_id, result in cursor.fetchall())
+    return stored
+
+@bp.route('/sync/attendance', methods=['POST'])
+def sync_attendance():
+    """Record scans queued offline; a scan ID seen before gets its first result back"""
+    try:
+        data = request.get_json() or {}
+        # {"scans": [{"client_id", "token" or "student_id", "scanned_at"}]}
+        scans = data.get('scans')
+        if not isinstance(scans, list) or not scans:
+            return jsonify({'error': 'A list of scans is required'}), 400
+        if len(scans) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} scans per batch'}), 400
+        client_ids = [scan.get('client_id') if isinstance(scan, dict) else None for scan in scans]
+        if not all(isinstance(c, str) and 0 < len(c) <= MAX_CLIENT_ID_LENGTH for c in client_ids):
+            return jsonify({'error': f'Every scan needs a client_id of at most {MAX_CLIENT_ID_LENGTH} characters'}), 400
+        
+        # A scan repeated within the batch is answered with its first copy's result
+        first = {}
+        for client_id, scan in zip(client_ids, scans):
+            first.setdefault(client_id, scan)
+        unique = list(first)
+        position = {client_id: i for i, client_id in enumerate(unique)}
+        
+        now = datetime.now()
+        results, pending = resolve_scans(list(first.values()), now)
+        students = fetch_students(get_db().cursor(), {student_id for _, student_id, _ in pending})
+        
+        with transaction() as cursor:
+            stored = stored_sync_results(cursor, unique)
+            rows = record_scans(cursor, [p for p in pending if unique[p[0]] not in stored], results, students)
+            received_at = now.timestamp()
+            new = []
+            for i, client_id in enumerate(unique):
+                if client_id in stored:
+                    results[i] = dict(stored[client_id], replayed=True)
+                else:
+                    new.append((client_id, json.dumps(results[i]), received_at))
+            cursor.executemany('INSERT INTO sync_scans (client_id, result, received_at) VALUES (?, ?, ?)', new)
+            cursor.execute('DELETE FROM sync_scans WHERE received_at < ?',
+                           ((now - SYNC_RETENTION).timestamp(),))
+        
+        for student_id, day, _ in rows:
+            events.attendance_marked(student_id, students[student_id][0], students[student_id][1], day)
+        
+        results = [dict(results[position[client_id]], client_id=client_id) for client_id in client_ids]
+        return jsonify({
+            'summary': summarize_scans(results),
+            'results': results
+        }), 200
+    
+    except Exception as e:
+        logging.error(f"Error syncing offline attendance: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+# The student's attendance on each school day of their class's calendar in
+# a date range; params (class, section, student_id, from, to)
+WEEKLY_ATTENDANCE_QUERY = f'''
+    WITH calendar AS ({CALENDAR_OF})
+    SELECT d.date, COALESCE(a.status, 'absent') FROM calendar k
+    JOIN school_days d ON d.class = k.class AND d.section = k.section
+    LEFT JOIN attendance a ON a.student_id = ? AND a.date = d.date
+    WHERE d.date BETWEEN ? AND ?
+    ORDER BY d.date DESC
+'''
+
+def weekly_report_body(student_id, student, attendance_records):
+    """Build the weekly report from a student row and its school days' attendance"""
+    return {
+        'student_id': student_id,
+        'name': student[0],
+        'class': student[1],
+        'section': student[2],
+        'roll_no': student[3],
+        'weekly_attendance': [{'date': day, 'status': status} for day, status in attendance_records]
+    }
+
+@bp.route('/weekly_report/<student_id>', methods=['GET'])
+def weekly_report(student_id):
+    """Get weekly attendance report for a student"""
+    try:
+        # Get student details
+        student = student_cache.get_profile(student_id)
+        
+        if not student:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        # School days among the last 7 days; weekends and holidays are left out
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=6)
+        
+        cursor = get_db().cursor()
+        cursor.execute(WEEKLY_ATTENDANCE_QUERY,
+                       (student.class_name, student.section, student_id,
+                        start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+        
+        return jsonify(weekly_report_body(student_id, student, cursor.fetchall())), 200
+    
+    except Exception as e:
+        logging.error(f"Error generating weekly report: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/class_report/<class_name>/<section>', methods=['GET'])
+def class_report(class_name, section):
+    """Get daily or monthly attendance for a class/section from the rollups"""
+    try:
+        granularity = request.args.get('granularity', 'daily')
+        if granularity not in ('daily', 'monthly'):
+            return jsonify({'error': 'Granularity must be daily or monthly'}), 400
+        
+        try:
+            start, end = parse_school_day_range(lambda end: end.replace(day=1))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date range: {e}'}), 400
+        
+        return jsonify(rollups.class_report(class_name, section, start, end, granularity)), 200
+    
+    except Exception as e:
+        logging.error(f"Error generating class report: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/student_report/<student_id>', methods=['GET'])
+def student_report(student_id):
+    """Get monthly attendance for a student over a date range"""
+    try:
+        try:
+            start, end = parse_school_day_range(lambda end: end.replace(month=1, day=1))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date range: {e}'}), 400
+        
+        student = student_cache.get_profile(student_id)
+        
+        if not student:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        report = rollups.student_report(student_id, student.class_name, student.section, start, end)
+        report.update({'name': student[0], 'class': student[1], 'section': student[2], 'roll_no': student[3]})
+        return jsonify(report), 200
+    
+    except Exception as e:
+        logging.error(f"Error generating student report: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,131 @@
+"""Teacher registration, login and session routes"""
+import logging
+import sqlite3
+
+from flask import Blueprint, request, jsonify
+
+import accounts
+import db
+from db import get_db, transaction
+from web import SECRET_KEY, current_account
+
+bp = Blueprint('auth', __name__)
+
+@bp.route('/register_teacher', methods=['POST'])
+def register_teacher():
+    """Register a new teacher"""
+    try:
+        data = request.get_json() or {}
+        name = data.get('name')
+        email = data.get('email')
+        password = data.get('password')
+        
+        if not all([name, email, password]):
+            return jsonify({'error': 'All fields are required'}), 400
+        
+        # Check if teacher already exists
+        cursor = get_db().cursor()
+        cursor.execute('SELECT id FROM teachers WHERE email = ?', (email,))
+        if cursor.fetchone():
+            return jsonify({'error': 'Teacher with this email already exists'}), 400
+        
+        # Hash password outside the write lock, then insert teacher
+        password_hash = accounts.hash_password(password or '')
+        try:
+            with transaction() as cursor:
+                cursor.execute('INSERT INTO teachers (name, email, password_hash) VALUES (?, ?, ?)',
+                              (name, email, password_hash))
+                teacher_id = cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return jsonify({'error': 'Teacher with this email already exists'}), 400
+        
+        return jsonify({'message': 'Teacher registered successfully', 'teacher_id': teacher_id}), 201
+    
+    except Exception as e:
+        logging.error(f"Error registering teacher: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def account_profile(account):
+    """Public fields returned to the dashboard for a logged-in account"""
+    if account['role'] == 'teacher':
+        return {
+            'role': 'teacher',
+            'user_id': account['account_id'],
+            'name': account['name'],
+            'email': account['email']
+        }
+    return {
+        'role': 'student',
+        'student_id': account['account_id'],
+        'name': account['name'],
+        'email': account['email'],
+        'class': account['class'],
+        'section': account['section'],
+        'roll_no': account['roll_no']
+    }
+
+def complete_login(account, email, password):
+    """Clear throttling, upgrade an outdated hash and build the login response"""
+    accounts.account_limiter.reset(email)
+    if accounts.needs_rehash(account['password_hash']):
+        try:
+            accounts.rehash(account, password)
+        except Exception as e:
+            logging.warning(f"Could not upgrade password hash: {e}")
+    
+    response = account_profile(account)
+    response['message'] = 'Login successful'
+    response['token'] = accounts.issue_token(SECRET_KEY, account, db.current_tenant())
+    return response
+
+@bp.route('/login', methods=['POST'])
+def login():
+    """Login for both teachers and students"""
+    try:
+        data = request.get_json() or {}
+        email = data.get('email')
+        password = data.get('password')
+        
+        if not all([email, password]):
+            return jsonify({'error': 'Email and password are required'}), 400
+        
+        # Reject throttled clients before doing any hashing work
+        # remote_addr is the client's own address behind ProxyFix (see app.py)
+        client_ip = request.remote_addr or 'unknown'
+        retry_after = accounts.throttle(client_ip, email)
+        if retry_after:
+            return jsonify({'error': 'Too many login attempts, please try again later'}), 429, \
+                {'Retry-After': str(retry_after)}
+        
+        # Teachers first, then students, in one indexed lookup
+        for account in accounts.find_accounts(email):
+            if accounts.verify_password(account['password_hash'], password):
+                return jsonify(complete_login(account, email, password)), 200
+        
+        accounts.login_failed(client_ip, email)
+        return jsonify({'error': 'Invalid email or password'}), 401
+    
+    except accounts.VerificationBusy:
+        return jsonify({'error': 'Server busy, please try again'}), 503, {'Retry-After': '1'}
+    
+    except Exception as e:
+        logging.error(f"Error during login: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/session', methods=['GET'])
+def get_session():
+    """Return the profile for a valid session token"""
+    try:
+        session_account = current_account()
+        if not session_account:
+            return jsonify({'error': 'Invalid or expired session'}), 401
+        
+        account = accounts.find_account(session_account['role'], session_account['id'])
+        if not account:
+            return jsonify({'error': 'Invalid or expired session'}), 401
+        
+        return jsonify(account_profile(account)), 200
+    
+    except Exception as e:
+        logging.error(f"Error checking session: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
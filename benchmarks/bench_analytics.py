@@ -0,0 +1,132 @@
+"""Benchmark at-risk analytics on packed bitsets against per-student SQL queries.
+
+For every teacher in a generated school, computes each student's overall,
+recent and previous-window attendance and their current and longest
+absence streaks twice:
+
+* sql        the way a per-student report would, with a few indexed queries
+             per student and the streaks walked in Python
+* analytics  analytics.at_risk(), cold (loading each class's history) and
+             warm (from the per-day cache)
+
+and checks both agree for every student before printing the timings.
+
+    python benchmarks/bench_analytics.py [--students 5000 --years 1]
+"""
+import os
+import sys
+import bisect
+import argparse
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate
+
+
+def sql_percentage(present, possible):
+    return round(present * 100.0 / possible, 1) if possible else None
+
+
+def sql_student(cursor, student_id, days, window):
+    """The analytics figures for one student from its own queries"""
+    as_of = days[-1]
+    cursor.execute('''
+        SELECT substr(created_at, 1, 10), MIN(a.date), COUNT(a.date) FROM students s
+        LEFT JOIN attendance a ON a.student_id = s.student_id AND a.status = 'present' AND a.date <= ?
+        WHERE s.student_id = ?
+    ''', (as_of, student_id))
+    created, first, present = cursor.fetchone()
+    enrolled = bisect.bisect_left(days, min(filter(None, (created, first))))
+
+    def window_figures(end):
+        lo = max(end - window, enrolled)
+        if lo >= end:
+            return None
+        cursor.execute('''
+            SELECT COUNT(*) FROM attendance
+            WHERE student_id = ? AND status = 'present' AND date BETWEEN ? AND ?
+        ''', (student_id, days[lo], days[end - 1]))
+        return sql_percentage(cursor.fetchone()[0], end - lo)
+
+    cursor.execute('''
+        SELECT date FROM attendance
+        WHERE student_id = ? AND status = 'present' AND date <= ? ORDER BY date
+    ''', (student_id, as_of))
+    marked = [bisect.bisect_left(days, row[0]) for row in cursor.fetchall()]
+    # Absences between enrolment, each mark and the last school day
+    gaps = [b - a - 1 for a, b in zip([enrolled - 1] + marked, marked + [len(days)])]
+
+    return {
+        'percentage': sql_percentage(present, len(days) - enrolled),
+        'recent_percentage': window_figures(len(days)),
+        'previous_percentage': window_figures(max(len(days) - window, 0)),
+        'current_streak': gaps[-1],
+        'longest_streak': max(gaps),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        start = time.perf_counter()
+        counts = generate(path, args.students, args.years)
+        print(f'generated {counts} in {time.perf_counter() - start:.1f}s')
+
+        import db
+        db.DB_PATH = path
+        import analytics
+        cursor = db.get_db().cursor()
+        cursor.execute('SELECT id FROM teachers ORDER BY id')
+        teachers = [row[0] for row in cursor.fetchall()]
+        window = analytics.ANALYTICS_WINDOW
+
+        cursor.execute('''
+            SELECT date FROM school_days WHERE class = '' AND section = ''
+            AND date >= (SELECT MIN(substr(created_at, 1, 10)) FROM students) AND date < ? ORDER BY date
+        ''', (date.today().isoformat(),))
+        days = [row[0] for row in cursor.fetchall()]
+
+        start = time.perf_counter()
+        expected = {}
+        for teacher_id in teachers:
+            cursor.execute('SELECT student_id FROM students WHERE teacher_id = ?', (teacher_id,))
+            for (student_id,) in cursor.fetchall():
+                expected[student_id] = sql_student(cursor, student_id, days, window)
+        sql_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [analytics.at_risk(teacher_id, everyone=True, refresh=True) for teacher_id in teachers]
+        cold_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for teacher_id in teachers:
+            analytics.at_risk(teacher_id, everyone=True)
+        warm_seconds = time.perf_counter() - start
+
+        flagged = 0
+        for result in results:
+            for student in result['students']:
+                want = expected[student['student_id']]
+                got = {key: student[key] for key in want}
+                assert got == want, (student['student_id'], got, want)
+                flagged += student['at_risk']
+        assert len(expected) == sum(len(r['students']) for r in results)
+
+        history = analytics.class_history(teachers[0], date.fromisoformat(days[-1]))
+        print(f"{len(expected)} students, {len(days)} school days, {flagged} at risk; "
+              f"bitsets {history.bits.nbytes} bytes per class of {len(history.students)}")
+        print(f"{'method':<16} {'total ms':>10} {'per class ms':>13}")
+        for label, seconds in (('sql per student', sql_seconds), ('analytics cold', cold_seconds),
+                               ('analytics warm', warm_seconds)):
+            print(f"{label:<16} {seconds * 1000:>10.1f} {seconds * 1000 / len(teachers):>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
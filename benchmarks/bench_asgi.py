@@ -0,0 +1,159 @@
+"""Benchmark the ASGI entry point against gunicorn setups.
+
+Opens N concurrent client connections (an asyncio client, so thousands are
+cheap) and has each one loop scanner/dashboard requests - mark_attendance
+and weekly_report - for a fixed time, against:
+
+* gunicorn app:app             gunicorn's default: one sync worker
+* gunicorn -w 1 --threads 64   the procfile (gunicorn.conf.py): one gthread worker
+* gunicorn -w W --threads T    threaded workers
+* uvicorn asgi:app             one process, async handlers
+
+and reports completed requests, errors and latency percentiles.
+
+    python benchmarks/bench_asgi.py [--connections 50 500 2000 --duration 10]
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate
+from smtp_sink import SMTPSink
+from load_test import percentile, start_server, gunicorn_command, uvicorn_command
+
+REQUEST_TIMEOUT = 30
+
+
+class AsyncClient:
+    """Minimal HTTP/1.1 client that reuses its connection when allowed"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        body = json.dumps(payload).encode() if payload is not None else b''
+        head = f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(body)}\r\n'
+        if payload is not None:
+            head += 'Content-Type: application/json\r\n'
+        self.writer.write(head.encode() + b'\r\n' + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+        await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+
+
+async def drive(port, connections, duration, students):
+    latencies = []
+    errors = {}
+    deadline = time.monotonic() + duration
+
+    async def worker(n):
+        rng = random.Random(n)
+        client = AsyncClient(port)
+        while time.monotonic() < deadline:
+            student_id = f'S{rng.randrange(students):07d}'
+            if rng.random() < 0.5:
+                request = ('POST', '/mark_attendance', {'student_id': student_id})
+            else:
+                request = ('GET', f'/weekly_report/{student_id}', None)
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(client.request(*request), REQUEST_TIMEOUT)
+                # 400 is "already marked today", a normal outcome for repeat scans
+                if status not in (200, 400):
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                await client.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+        await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(connections)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'completed': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--connections', type=int, nargs='+', default=[50, 500, 2000])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    servers = [
+        ('gunicorn sync (default)', gunicorn_command(1, 1)),
+        ('gunicorn gthread (procfile)', gunicorn_command(1, 64)),
+        (f'gunicorn -w {args.workers} --threads {args.threads}', gunicorn_command(args.workers, args.threads)),
+        ('uvicorn asgi:app', uvicorn_command()),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        db_path = os.path.join(tmp, 'school.db')
+        generate(db_path, args.students, years=0)
+        sink = SMTPSink().start()
+
+        print(f"{'server':<30} {'conns':>6} {'done':>7} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9}  errors")
+        try:
+            for label, command in servers:
+                for connections in args.connections:
+                    conn = sqlite3.connect(db_path)
+                    conn.execute('DELETE FROM attendance WHERE date = ?', (date.today().isoformat(),))
+                    conn.commit()
+                    conn.close()
+
+                    server, port = start_server(command, tmp, db_path, sink.port)
+                    try:
+                        result = asyncio.run(drive(port, connections, args.duration, args.students))
+                    finally:
+                        server.terminate()
+                        server.wait(timeout=30)
+                    print(f"{label:<30} {connections:>6} {result['completed']:>7} {result['rps']:>8} "
+                          f"{result['p50_ms']!s:>9} {result['p99_ms']!s:>9}  {result['errors'] or ''}")
+        finally:
+            sink.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Load test: 500 QR scans via /mark_attendance vs /mark_attendance_batch.
+
+Drives the Flask app in-process against a generated scratch database, with
+several concurrent scanner clients, and reports wall time and per-request
+latency for each endpoint.
+
+    python benchmarks/bench_batch_attendance.py [--scans 500 --batch-size 50]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def timed(client, *args, **kwargs):
+    start = time.perf_counter()
+    response = client.post(*args, **kwargs)
+    assert response.status_code < 500, response.get_json()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_single(app, student_ids, clients):
+    def scan(student_id):
+        return timed(app.test_client(), '/mark_attendance', json={'student_id': student_id})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(scan, student_ids))
+    return time.perf_counter() - start, latencies
+
+
+def run_batch(app, student_ids, clients, batch_size):
+    batches = [student_ids[i:i + batch_size] for i in range(0, len(student_ids), batch_size)]
+
+    def flush(batch):
+        return timed(app.test_client(), '/mark_attendance_batch', json={'student_ids': batch})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(flush, batches))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scans', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        generate(path, students=args.scans * 2, years=1)
+        os.environ['DATABASE_PATH'] = path
+        # Scans carry bare student IDs
+        os.environ['ALLOW_UNSIGNED_SCANS'] = 'true'
+
+        import db
+        db.DB_PATH = path
+        from app import app
+
+        # Separate halves of the roster so neither run sees the other's marks
+        single_ids = [f'S{i:07d}' for i in range(args.scans)]
+        batch_ids = [f'S{i:07d}' for i in range(args.scans, args.scans * 2)]
+
+        single_time, single_lat = run_single(app, single_ids, args.clients)
+        batch_time, batch_lat = run_batch(app, batch_ids, args.clients, args.batch_size)
+
+    print(f"{'endpoint':<24} {'requests':>8} {'total s':>8} {'scans/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, total, lat in (('mark_attendance', single_time, single_lat),
+                             ('mark_attendance_batch', batch_time, batch_lat)):
+        print(f'{name:<24} {len(lat):>8} {total:>8.2f} {args.scans / total:>8.0f} '
+              f'{percentile(lat, 50):>8.2f} {percentile(lat, 95):>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Check holiday-aware reporting and benchmark year-long reports on the school-day index.
+
+Drives the Flask app in-process against a generated scratch database.
+
+Checks: weekly, class and student reports and the at-risk analytics count
+only school days -- no weekends, none of the school's or a class's
+holidays, and a class's extra working days when its schedule has them --
+and every calendar change can be undone.
+
+Benchmark: times year-long class (daily and monthly) and student reports
+and the weekly report through the app. With --baseline REF it also times
+the class and weekly reports as rollups.py and attendance_routes.py at REF
+computed them, generating the dates in Python (loaded with git show); the
+old student report read the per-month rollup that migration 11 dropped.
+
+    python benchmarks/bench_calendar.py [--students 5000 --baseline HEAD~1]
+"""
+import os
+import sys
+import types
+import random
+import argparse
+import tempfile
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate, PASSWORD
+from load_test import ROOT
+
+TEACHER_EMAIL = 'teacher1a@example.com'
+
+
+def get(client, path):
+    response = client.get(path)
+    assert response.status_code == 200, (path, response.get_json())
+    return response.get_json()
+
+
+def send(client, method, path, token, body):
+    response = client.open(path, method=method, json=body, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200, (path, response.get_json())
+    return response.get_json()
+
+
+def weekly_dates(client, student_id):
+    return [r['date'] for r in get(client, f'/weekly_report/{student_id}')['weekly_attendance']]
+
+
+def last_weekday(before):
+    day = before - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def check_calendar(client, cursor):
+    today = date.today()
+    year_ago = today - timedelta(days=365)
+    span = f'?from={year_ago.isoformat()}&to={today.isoformat()}'
+    # S0000000 is in 1A (teacher 1), S0000001 in 1B, S0000004 in 2A
+    in_1a, in_1b, in_2a = 'S0000000', 'S0000001', 'S0000004'
+
+    response = client.post('/calendar/holidays', json={'date': today.isoformat(), 'name': 'x'})
+    assert response.status_code == 401, response.get_json()
+    token = client.post('/login', json={'email': TEACHER_EMAIL, 'password': PASSWORD}).get_json()['token']
+
+    # Weekends are not school days
+    window = [today - timedelta(days=i) for i in range(7)]
+    weekdays = sorted((d.isoformat() for d in window if d.weekday() < 5), reverse=True)
+    assert weekly_dates(client, in_1a) == weekdays, weekly_dates(client, in_1a)
+    base_class = get(client, f'/class_report/1/A{span}')
+    base_other = get(client, f'/class_report/2/A{span}')
+    base_student = get(client, f'/student_report/{in_1a}{span}')
+    assert base_class['school_days'] == base_student['school_days']
+    assert all(date.fromisoformat(p['date']).weekday() < 5 for p in base_class['daily'])
+
+    # A school holiday leaves every report
+    holiday = last_weekday(today)
+    send(client, 'POST', '/calendar/holidays', token, {'date': holiday.isoformat(), 'name': 'Founders day'})
+    assert holiday.isoformat() not in weekly_dates(client, in_1a)
+    assert holiday.isoformat() not in weekly_dates(client, in_2a)
+    report = get(client, f'/class_report/1/A{span}')
+    assert report['school_days'] == base_class['school_days'] - 1
+    assert holiday.isoformat() not in [p['date'] for p in report['daily']]
+    assert get(client, f'/student_report/{in_1a}{span}')['school_days'] == base_student['school_days'] - 1
+    calendar = get(client, f'/calendar?class=1&section=A&from={holiday.isoformat()}&to={holiday.isoformat()}')
+    assert calendar['holidays'][0]['name'] == 'Founders day' and calendar['school_days'] == 0
+
+    # A class holiday covers every section of the class and nothing else
+    class_holiday = last_weekday(holiday)
+    send(client, 'POST', '/calendar/holidays', token,
+         {'date': class_holiday.isoformat(), 'name': 'Class trip', 'class': '1'})
+    assert class_holiday.isoformat() not in weekly_dates(client, in_1a)
+    assert class_holiday.isoformat() not in weekly_dates(client, in_1b)
+    assert class_holiday.isoformat() in weekly_dates(client, in_2a)
+    assert get(client, f'/class_report/2/A{span}')['school_days'] == base_other['school_days'] - 1
+
+    # Saturday lessons for 1A only
+    send(client, 'PUT', '/calendar/schedule', token,
+         {'class': '1', 'section': 'A', 'weekdays': ['mon', 'tue', 'wed', 'thu', 'fri', 'sat']})
+    saturdays = sum(1 for i in range(366) if (year_ago + timedelta(days=i)).weekday() == 5
+                    and year_ago + timedelta(days=i) <= today)
+    report = get(client, f'/class_report/1/A{span}')
+    assert report['school_days'] == base_class['school_days'] - 2 + saturdays, report['school_days']
+    assert get(client, f'/class_report/1/B{span}')['school_days'] == base_class['school_days'] - 2
+    saturday = next(d for d in window if d.weekday() == 5)
+    assert saturday.isoformat() in weekly_dates(client, in_1a)
+    assert saturday.isoformat() not in weekly_dates(client, in_1b)
+    assert class_holiday.isoformat() not in weekly_dates(client, in_1a)
+
+    # Analytics: streaks count school days only, so a holiday inside an
+    # absence neither breaks nor lengthens it
+    send(client, 'PUT', '/calendar/schedule', token, {'class': '1', 'section': 'A', 'weekdays': None})
+    cursor.execute('SELECT date FROM school_days WHERE class = ? AND section = ? AND date < ? '
+                   'ORDER BY date DESC LIMIT 5', ('1', '', today.isoformat()))
+    absent_days = [row[0] for row in cursor.fetchall()]
+    cursor.execute('BEGIN')
+    cursor.executemany('DELETE FROM attendance WHERE student_id = ? AND date = ?',
+                       [(in_1a, day) for day in absent_days + [holiday.isoformat(), class_holiday.isoformat()]])
+    cursor.execute("INSERT OR IGNORE INTO attendance (student_id, date) SELECT ?, date FROM school_days "
+                   "WHERE class = '' AND section = '' AND date < ? AND date >= ? AND date NOT IN (%s)"
+                   % ','.join('?' * len(absent_days)),
+                   [in_1a, absent_days[-1], (date.fromisoformat(absent_days[-1]) - timedelta(days=14)).isoformat()]
+                   + absent_days)
+    cursor.execute('COMMIT')
+
+    def streak():
+        students = get(client, '/analytics/at_risk/1?all=1&refresh=1')['students']
+        return next(s['current_streak'] for s in students if s['student_id'] == in_1a)
+
+    # The school and class holidays fall inside the absence
+    assert streak() == 5, streak()
+    send(client, 'DELETE', '/calendar/holidays', token, {'date': holiday.isoformat()})
+    assert streak() == 6, streak()
+    send(client, 'DELETE', '/calendar/holidays', token, {'date': class_holiday.isoformat(), 'class': '1'})
+    assert streak() == 7, streak()
+
+    # Every change undone: the same reports as before, and no leftover calendars
+    assert get(client, f'/class_report/1/A{span}')['school_days'] == base_class['school_days']
+    assert weekly_dates(client, in_1b) == weekdays
+    cursor.execute('SELECT class, section FROM calendars')
+    assert cursor.fetchall() == [('', '')]
+
+    print('calendar: ok, weekends, school and class holidays and class schedules honoured by every report')
+
+
+def load_module(ref, filename):
+    """A module as it was at a git ref"""
+    source = subprocess.run(['git', 'show', f'{ref}:{filename}'], cwd=ROOT, capture_output=True,
+                            check=True, text=True).stdout
+    module = types.ModuleType(f'baseline_{filename[:-3]}')
+    exec(compile(source, filename, 'exec'), module.__dict__)
+    return module
+
+
+def mean_ms(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def benchmark(app, db, baseline, students, iterations):
+    import rollups
+    import student_cache
+    from attendance_routes import WEEKLY_ATTENDANCE_QUERY
+    client = app.test_client()
+    cursor = db.get_db().cursor()
+    today = date.today()
+    year_ago = today - timedelta(days=365)
+    rng = random.Random(7)
+    student_id = f'S{rng.randrange(students):07d}'
+    student = student_cache.get_profile(student_id)
+    week = ((today - timedelta(days=6)).isoformat(), today.isoformat())
+
+    cases = {
+        'class year daily': (lambda: rollups.class_report('3', 'B', year_ago, today),
+                             lambda: baseline['rollups'].class_report('3', 'B', year_ago, today)),
+        'class year monthly': (lambda: rollups.class_report('3', 'B', year_ago, today, 'monthly'),
+                               lambda: baseline['rollups'].class_report('3', 'B', year_ago, today, 'monthly')),
+        'student year': (lambda: rollups.student_report(student_id, student.class_name, student.section,
+                                                         year_ago, today), None),
+        'weekly query': (lambda: cursor.execute(WEEKLY_ATTENDANCE_QUERY,
+                                                (student.class_name, student.section, student_id) + week)
+                         .fetchall(),
+                         lambda: baseline['weekly'].weekly_report_body(
+                             student_id, student, cursor.execute(baseline['weekly'].WEEKLY_ATTENDANCE_QUERY,
+                                                                 (student_id,) + week).fetchall(),
+                             datetime.now())),
+        'weekly_report http': (lambda: client.get(f'/weekly_report/{student_id}'), None),
+    }
+    print(f"{'report':<20} {'baseline ms':>12} {'index ms':>9}")
+    for label, (current, old) in cases.items():
+        new_ms = mean_ms(current, iterations)
+        old_ms = f'{mean_ms(old, iterations):>12.3f}' if baseline and old else f"{'-':>12}"
+        print(f'{label:<20} {old_ms} {new_ms:>9.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--baseline', help='git ref whose Python-date reports to compare with')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        start = time.perf_counter()
+        counts = generate(path, args.students, years=1)
+        print(f'generated {counts} in {time.perf_counter() - start:.1f}s')
+        os.environ['DATABASE_PATH'] = path
+        os.chdir(tmp)
+
+        import db
+        db.DB_PATH = path
+        from app import app
+
+        baseline = None
+        if args.baseline:
+            baseline = {'rollups': load_module(args.baseline, 'rollups.py'),
+                        'weekly': load_module(args.baseline, 'attendance_routes.py')}
+
+        benchmark(app, db, baseline, args.students, args.iterations)
+        check_calendar(app.test_client(), db.connect(path).cursor())
+
+
+if __name__ == '__main__':
+    main()
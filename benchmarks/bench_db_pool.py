@@ -0,0 +1,96 @@
+"""Benchmark the mark_attendance write path: per-request connect vs pooled WAL.
+
+Runs the same SQL mark_attendance issues (student lookup, duplicate check,
+insert, commit) against a scratch database with 1, 4 and 16 concurrent
+workers, once opening a fresh sqlite3 connection per call as app.py used to
+and once through db.py's pooled connections.
+
+    python benchmarks/bench_db_pool.py [--requests 2000]
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db
+from generate_data import generate
+
+
+def seed(path, count):
+    # The full, migrated schema: db.py migrates a school's database on first
+    # use, so a hand-made one would fail under the pooled path
+    generate(path, students=count, years=0)
+    conn = sqlite3.connect(path)
+    conn.execute('DELETE FROM attendance')
+    conn.commit()
+    conn.close()
+
+
+def mark_legacy(path, student_id, today):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT name FROM students WHERE student_id = ?', (student_id,))
+    cursor.fetchone()
+    cursor.execute('SELECT id FROM attendance WHERE student_id = ? AND date = ?', (student_id, today))
+    if not cursor.fetchone():
+        cursor.execute('INSERT INTO attendance (student_id, date) VALUES (?, ?)', (student_id, today))
+    conn.commit()
+    conn.close()
+
+
+def mark_pooled(path, student_id, today):
+    with db.transaction() as cursor:
+        cursor.execute('SELECT name FROM students WHERE student_id = ?', (student_id,))
+        cursor.fetchone()
+        cursor.execute('SELECT id FROM attendance WHERE student_id = ? AND date = ?', (student_id, today))
+        if not cursor.fetchone():
+            cursor.execute('INSERT INTO attendance (student_id, date) VALUES (?, ?)', (student_id, today))
+
+
+def run(mark, workers, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path, requests)
+        db.DB_PATH = path
+        db.pool.close_all()
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        errors = []
+        lock = threading.Lock()
+
+        def task(i):
+            try:
+                mark(path, f'S{i:07d}', today)
+            except sqlite3.Error as e:
+                with lock:
+                    errors.append(str(e))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(task, range(requests)))
+        elapsed = time.perf_counter() - start
+        db.pool.close_all()
+        return requests / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'legacy req/s':>14} {'errors':>7} {'pooled req/s':>14} {'errors':>7}")
+    for workers in (1, 4, 16):
+        legacy_rps, legacy_errors = run(mark_legacy, workers, args.requests)
+        pooled_rps, pooled_errors = run(mark_pooled, workers, args.requests)
+        print(f"{workers:>8} {legacy_rps:>14.0f} {legacy_errors:>7} {pooled_rps:>14.0f} {pooled_errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
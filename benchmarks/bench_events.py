@@ -0,0 +1,249 @@
+"""Measure /events delivery latency and memory per idle subscriber.
+
+Starts the app (uvicorn asgi:app, gunicorn with one threaded worker, and
+two workers sharing events through the relay file - see events.py),
+logs in as a teacher, opens N Server-Sent Events streams for that teacher
+and records the server's RSS growth per open stream. It then marks
+attendance for the teacher's students and times how long each event takes
+to reach every subscriber after the POST is sent.
+
+The in-process broker is also measured on its own: bytes per idle
+subscription (tracemalloc) and publish-to-receive latency.
+
+    python benchmarks/bench_events.py [--subscribers 200 --marks 50]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate, PASSWORD, CLASSES, SECTIONS
+from smtp_sink import SMTPSink
+from load_test import percentile, start_server, gunicorn_command, uvicorn_command
+
+TEACHERS = len(CLASSES) * len(SECTIONS)
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def tree_rss_kb(pid):
+    """RSS of a process plus its children (gunicorn workers)"""
+    total = rss_kb(pid)
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            total += sum(rss_kb(int(child)) for child in f.read().split())
+    except OSError:
+        pass
+    return total
+
+
+async def http_json(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+                 f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b'\r\n\r\n')
+    if b'chunked' in head.lower():
+        data = dechunk(data)
+    return int(head.split()[1]), json.loads(data or b'{}')
+
+
+def dechunk(data):
+    out = b''
+    while data:
+        size, _, data = data.partition(b'\r\n')
+        size = int(size, 16)
+        if size == 0:
+            break
+        out, data = out + data[:size], data[size + 2:]
+    return out
+
+
+class SSEClient:
+    def __init__(self, port, token, on_event):
+        self.port = port
+        self.token = token
+        self.on_event = on_event
+        self.connected = asyncio.Event()
+
+    async def run(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write(f'GET /events?token={self.token} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                     f'Accept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+        chunked = b'chunked' in head.lower()
+        buffer = b''
+        try:
+            while True:
+                if chunked:
+                    size = int((await reader.readline()).strip() or b'0', 16)
+                    if size == 0:
+                        return
+                    buffer += await reader.readexactly(size)
+                    await reader.readexactly(2)
+                else:
+                    chunk = await reader.read(65536)
+                    if not chunk:
+                        return
+                    buffer += chunk
+                self.connected.set()
+                while b'\n\n' in buffer:
+                    block, buffer = buffer.split(b'\n\n', 1)
+                    fields = dict(line.split(': ', 1) for line in block.decode().splitlines()
+                                  if ': ' in line and not line.startswith(':'))
+                    if 'event' in fields:
+                        self.on_event(fields['event'], json.loads(fields['data']))
+        finally:
+            writer.close()
+
+
+async def measure_server(port, pid, subscribers, marks, students):
+    status, login = await http_json(port, 'POST', '/login',
+                                    {'email': f'teacher{CLASSES[0]}{SECTIONS[0].lower()}@example.com',
+                                     'password': PASSWORD})
+    assert status == 200, login
+    token = login['token']
+
+    sent = {}
+    latencies = []
+
+    def on_event(name, data):
+        if name == 'attendance' and data['student_id'] in sent:
+            latencies.append(time.perf_counter() - sent[data['student_id']])
+
+    before = tree_rss_kb(pid)
+    clients = [SSEClient(port, token, on_event) for _ in range(subscribers)]
+    tasks = [asyncio.create_task(client.run()) for client in clients]
+    await asyncio.wait_for(asyncio.gather(*(client.connected.wait() for client in clients)), 60)
+    await asyncio.sleep(1)
+    per_subscriber = (tree_rss_kb(pid) - before) / subscribers
+
+    # Teacher 1 teaches students 0, TEACHERS, 2 * TEACHERS, ...
+    for n in range(min(marks, students // TEACHERS)):
+        student_id = f'S{n * TEACHERS:07d}'
+        sent[student_id] = time.perf_counter()
+        await http_json(port, 'POST', '/mark_attendance', {'student_id': student_id})
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(1)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    latencies.sort()
+    expected = len(sent) * subscribers
+    return per_subscriber, latencies, expected
+
+
+def measure_broker(subscribers):
+    import events
+
+    broker = events.Broker()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    subscriptions = [broker.subscribe([f'teacher:{n % TEACHERS}']) for n in range(subscribers)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+    # One teacher with 100 subscriber threads; time publish -> get()
+    for subscription in subscriptions:
+        subscription.close()
+    waiting = [broker.subscribe(['teacher:0']) for _ in range(100)]
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def consume(subscription):
+        while not stop.is_set():
+            for event in subscription.get(0.2):
+                received = time.perf_counter()
+                with lock:
+                    latencies.append(received - json.loads(event.data)['sent'])
+
+    threads = [threading.Thread(target=consume, args=(s,)) for s in waiting]
+    for thread in threads:
+        thread.start()
+    for _ in range(50):
+        broker.publish(['teacher:0'], 'attendance', {'sent': time.perf_counter()})
+        time.sleep(0.01)
+    time.sleep(0.5)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return size / subscribers, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2400)
+    parser.add_argument('--subscribers', type=int, default=200)
+    parser.add_argument('--marks', type=int, default=30)
+    args = parser.parse_args()
+
+    per_subscriber, latencies = measure_broker(10000)
+    print(f'broker: {per_subscriber:.0f} bytes per idle subscription, publish->get '
+          f'p50 {percentile(latencies, 0.5) * 1000:.2f} ms p99 {percentile(latencies, 0.99) * 1000:.2f} ms '
+          f'(100 subscriber threads)')
+
+    # Every subscriber gets a stream; the spare threads serve the marks
+    os.environ['MAX_EVENT_STREAMS'] = str(args.subscribers)
+    servers = [
+        ('uvicorn asgi:app', uvicorn_command(), {}),
+        (f'gunicorn -w 1 --threads {args.subscribers + 16}', gunicorn_command(1, args.subscribers + 16), {}),
+        (f'gunicorn -w 2 --threads {args.subscribers + 16}', gunicorn_command(2, args.subscribers + 16),
+         {'EVENT_RELAY_PATH': 'event_relay.db', 'EVENT_EPOCH': 'bench'}),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        db_path = os.path.join(tmp, 'school.db')
+        generate(db_path, args.students, years=0)
+        sink = SMTPSink().start()
+
+        print(f"{'server':<28} {'subs':>5} {'KB/sub':>7} {'delivered':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        try:
+            for label, command, env in servers:
+                import sqlite3
+                conn = sqlite3.connect(db_path)
+                conn.execute('DELETE FROM attendance')
+                conn.commit()
+                conn.close()
+
+                os.environ.update(env)
+                server, port = start_server(command, tmp, db_path, sink.port)
+                for name in env:
+                    del os.environ[name]
+                try:
+                    per_sub, latencies, expected = asyncio.run(
+                        measure_server(port, server.pid, args.subscribers, args.marks, args.students))
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+                p50 = percentile(latencies, 0.5)
+                p99 = percentile(latencies, 0.99)
+                print(f"{label:<28} {args.subscribers:>5} {per_sub:>7.1f} {len(latencies):>5}/{expected:<4} "
+                      f"{p50 * 1000 if p50 else float('nan'):>8.2f} {p99 * 1000 if p99 else float('nan'):>8.2f}")
+        finally:
+            sink.stop()
+
+
+if __name__ == '__main__':
+    main()
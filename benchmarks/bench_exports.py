@@ -0,0 +1,129 @@
+"""Benchmark streaming attendance exports over ~1M attendance rows.
+
+Builds a scratch database with every student in one teacher's classes
+(exports only cover the logged-in teacher's students), then downloads all
+of their attendance from /export/attendance as CSV and XLSX through the
+in-process app, and
+for comparison builds the same files the load-everything way (pandas
+read_sql + to_csv/to_excel). Each run happens in a fresh subprocess and
+reports the peak growth of anonymous RSS (heap) sampled during the run;
+file pages SQLite maps into memory (mmap_size) are not counted.
+
+    python benchmarks/bench_exports.py [--students 2100 --years 2]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+TEACHER_EMAIL = 'teacher1a@example.com'
+RUNS = ['stream-csv', 'stream-xlsx', 'pandas-csv', 'pandas-xlsx']
+
+
+def anon_rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1])
+    return 0
+
+
+class PeakSampler(threading.Thread):
+    """Track the highest anonymous RSS while a run is in progress"""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = anon_rss_kb()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, anon_rss_kb())
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return max(self.peak, anon_rss_kb())
+
+
+def run(mode, db_path):
+    """Produce one export and return its size, time and peak heap growth"""
+    os.environ['MAIL_DISPATCHER'] = 'external'
+    import db
+    db.DB_PATH = db_path
+    import pandas as pd
+    from app import app
+
+    from generate_data import PASSWORD
+    client = app.test_client()
+    login = client.post('/login', json={'email': TEACHER_EMAIL, 'password': PASSWORD}).get_json()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {login['token']}"
+    teacher_id = login['user_id']
+    baseline = anon_rss_kb()
+    sampler = PeakSampler()
+    sampler.start()
+    start = time.perf_counter()
+    size = 0
+    if mode.startswith('stream'):
+        output = mode.split('-')[1]
+        response = client.get(f'/export/attendance?from=2000-01-01&format={output}', buffered=False)
+        assert response.status_code == 200, response.status_code
+        for chunk in response.response:
+            size += len(chunk)
+    else:
+        import io
+        import exports
+        from datetime import date
+        query, params = exports.attendance_query(date(2000, 1, 1), date.today(), teacher_id)
+        frame = pd.read_sql(query, db.connect(), params=params)
+        buffer = io.BytesIO()
+        if mode == 'pandas-csv':
+            frame.to_csv(buffer, index=False)
+        else:
+            frame.to_excel(buffer, index=False, sheet_name='Attendance')
+        size = buffer.tell()
+    elapsed = time.perf_counter() - start
+    peak = sampler.stop()
+    return {'mode': mode, 'bytes': size, 'seconds': round(elapsed, 2), 'peak_heap_mb': round((peak - baseline) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2100)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--runs', nargs='+', default=RUNS, choices=RUNS)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.run, args.db)))
+        return
+
+    from generate_data import generate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'school.db')
+        counts = generate(db_path, args.students, years=args.years)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('UPDATE students SET teacher_id = (SELECT id FROM teachers WHERE email = ?)',
+                         (TEACHER_EMAIL,))
+        print(f"{counts['attendance']:,} attendance rows, {counts['students']:,} students")
+        print(f"{'run':<13} {'size MB':>8} {'seconds':>8} {'peak heap +MB':>14}")
+        for mode in args.runs:
+            result = subprocess.run([sys.executable, __file__, '--run', mode, '--db', db_path],
+                                    cwd=tmp, capture_output=True, text=True, check=True)
+            result = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{mode:<13} {result['bytes'] / 1e6:>8.1f} {result['seconds']:>8} {result['peak_heap_mb']:>14}")
+
+
+if __name__ == '__main__':
+    main()
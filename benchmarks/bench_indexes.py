@@ -0,0 +1,93 @@
+"""Benchmark lookup latency before and after the index migration.
+
+Generates a database at schema version 1 (no lookup indexes), times the
+queries mark_attendance, weekly_report and get_students issue, then applies
+the remaining migrations and times them again.
+
+    python benchmarks/bench_indexes.py [--students 5000 --years 3]
+"""
+import os
+import sys
+import random
+import sqlite3
+import argparse
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from migrations import migrate
+from generate_data import generate, CLASSES, SECTIONS
+
+QUERIES = {
+    'mark_attendance duplicate check':
+        'SELECT id FROM attendance WHERE student_id = ? AND date = ?',
+    'weekly_report range':
+        'SELECT date, status FROM attendance WHERE student_id = ? AND date BETWEEN ? AND ? ORDER BY date DESC',
+    'get_students by teacher':
+        'SELECT student_id, name, email, class, section, roll_no, created_at FROM students WHERE teacher_id = ? ORDER BY name',
+    'students by class/section':
+        'SELECT student_id, name FROM students WHERE class = ? AND section = ?',
+}
+
+
+def params_for(name, rng, students):
+    student_id = f'S{rng.randrange(students):07d}'
+    today = date.today()
+    if name == 'mark_attendance duplicate check':
+        return (student_id, today.isoformat())
+    if name == 'weekly_report range':
+        return (student_id, (today - timedelta(days=6)).isoformat(), today.isoformat())
+    if name == 'get_students by teacher':
+        return (rng.randrange(len(CLASSES) * len(SECTIONS)) + 1,)
+    return (rng.choice(CLASSES), rng.choice(SECTIONS))
+
+
+def time_queries(conn, students, iterations):
+    rng = random.Random(7)
+    results = {}
+    for name, sql in QUERIES.items():
+        samples = []
+        for _ in range(iterations):
+            params = params_for(name, rng, students)
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        results[name] = (sum(samples) / len(samples), samples[int(len(samples) * 0.95) - 1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        start = time.perf_counter()
+        counts = generate(path, args.students, args.years, schema_version=1)
+        print(f'generated {counts} in {time.perf_counter() - start:.1f}s')
+
+        conn = sqlite3.connect(path, isolation_level=None)
+        before = time_queries(conn, args.students, args.iterations)
+
+        start = time.perf_counter()
+        conn.execute('BEGIN')
+        migrate(conn.cursor())
+        conn.execute('COMMIT')
+        print(f'migrated in {time.perf_counter() - start:.1f}s')
+        after = time_queries(conn, args.students, args.iterations)
+        conn.close()
+
+    print(f"{'query':<34} {'before ms (mean/p95)':>22} {'after ms (mean/p95)':>22}")
+    for name in QUERIES:
+        b, a = before[name], after[name]
+        print(f'{name:<34} {b[0]:>10.3f} / {b[1]:<9.3f} {a[0]:>10.3f} / {a[1]:<9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark /login throughput per core.
+
+Compares the old login path (teacher lookup, then student lookup on a miss,
+each on a fresh connection) with the accounts-view lookup under a few
+hashing policies, and measures how cheaply throttled requests are turned
+away. Runs in a single thread, so the numbers are logins/sec per core.
+
+    python benchmarks/bench_login.py [--logins 40]
+"""
+import os
+import sys
+import random
+import sqlite3
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from generate_data import generate, PASSWORD
+
+POLICIES = ['scrypt', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000']
+
+
+def legacy_login(path, email, password):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, name, email, password_hash FROM teachers WHERE email = ?', (email,))
+    teacher = cursor.fetchone()
+    if teacher and check_password_hash(teacher[3], password):
+        conn.close()
+        return True
+    cursor.execute('''
+        SELECT student_id, name, email, password_hash, class, section, roll_no
+        FROM students WHERE email = ?
+    ''', (email,))
+    student = cursor.fetchone()
+    conn.close()
+    return bool(student and check_password_hash(student[3], password))
+
+
+def rate(fn, count):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--logins', type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        path = os.path.join(tmp, 'bench.db')
+        generate(path, args.students, years=0)
+        os.environ['MAIL_DISPATCHER'] = 'external'
+        import db
+        db.DB_PATH = path
+        import app as school_app
+        import accounts
+        client = school_app.app.test_client()
+
+        rng = random.Random(5)
+        emails = [f'student{rng.randrange(args.students)}@example.com' for _ in range(args.logins)]
+
+        def reset_limits():
+            accounts.ip_limiter.reset('127.0.0.1')
+            for email in emails:
+                accounts.account_limiter.reset(email)
+
+        print(f"{'path':<36} {'logins/s':>9}")
+        legacy = rate(lambda i: legacy_login(path, emails[i], PASSWORD), args.logins)
+        print(f"{'legacy two-query':<36} {legacy:>9.1f}")
+
+        for method in POLICIES:
+            accounts.PASSWORD_HASH_METHOD = method
+            accounts._method_prefix = None
+            password_hash = generate_password_hash(PASSWORD, method=method)
+            cursor = db.get_db().cursor()
+            cursor.execute('UPDATE students SET password_hash = ?', (password_hash,))
+            reset_limits()
+
+            # Successful logins never count against the IP
+            def login(i):
+                response = client.post('/login', json={'email': emails[i], 'password': PASSWORD})
+                assert response.status_code == 200, response.json
+
+            print(f"{'accounts view, ' + method:<36} {rate(login, args.logins):>9.1f}")
+
+        # Once an IP is over its limit every request is refused before hashing
+        reset_limits()
+        for _ in range(accounts.ip_limiter.limit):
+            accounts.ip_limiter.hit('127.0.0.1')
+
+        def throttled(i):
+            response = client.post('/login', json={'email': emails[i % len(emails)], 'password': 'wrong'})
+            assert response.status_code == 429
+
+        print(f"{'throttled (429)':<36} {rate(throttled, args.logins * 50):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
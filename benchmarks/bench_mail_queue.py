@@ -0,0 +1,72 @@
+"""Benchmark the outbound email queue against a local SMTP sink.
+
+Compares the old pattern (one synchronous ``mail.send`` per message, each
+opening its own SMTP connection inside the request) with enqueueing and
+letting the background dispatcher drain the queue over reused connections.
+
+    python benchmarks/bench_mail_queue.py [--messages 500 --connect-delay 0.05]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from smtp_sink import SMTPSink
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--connect-delay', type=float, default=0.05,
+                        help='seconds the sink stalls on each new connection')
+    args = parser.parse_args()
+
+    sink = SMTPSink(connect_delay=args.connect_delay).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ.update({
+            'DATABASE_PATH': os.path.join(tmp, 'bench.db'),
+            'MAIL_SERVER': '127.0.0.1',
+            'MAIL_PORT': str(sink.port),
+            'MAIL_USE_TLS': 'false',
+            'MAIL_USERNAME': '',
+            'MAIL_PASSWORD': '',
+            'MAIL_POLL_INTERVAL': '0.1',
+        })
+        import app as school_app
+        from flask_mail import Message
+        import mailer
+        import web
+
+        # Old behaviour: a connection per message, inside the request
+        start = time.perf_counter()
+        with school_app.app.app_context():
+            for i in range(args.messages):
+                mailer.dispatcher.mail.send(Message(subject='Bench', recipients=[f'sync{i}@example.com'], body='x'))
+        sync_time = time.perf_counter() - start
+        sync_connections = sink.connections
+
+        # New behaviour: enqueue in the request, dispatcher drains in batches
+        start = time.perf_counter()
+        for i in range(args.messages):
+            web.send_email(f'queued{i}@example.com', 'Bench', 'x')
+        enqueue_time = time.perf_counter() - start
+        while mailer.queue_summary().get('sent', 0) < args.messages:
+            time.sleep(0.01)
+        drain_time = time.perf_counter() - start
+        queued_connections = sink.connections - sync_connections
+
+    sink.stop()
+    print(f"{'mode':<26} {'msgs/s':>8} {'per-request ms':>15} {'SMTP conns':>11}")
+    print(f"{'synchronous mail.send':<26} {args.messages / sync_time:>8.0f} "
+          f"{sync_time / args.messages * 1000:>15.2f} {sync_connections:>11}")
+    print(f"{'queue + dispatcher':<26} {args.messages / drain_time:>8.0f} "
+          f"{enqueue_time / args.messages * 1000:>15.2f} {queued_connections:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark QR generation: uncached render vs cache hit vs 304 revalidation.
+
+Also times a bulk class render into a zip and a PDF sheet.
+
+    python benchmarks/bench_qr_cache.py [--students 200]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate, PASSWORD
+
+
+def mean_ms(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        path = os.path.join(tmp, 'bench.db')
+        generate(path, students=args.students, years=0)
+        os.environ['DATABASE_PATH'] = path
+        import db
+        db.DB_PATH = path
+        import app as school_app
+        import qr_cache
+        client = school_app.app.test_client()
+        # QR codes are issued to a logged-in teacher (or the student)
+        token = client.post('/login', json={'email': 'teacher1a@example.com', 'password': PASSWORD}).get_json()['token']
+        client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        ids = [f'S{i:07d}' for i in range(args.students)]
+        etags = {}
+
+        def fetch(student_id):
+            response = client.get(f'/generate_qr/{student_id}')
+            assert response.status_code == 200, response.get_json()
+            etags[student_id] = response.headers['ETag']
+
+        def revalidate(student_id):
+            response = client.get(f'/generate_qr/{student_id}', headers={'If-None-Match': etags[student_id]})
+            assert response.status_code == 304
+
+        cold = mean_ms(fetch, ids)
+        warm = mean_ms(fetch, ids)
+        not_modified = mean_ms(revalidate, ids)
+        png = mean_ms(lambda sid: client.get(f'/qr/{sid}.png'), ids)
+
+        print(f"{'generate_qr (render + store)':<32} {cold:>8.2f} ms")
+        print(f"{'generate_qr (cache hit)':<32} {warm:>8.2f} ms")
+        print(f"{'generate_qr (304)':<32} {not_modified:>8.2f} ms")
+        print(f"{'/qr/<id>.png (cache hit)':<32} {png:>8.2f} ms")
+
+        # Bulk: one class/section, with an empty cache
+        for name in os.listdir(qr_cache.QR_DIR):
+            os.remove(os.path.join(qr_cache.QR_DIR, name))
+        for fmt in ('zip', 'pdf'):
+            start = time.perf_counter()
+            response = client.get(f'/generate_qr_bulk/1/A?format={fmt}')
+            assert response.status_code == 200
+            print(f"{'bulk class 1-A ' + fmt:<32} {(time.perf_counter() - start) * 1000:>8.0f} ms "
+                  f"({len(response.data) // 1024} KiB)")
+
+
+if __name__ == '__main__':
+    main()
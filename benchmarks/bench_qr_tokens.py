@@ -0,0 +1,104 @@
+"""Compare signed QR tokens with the old JSON QR payload.
+
+For a sample of students, renders each code both ways through
+qr_cache.render_png and reports the QR version, PNG size and render time,
+plus the cost of verifying a token (what mark_attendance now does before
+touching the database).
+
+    python benchmarks/bench_qr_tokens.py [--students 200]
+"""
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import statistics
+
+import qrcode
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from qr_cache import render_png
+from qr_tokens import Signer, InvalidQRToken
+
+
+def json_payload(student_id, name, class_name, section, roll_no):
+    """The payload generate_qr used to encode"""
+    return json.dumps({
+        'student_id': student_id,
+        'name': name,
+        'class': class_name,
+        'section': section,
+        'roll_no': roll_no
+    })
+
+
+def qr_version(payload):
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.version
+
+
+def measure(payloads):
+    versions, sizes, times = [], [], []
+    for payload in payloads:
+        start = time.perf_counter()
+        png = render_png(payload)
+        times.append(time.perf_counter() - start)
+        sizes.append(len(png))
+        versions.append(qr_version(payload))
+    return {
+        'chars': statistics.mean(len(p) for p in payloads),
+        'version': statistics.mean(versions),
+        'png_bytes': statistics.mean(sizes),
+        'render_ms': statistics.mean(times) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    students = []
+    for i in range(args.students):
+        student_id = ''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(8))
+        name = f'{rng.choice(["Aarav", "Diya", "Ishaan", "Meera", "Vihaan"])} {rng.choice(["Sharma", "Iyer", "Khan", "Patel"])}'
+        students.append((student_id, name, str(rng.randint(1, 12)), rng.choice('ABCD'), str(rng.randint(1, 60))))
+
+    signer = Signer({'1': os.urandom(32), '0': os.urandom(32)}, window_seconds=60)
+    rows = [
+        ('JSON payload', measure([json_payload(*s) for s in students])),
+        ('printed token', measure([signer.sign(s[0], windowed=False) for s in students])),
+        ('windowed token', measure([signer.sign(s[0], windowed=True) for s in students])),
+    ]
+
+    print(f"{'payload':<16} {'chars':>6} {'version':>8} {'PNG bytes':>10} {'render ms':>10}")
+    for label, r in rows:
+        print(f"{label:<16} {r['chars']:>6.1f} {r['version']:>8.1f} {r['png_bytes']:>10.0f} {r['render_ms']:>10.2f}")
+
+    tokens = [signer.sign(s[0]) for s in students]
+    forged = [token[:-1] + ('A' if token[-1] != 'A' else 'B') for token in tokens]
+    rounds = max(1, 100000 // len(tokens))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for token in tokens:
+            signer.verify(token)
+    valid = (time.perf_counter() - start) / (rounds * len(tokens))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for token in forged:
+            try:
+                signer.verify(token)
+            except InvalidQRToken:
+                pass
+    rejected = (time.perf_counter() - start) / (rounds * len(tokens))
+    print(f'verify: {valid * 1e6:.1f} us per valid token, {rejected * 1e6:.1f} us per forged token')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark the reports against scanning raw attendance.
+
+Class reports read the class_daily rollup; the student report looks up the
+student's marks on each school day of their calendar.
+
+    python benchmarks/bench_rollups.py [--students 5000 --years 1]
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate, CLASSES, SECTIONS
+
+
+def raw_class_report(cursor, class_name, section, start, end):
+    cursor.execute('''
+        SELECT a.date, COUNT(*) FROM attendance a
+        JOIN students s ON s.student_id = a.student_id
+        WHERE s.class = ? AND s.section = ? AND a.status = 'present' AND a.date BETWEEN ? AND ?
+        GROUP BY a.date ORDER BY a.date
+    ''', (class_name, section, start.isoformat(), end.isoformat()))
+    return cursor.fetchall()
+
+
+def raw_student_report(cursor, student_id, start, end):
+    cursor.execute('''
+        SELECT substr(date, 1, 7), COUNT(*) FROM attendance
+        WHERE student_id = ? AND status = 'present' AND date BETWEEN ? AND ?
+        GROUP BY substr(date, 1, 7)
+    ''', (student_id, start.isoformat(), end.isoformat()))
+    return cursor.fetchall()
+
+
+def mean_ms(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        start = time.perf_counter()
+        counts = generate(path, args.students, args.years)
+        print(f'generated {counts} in {time.perf_counter() - start:.1f}s')
+
+        import db
+        import rollups
+        db.DB_PATH = path
+        cursor = db.get_db().cursor()
+        rng = random.Random(3)
+        today = date.today()
+        ranges = {
+            'month': (today.replace(day=1), today),
+            'term': (today - timedelta(days=120), today),
+            'year': (today - timedelta(days=365), today),
+        }
+
+        print(f"{'report':<22} {'raw ms':>9} {'report ms':>10}")
+        for label, (first, last) in ranges.items():
+            group = (rng.choice(CLASSES), rng.choice(SECTIONS))
+            raw = mean_ms(lambda: raw_class_report(cursor, *group, first, last), args.iterations)
+            rolled = mean_ms(lambda: rollups.class_report(*group, first, last), args.iterations)
+            print(f"{'class ' + label:<22} {raw:>9.3f} {rolled:>10.3f}")
+            rolled = mean_ms(lambda: rollups.class_report(*group, first, last, 'monthly'), args.iterations)
+            print(f"{'class ' + label + ' monthly':<22} {'':>9} {rolled:>10.3f}")
+
+        student_id = f'S{rng.randrange(args.students):07d}'
+        cursor.execute('SELECT class, section FROM students WHERE student_id = ?', (student_id,))
+        group = cursor.fetchone()
+        first, last = ranges['year']
+        raw = mean_ms(lambda: raw_student_report(cursor, student_id, first, last), args.iterations)
+        rolled = mean_ms(lambda: rollups.student_report(student_id, *group, first, last), args.iterations)
+        print(f"{'student year':<22} {raw:>9.3f} {rolled:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark cold start: app import time and per-worker memory.
+
+For the working tree, and optionally an older commit (--baseline, unpacked
+with git archive), against the same generated database:
+
+* import   ``import app`` in a fresh interpreter, --runs times; median
+           seconds, resident memory afterwards and which heavy libraries
+           (pandas, numpy, openpyxl, qrcode, PIL, flask_mail) got loaded
+* gunicorn starts --workers workers the way the procfile does and reports
+           the time until the first request is answered and each idle
+           worker's RSS and PSS (memory not shared with the master)
+
+Reads /proc, so Linux only.
+
+    python benchmarks/bench_startup.py [--baseline HEAD~1 --workers 4]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate
+from load_test import ROOT, free_port, wait_for_server
+
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'qrcode', 'PIL', 'flask_mail')
+
+IMPORT_PROBE = f'''
+import sys, json, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+print(json.dumps({{'seconds': elapsed, 'rss_kb': rss,
+                  'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+'''
+
+
+def server_env(root, db_path):
+    return dict(os.environ, DATABASE_PATH=db_path, PYTHONPATH=root, LOG_LEVEL='WARNING',
+                MAIL_DISPATCHER='external', JOB_RUNNER='external')
+
+
+def measure_import(root, db_path, workdir, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=workdir, env=server_env(root, db_path),
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return {
+        'seconds': statistics.median(s['seconds'] for s in samples),
+        'rss_mb': statistics.median(s['rss_kb'] for s in samples) / 1024,
+        'heavy': samples[-1]['heavy'],
+    }
+
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB"""
+    with open(f'/proc/{pid}/status') as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            pss = next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+    except OSError:
+        pss = None
+    return rss, pss
+
+
+def worker_pids(master):
+    with open(f'/proc/{master}/task/{master}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def measure_gunicorn(root, db_path, workdir, workers):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'app:app']
+    # The procfile runs from the project root, where gunicorn finds its config
+    config = os.path.join(root, 'gunicorn.conf.py')
+    if os.path.exists(config):
+        command[3:3] = ['--config', config]
+    start = time.perf_counter()
+    server = subprocess.Popen(command, cwd=workdir, env=server_env(root, db_path))
+    try:
+        wait_for_server('127.0.0.1', port, timeout=120)
+        first_response = time.perf_counter() - start
+        # Let every worker finish booting before reading its memory
+        deadline = time.monotonic() + 60
+        while len(worker_pids(server.pid)) < workers and time.monotonic() < deadline:
+            time.sleep(0.1)
+        time.sleep(2)
+        usage = [memory_kb(pid) for pid in worker_pids(server.pid)]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {
+        'first_response_s': first_response,
+        'worker_rss_mb': statistics.mean(rss for rss, _ in usage) / 1024,
+        'worker_pss_mb': statistics.mean(pss for _, pss in usage) / 1024 if all(p for _, p in usage) else None,
+    }
+
+
+def unpack(ref, dest):
+    archive = subprocess.run(['git', 'archive', ref], cwd=ROOT, capture_output=True, check=True).stdout
+    os.makedirs(dest)
+    subprocess.run(['tar', '-x', '-C', dest], input=archive, check=True)
+    return dest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--baseline', help='git ref to compare against, e.g. HEAD~1')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'school.db')
+        generate(db_path, args.students, years=0)
+        trees = [('working tree', ROOT)]
+        if args.baseline:
+            trees.insert(0, (args.baseline, unpack(args.baseline, os.path.join(tmp, 'baseline'))))
+
+        print(f"{'tree':<14} {'import s':>9} {'import MB':>10} {'first resp s':>13} {'worker RSS MB':>14} "
+              f"{'worker PSS MB':>14}  heavy modules loaded")
+        for n, (name, root) in enumerate(trees):
+            workdir = os.path.join(tmp, f'run{n}')
+            os.makedirs(workdir)
+            run_db = os.path.join(workdir, 'school.db')
+            shutil.copy(db_path, run_db)
+            imported = measure_import(root, run_db, workdir, args.runs)
+            served = measure_gunicorn(root, run_db, workdir, args.workers)
+            pss = f"{served['worker_pss_mb']:.1f}" if served['worker_pss_mb'] is not None else '-'
+            print(f"{name:<14} {imported['seconds']:>9.3f} {imported['rss_mb']:>10.1f} "
+                  f"{served['first_response_s']:>13.2f} {served['worker_rss_mb']:>14.1f} {pss:>14}  "
+                  f"{', '.join(imported['heavy']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
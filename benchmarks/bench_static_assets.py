@@ -0,0 +1,68 @@
+"""Benchmark dashboard asset loads: cold cache vs warm cache vs revalidation.
+
+A "page load" fetches an HTML page plus the local CSS/JS it references,
+accepting gzip like a browser. Cold clears the asset cache before every
+load (equivalent to reading from disk each time), warm serves from memory,
+and revalidate sends the previous ETags back and gets 304s.
+
+    python benchmarks/bench_static_assets.py [--loads 500]
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+PAGES = ['index.html', 'teacher_dashboard.html', 'student_dashboard.html']
+
+
+def page_assets(client, page):
+    html = client.get(f'/{page}').data.decode()
+    return [page] + re.findall(r'(?:href|src)="([\w./-]+\.(?:css|js)\?v=\w+)"', html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--loads', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        import app as school_app
+        import static_assets
+        client = school_app.app.test_client()
+        headers = {'Accept-Encoding': 'gzip, deflate, br'}
+
+        print(f"{'page':<24} {'mode':<11} {'ms/load':>8} {'bytes/load':>11}")
+        for page in PAGES:
+            urls = page_assets(client, page)
+            etags = {}
+
+            def load(mode):
+                total = 0
+                for url in urls:
+                    request_headers = dict(headers)
+                    if mode == 'revalidate':
+                        request_headers['If-None-Match'] = etags[url]
+                    response = client.get(f'/{url}', headers=request_headers)
+                    etags[url] = response.headers.get('ETag', etags.get(url))
+                    total += len(response.data)
+                return total
+
+            for mode in ('cold', 'warm', 'revalidate'):
+                load('warm')
+                start = time.perf_counter()
+                for _ in range(args.loads):
+                    if mode == 'cold':
+                        static_assets.cache.clear()
+                    size = load(mode)
+                elapsed = (time.perf_counter() - start) / args.loads * 1000
+                print(f'{page:<24} {mode:<11} {elapsed:>8.3f} {size:>11}')
+
+
+if __name__ == '__main__':
+    main()
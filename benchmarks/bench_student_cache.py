@@ -0,0 +1,117 @@
+"""Benchmark QR scans with the student profile cache disabled, warm, and shared.
+
+Starts gunicorn on a fresh scratch database for each mode, warms the cache
+by opening every student's weekly report (what a dashboard does before a
+scan), then sends one /mark_attendance scan per student and a second pass
+of weekly reports. Modes:
+
+* disabled  STUDENT_CACHE_SIZE=0, every request queries the students table
+* local     per-worker LRU only; each worker warms its own copy
+* shared    per-worker LRU backed by a local Redis stand-in (redis_sink.py),
+            so one worker's miss fills every worker's cache
+
+End-to-end numbers on a small machine are dominated by HTTP handling, so it
+also times the lookup itself in-process: a students query, an in-process
+hit and a shared-layer hit.
+
+    python benchmarks/bench_student_cache.py [--students 5000 --workers 4]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate
+from redis_sink import RedisSink
+from smtp_sink import SMTPSink
+from load_test import json_request, run_endpoint, start_server, gunicorn_command
+
+MODES = ['disabled', 'local', 'shared']
+
+
+def lookup_costs(db_path, ids, redis_url, rounds=3):
+    """Microseconds per profile lookup answered by each layer"""
+    import db
+    import student_cache
+    db.DB_PATH = db_path
+    student_cache.local = student_cache.LocalCache(len(ids), 3600)
+    shared = student_cache.SharedCache(redis_url, 3600)
+
+    def per_lookup(lookup):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for student_id in ids:
+                lookup(student_id)
+        return (time.perf_counter() - start) / (rounds * len(ids)) * 1e6
+
+    student_cache.STUDENT_CACHE_SIZE = 0
+    costs = {'database': per_lookup(student_cache.get_profile)}
+    student_cache.STUDENT_CACHE_SIZE = len(ids)
+    for student_id in ids:
+        shared.put(student_cache.cache_key(student_id), student_cache.get_profile(student_id))
+    costs['local hit'] = per_lookup(student_cache.get_profile)
+    costs['shared hit'] = per_lookup(lambda student_id: shared.get(student_cache.cache_key(student_id)))
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    args = parser.parse_args()
+
+    ids = [f'S{i:07d}' for i in range(args.students)]
+
+    def report(i):
+        return json_request('GET', f'/weekly_report/{ids[i * 7919 % len(ids)]}')
+
+    def scan(i):
+        return json_request('POST', '/mark_attendance', {'student_id': ids[i]})
+
+    print(f"{'mode':<9} {'endpoint':<15} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    smtp = SMTPSink().start()
+    redis = RedisSink().start()
+    try:
+        for mode in args.modes:
+            os.environ['STUDENT_CACHE_SIZE'] = '0' if mode == 'disabled' else str(args.students * 2)
+            os.environ.pop('STUDENT_CACHE_URL', None)
+            if mode == 'shared':
+                os.environ['STUDENT_CACHE_URL'] = redis.url
+                redis.data.clear()
+
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = os.path.join(tmp, 'school.db')
+                generate(db_path, args.students, years=0)
+                server, port = start_server(gunicorn_command(args.workers, args.threads), tmp, db_path, smtp.port)
+                try:
+                    run_endpoint('127.0.0.1', port, report, len(ids), args.concurrency)
+                    results = [
+                        ('mark_attendance', run_endpoint('127.0.0.1', port, scan, len(ids), args.concurrency)),
+                        ('weekly_report', run_endpoint('127.0.0.1', port, report, len(ids), args.concurrency)),
+                    ]
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+
+            for endpoint, r in results:
+                print(f"{mode:<9} {endpoint:<15} {r['throughput_rps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8} "
+                      f"{r['errors']:>7}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'school.db')
+            generate(db_path, args.students, years=0)
+            costs = lookup_costs(db_path, ids, redis.url)
+        print('per lookup: ' + ', '.join(f'{layer} {us:.1f} us' for layer, us in costs.items()))
+    finally:
+        redis.stop()
+        smtp.stop()
+
+
+if __name__ == '__main__':
+    main()
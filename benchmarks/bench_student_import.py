@@ -0,0 +1,78 @@
+"""Benchmark the bulk student import for 100, 1,000 and 10,000-row sheets.
+
+Writes synthetic xlsx and CSV sheets, posts them to /add_students_excel on
+the in-process app against a scratch database (SMTP disabled), polls the
+import job until it finishes and prints how long the upload request took,
+the total time and the per-stage timings the job reports.
+
+    python benchmarks/bench_student_import.py [--sizes 100 1000 10000]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def write_sheet(path, rows, offset):
+    df = pd.DataFrame({
+        'name': [f'Student {offset + i}' for i in range(rows)],
+        'email': [f'import{offset + i}@example.com' for i in range(rows)],
+        'class': [str(i % 12 + 1) for i in range(rows)],
+        'section': ['ABCD'[i % 4] for i in range(rows)],
+        'roll_no': [str(i + 1) for i in range(rows)],
+    })
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--formats', nargs='+', default=['csv', 'xlsx'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Uploads land in ./student_sheets, so run from the scratch dir
+        os.chdir(tmp)
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        import db
+        db.DB_PATH = os.environ['DATABASE_PATH']
+        import app as school_app
+        import student_routes
+        # Keep the benchmark about the import, not the network
+        student_routes.send_email = lambda *a, **k: True
+        client = school_app.app.test_client()
+
+        print(f"{'rows':>6} {'fmt':>5} {'upload ms':>10} {'total ms':>9}  stage timings (ms)")
+        offset = 0
+        for rows in args.sizes:
+            for fmt in args.formats:
+                path = os.path.join(tmp, f'sheet_{rows}.{fmt}')
+                write_sheet(path, rows, offset)
+                offset += rows
+
+                start = time.perf_counter()
+                with open(path, 'rb') as f:
+                    response = client.post('/add_students_excel', data={
+                        'teacher_id': '1', 'file': (f, os.path.basename(path))})
+                upload = (time.perf_counter() - start) * 1000
+                assert response.status_code == 202, response.get_json()
+
+                status_url = response.get_json()['status_url']
+                while (job := client.get(f'{status_url}?limit=5').get_json())['status'] not in ('done', 'failed'):
+                    time.sleep(0.05)
+                total = (time.perf_counter() - start) * 1000
+                assert job['status'] == 'done', job['error']
+                assert job['result']['added'] == rows, job['items']
+                print(f'{rows:>6} {fmt:>5} {upload:>10.0f} {total:>9.0f}  {job["result"]["timings"]}')
+
+
+if __name__ == '__main__':
+    main()
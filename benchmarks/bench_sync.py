@@ -0,0 +1,141 @@
+"""Check offline scan sync is idempotent and compare roster delta vs full refetch.
+
+Drives the Flask app in-process against a generated scratch database.
+
+Idempotency: uploads a batch of offline scans to /sync/attendance, then
+replays it the ways a flaky connection does -- the same batch again, a
+batch overlapping the last one, a scan repeated inside one batch and the
+same batch from several clients at once -- and checks every replay gets
+its first result back and no student is marked twice.
+
+Payload size: after changing N students on one teacher's roster, compares
+the bytes a dashboard downloads to refresh it with the full
+/get_students/<teacher_id> against /sync/roster/<teacher_id>?since=<version>.
+
+    python benchmarks/bench_sync.py [--students 20000 --changes 1 10 100]
+"""
+import os
+import sys
+import uuid
+import sqlite3
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate
+
+TEACHER_ID = 1
+
+
+def scan(student_id, client_id=None):
+    return {'client_id': client_id or uuid.uuid4().hex, 'student_id': student_id}
+
+
+def sync(client, scans):
+    response = client.post('/sync/attendance', json={'scans': scans})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['results']
+
+
+def marks(cursor):
+    cursor.execute('SELECT COUNT(*) FROM attendance')
+    return cursor.fetchone()[0]
+
+
+def check_idempotency(app, cursor, ids):
+    client = app.test_client()
+    before = marks(cursor)
+
+    first = [scan(student_id) for student_id in ids[:50]]
+    results = sync(client, first)
+    assert [r['status'] for r in results] == ['marked'] * 50, results
+    assert marks(cursor) == before + 50
+
+    # The response was lost and the whole batch is sent again
+    replayed = sync(client, first)
+    assert all(r['replayed'] for r in replayed)
+    assert [r['status'] for r in replayed] == ['marked'] * 50
+    assert marks(cursor) == before + 50
+
+    # The next batch overlaps the one whose response was lost
+    overlap = first[25:] + [scan(student_id) for student_id in ids[50:75]]
+    results = sync(client, overlap)
+    assert [r['status'] for r in results] == ['marked'] * 50
+    assert [bool(r.get('replayed')) for r in results] == [True] * 25 + [False] * 25
+    assert marks(cursor) == before + 75
+
+    # A scan repeated inside one batch is recorded once
+    repeated = scan(ids[75])
+    results = sync(client, [repeated, repeated, repeated])
+    assert [r['status'] for r in results] == ['marked'] * 3
+    assert marks(cursor) == before + 76
+
+    # A second scan of a marked student is a new scan, not a replay
+    results = sync(client, [scan(ids[0])])
+    assert results[0]['status'] == 'already_marked' and not results[0].get('replayed')
+
+    # Several devices retrying the same batch at once
+    batch = [scan(student_id) for student_id in ids[100:200]]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        answers = list(executor.map(lambda _: sync(app.test_client(), batch), range(8)))
+    assert all([r['status'] for r in a] == ['marked'] * 100 for a in answers)
+    assert marks(cursor) == before + 176
+
+    print(f'idempotency: ok, {marks(cursor) - before} students each marked once across every replay')
+
+
+def response_bytes(client, path):
+    response = client.get(path)
+    assert response.status_code == 200, response.get_json()
+    return len(response.get_data()), response.get_json()
+
+
+def compare_payloads(app, cursor, changes):
+    client = app.test_client()
+    print(f"{'changed':>8} {'roster':>7} {'full bytes':>11} {'delta bytes':>12} {'ratio':>7}")
+    for count in changes:
+        _, data = response_bytes(client, f'/sync/roster/{TEACHER_ID}')
+        since = data['roster_version']
+
+        cursor.execute('SELECT student_id FROM students WHERE teacher_id = ? ORDER BY student_id LIMIT ?',
+                       (TEACHER_ID, count))
+        changed = [row[0] for row in cursor.fetchall()]
+        cursor.execute('BEGIN')
+        cursor.executemany("UPDATE students SET roll_no = roll_no || 'x' WHERE student_id = ?",
+                           [(student_id,) for student_id in changed])
+        cursor.execute('COMMIT')
+
+        full, roster = response_bytes(client, f'/get_students/{TEACHER_ID}')
+        delta, data = response_bytes(client, f'/sync/roster/{TEACHER_ID}?since={since}')
+        assert sorted(s['student_id'] for s in data['students']) == sorted(changed)
+        print(f"{count:>8} {len(roster['students']):>7} {full:>11} {delta:>12} {full / delta:>6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--changes', type=int, nargs='+', default=[0, 1, 10, 100])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        generate(path, students=args.students, years=0)
+        os.environ['DATABASE_PATH'] = path
+        # Scans carry bare student IDs
+        os.environ['ALLOW_UNSIGNED_SCANS'] = 'true'
+
+        import db
+        db.DB_PATH = path
+        from app import app
+
+        conn = sqlite3.connect(path, isolation_level=None)
+        cursor = conn.cursor()
+        check_idempotency(app, cursor, [f'S{i:07d}' for i in range(args.students)])
+        compare_payloads(app, cursor, args.changes)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
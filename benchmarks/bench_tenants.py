@@ -0,0 +1,167 @@
+"""Benchmark many schools writing at once: one shared database vs one per school.
+
+Starts gunicorn against a scratch directory and, for a fixed time, has N
+connections spread across the schools adding students (each a real write:
+a students row, a queued email and the roster triggers) while one more
+client keeps bulk-importing a CSV sheet into the first school. Runs it
+twice:
+
+* shared      every school's traffic goes to school.db, as before
+* per-school  each school has its own tenants/<school>.db (X-School header)
+
+and reports the other schools' write throughput and latency, errors and how
+long each bulk import took. Password hashing is switched to a cheap method
+so the numbers show database contention rather than scrypt.
+
+    python benchmarks/bench_tenants.py [--tenants 4 16 --connections 32 --duration 10]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate
+from smtp_sink import SMTPSink
+from load_test import percentile, start_server, gunicorn_command
+
+REQUEST_TIMEOUT = 30
+
+
+async def request(port, method, path, body=b'', headers=None):
+    """One request on a fresh connection; returns the status code and body"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        head = f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\nContent-Length: {len(body)}\r\n'
+        for name, value in (headers or {}).items():
+            head += f'{name}: {value}\r\n'
+        writer.write(head.encode() + b'\r\n' + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        response = await reader.read()
+        return int(status_line.split()[1]), response.partition(b'\r\n\r\n')[2]
+    finally:
+        writer.close()
+
+
+def school_headers(tenant):
+    return {'X-School': tenant} if tenant else {}
+
+
+async def writer_loop(port, tenant, deadline, latencies, errors):
+    headers = dict(school_headers(tenant), **{'Content-Type': 'application/json'})
+    while time.monotonic() < deadline:
+        body = json.dumps({
+            'name': 'Load Student', 'email': f'{uuid.uuid4().hex}@example.com', 'password': 'pw',
+            'class': '1', 'section': 'A', 'roll_no': '1', 'teacher_id': 1
+        }).encode()
+        start = time.perf_counter()
+        try:
+            status, _ = await asyncio.wait_for(request(port, 'POST', '/add_student', body, headers), REQUEST_TIMEOUT)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        if status != 201:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def importer_loop(port, tenant, deadline, rows, durations):
+    boundary = uuid.uuid4().hex
+    while time.monotonic() < deadline:
+        batch = uuid.uuid4().hex[:8]
+        sheet = 'name,email,class,section,roll_no\n' + ''.join(
+            f'Import {i},{batch}.{i}@example.com,2,B,{i}\n' for i in range(rows))
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="teacher_id"\r\n\r\n1\r\n'
+                f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{batch}.csv"\r\n'
+                f'Content-Type: text/csv\r\n\r\n{sheet}\r\n--{boundary}--\r\n').encode()
+        headers = dict(school_headers(tenant), **{'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        start = time.perf_counter()
+        try:
+            _, response = await asyncio.wait_for(request(port, 'POST', '/add_students_excel', body, headers), 120)
+            # The upload only queues a job; the import is done when the job is
+            job_url = json.loads(response)['status_url'] + '?limit=0'
+            while True:
+                _, response = await request(port, 'GET', job_url, headers=school_headers(tenant))
+                if json.loads(response)['status'] in ('done', 'failed'):
+                    break
+                await asyncio.sleep(0.1)
+        except (OSError, asyncio.TimeoutError, ValueError, KeyError):
+            continue
+        durations.append(time.perf_counter() - start)
+
+
+async def drive(port, schools, connections, duration, import_rows):
+    latencies, errors, durations = [], {}, []
+    deadline = time.monotonic() + duration
+    # The first school runs the bulk import; the others write one student at a time
+    others = schools[1:] or schools
+    tasks = [writer_loop(port, others[n % len(others)], deadline, latencies, errors) for n in range(connections)]
+    tasks.append(importer_loop(port, schools[0], deadline, import_rows, durations))
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'writes': len(latencies),
+        'writes_per_s': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'errors': errors,
+        'imports': len(durations),
+        'import_s': round(sum(durations) / len(durations), 2) if durations else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--students', type=int, default=200, help='students per school')
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--import-rows', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    print(f"{'mode':<11} {'schools':>7} {'writes':>7} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'imports':>8} {'import s':>9}  errors")
+    sink = SMTPSink().start()
+    try:
+        for count in args.tenants:
+            for mode in ('shared', 'per-school'):
+                with tempfile.TemporaryDirectory() as tmp:
+                    db_path = os.path.join(tmp, 'school.db')
+                    if mode == 'shared':
+                        generate(db_path, args.students * count, years=0)
+                        schools = [None] * count
+                    else:
+                        generate(db_path, 0, years=0)
+                        os.makedirs(os.path.join(tmp, 'tenants'))
+                        schools = [f'school{n:02d}' for n in range(count)]
+                        for school in schools:
+                            generate(os.path.join(tmp, 'tenants', f'{school}.db'), args.students, years=0)
+
+                    server, port = start_server(gunicorn_command(args.workers, args.threads), tmp, db_path, sink.port)
+                    try:
+                        result = asyncio.run(drive(port, schools, args.connections, args.duration,
+                                                   args.import_rows))
+                    finally:
+                        server.terminate()
+                        server.wait(timeout=30)
+                print(f"{mode:<11} {count:>7} {result['writes']:>7} {result['writes_per_s']:>9} "
+                      f"{result['p50_ms']!s:>8} {result['p99_ms']!s:>8} {result['imports']:>8} "
+                      f"{result['import_s']!s:>9}  {result['errors'] or ''}")
+    finally:
+        sink.stop()
+
+
+if __name__ == '__main__':
+    main()
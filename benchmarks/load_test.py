@@ -0,0 +1,371 @@
+"""Load-test every main endpoint and report latency percentiles as JSON.
+
+Seeds a scratch database with generate_data.py, starts the app under
+gunicorn (as the procfile does; uvicorn and asgi.py with --asgi) with email
+going to a local SMTP sink, then drives each endpoint in turn from a pool
+of keep-alive HTTP clients and records p50/p95/p99 latency, throughput and
+error counts.
+
+    python benchmarks/load_test.py --output results.json
+    python benchmarks/load_test.py --compare results.json   # against a baseline
+
+--url skips seeding and the server start and targets an already running
+app instead; its database must have been seeded by generate_data.py with
+the same --students count.
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import uuid
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import date
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from generate_data import generate, PASSWORD, CLASSES, SECTIONS
+from smtp_sink import SMTPSink
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+TEACHERS = len(CLASSES) * len(SECTIONS)
+EXCEL_ROWS = 20
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def multipart(fields, filename, content):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 f'Content-Type: text/csv\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def json_request(method, path, payload=None):
+    if payload is None:
+        return method, path, None, {}
+    return method, path, json.dumps(payload).encode(), {'Content-Type': 'application/json'}
+
+
+class Scenarios:
+    """Request builders for each endpoint; i is the request's sequence number"""
+
+    def __init__(self, students, run_id):
+        self.students = students
+        self.run_id = run_id
+        # A teacher's session token, for endpoints that need one
+        self.token = None
+
+    def student_id(self, i):
+        return f'S{i % self.students:07d}'
+
+    def register_teacher(self, i):
+        return json_request('POST', '/register_teacher', {
+            'name': f'Load Teacher {i}',
+            'email': f'load-{self.run_id}-teacher{i}@example.com',
+            'password': PASSWORD
+        })
+
+    def login(self, i):
+        return json_request('POST', '/login', {
+            'email': f'student{(i * 7919) % self.students}@example.com',
+            'password': PASSWORD
+        })
+
+    def add_student(self, i):
+        return json_request('POST', '/add_student', {
+            'name': f'Load Student {i}',
+            'email': f'load-{self.run_id}-student{i}@example.com',
+            'class': CLASSES[i % len(CLASSES)],
+            'section': SECTIONS[i % len(SECTIONS)],
+            'roll_no': str(1000 + i),
+            'teacher_id': i % TEACHERS + 1
+        })
+
+    def add_students_excel(self, i):
+        rows = ['name,email,class,section,roll_no']
+        rows.extend(f'Sheet Student {i}-{n},load-{self.run_id}-sheet{i}-{n}@example.com,1,A,{n}'
+                    for n in range(EXCEL_ROWS))
+        body, content_type = multipart({'teacher_id': i % TEACHERS + 1},
+                                       f'load-{self.run_id}-{i}.csv', '\n'.join(rows).encode())
+        return 'POST', '/add_students_excel', body, {'Content-Type': content_type}
+
+    def mark_attendance(self, i):
+        # Each student once, so every request takes the insert path
+        return json_request('POST', '/mark_attendance', {'student_id': self.student_id(i)})
+
+    def weekly_report(self, i):
+        return json_request('GET', f'/weekly_report/{self.student_id(i * 7919)}')
+
+    def generate_qr(self, i):
+        return 'GET', f'/generate_qr/{self.student_id(i * 7919)}', None, {'Authorization': f'Bearer {self.token}'}
+
+    def get_students(self, i):
+        return json_request('GET', f'/get_students/{i % TEACHERS + 1}')
+
+
+# Requests per endpoint at --scale 1; hashing endpoints cost ~0.25s per call
+ENDPOINTS = [
+    ('register_teacher', 40),
+    ('login', 40),
+    ('add_student', 40),
+    ('add_students_excel', 5),
+    ('mark_attendance', 1000),
+    ('weekly_report', 1000),
+    ('generate_qr', 1000),
+    ('get_students', 1000),
+]
+
+
+class Client:
+    """One keep-alive connection per load-generator thread"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.conn = None
+
+    def send(self, method, path, body, headers):
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.conn.close()
+                    self.conn = None
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def login_token(host, port, email):
+    """Session token for an account on the target server"""
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    conn.request('POST', '/login', body=json.dumps({'email': email, 'password': PASSWORD}),
+                 headers={'Content-Type': 'application/json'})
+    token = json.load(conn.getresponse())['token']
+    conn.close()
+    return token
+
+
+def run_endpoint(host, port, build, requests, concurrency):
+    local = threading.local()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def task(i):
+        if not hasattr(local, 'client'):
+            local.client = Client(host, port)
+        method, path, body, headers = build(i)
+        start = time.perf_counter()
+        try:
+            status = local.client.send(method, path, body, headers)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not isinstance(status, int) or status >= 400:
+                errors.append(status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(task, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': len(errors),
+        'error_statuses': sorted({str(status) for status in errors}),
+        'throughput_rps': round(requests / wall, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def wait_for_server(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/metrics')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on {host}:{port} did not come up')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_command(workers, threads):
+    return [sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:{port}',
+            '--workers', str(workers), '--threads', str(threads), 'app:app']
+
+
+def uvicorn_command():
+    return [sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', '{port}',
+            '--log-level', 'warning', '--no-access-log', 'asgi:app']
+
+
+def start_server(command, workdir, db_path, smtp_port):
+    """Run a server command ({port} is filled in) against db_path"""
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_PATH=db_path,
+               MAIL_SERVER='127.0.0.1',
+               MAIL_PORT=str(smtp_port),
+               MAIL_USE_TLS='false',
+               LOG_LEVEL='WARNING',
+               LOGIN_FAILURES_PER_IP=str(10 ** 9),
+               # Scenarios scan bare student IDs
+               ALLOW_UNSIGNED_SCANS='true',
+               PYTHONPATH=ROOT)
+    server = subprocess.Popen([arg.format(port=port) for arg in command], cwd=workdir, env=env)
+    wait_for_server('127.0.0.1', port)
+    return server, port
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')})")
+    print(f"{'endpoint':<20} {'p95 ms':>10} {'was':>10} {'change':>8} {'rps':>9} {'was':>9}")
+    for name, current in results['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            continue
+        change = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        print(f"{name:<20} {current['p95_ms']:>10.2f} {before['p95_ms']:>10.2f} {change:>+7.1f}% "
+              f"{current['throughput_rps']:>9.1f} {before['throughput_rps']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the per-endpoint request counts')
+    parser.add_argument('--endpoints', nargs='*', help='only run these endpoints')
+    parser.add_argument('--asgi', action='store_true', help='serve asgi:app with uvicorn instead of gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--url', help='target a running server instead of starting one')
+    parser.add_argument('--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    args = parser.parse_args()
+
+    endpoints = [(name, max(1, int(count * args.scale))) for name, count in ENDPOINTS
+                 if not args.endpoints or name in args.endpoints]
+    scenarios = Scenarios(args.students, uuid.uuid4().hex[:8])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = server = None
+        try:
+            if args.url:
+                target = urlsplit(args.url)
+                host, port = target.hostname, target.port or 80
+            else:
+                db_path = os.path.join(tmp, 'school.db')
+                start = time.perf_counter()
+                counts = generate(db_path, args.students, args.years)
+                print(f'seeded {counts} in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+                # Let mark_attendance insert today's rows itself
+                import sqlite3
+                conn = sqlite3.connect(db_path)
+                conn.execute('DELETE FROM attendance WHERE date = ?', (date.today().isoformat(),))
+                conn.commit()
+                conn.close()
+
+                sink = SMTPSink().start()
+                command = uvicorn_command() if args.asgi else gunicorn_command(args.workers, args.threads)
+                server, port = start_server(command, tmp, db_path, sink.port)
+                host = '127.0.0.1'
+
+            if any(name == 'generate_qr' for name, _ in endpoints):
+                scenarios.token = login_token(host, port, f'teacher{CLASSES[0]}{SECTIONS[0].lower()}@example.com')
+
+            results = {
+                'meta': {
+                    'commit': git_commit(),
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'python': platform.python_version(),
+                    'cpus': os.cpu_count(),
+                    'students': args.students,
+                    'years': args.years,
+                    'concurrency': args.concurrency,
+                    'server': args.url or ('uvicorn asgi:app' if args.asgi
+                                           else f'gunicorn -w {args.workers} --threads {args.threads}'),
+                },
+                'endpoints': {}
+            }
+            print(f"{'endpoint':<20} {'reqs':>6} {'errs':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                  f"{'p99 ms':>9}", file=sys.stderr)
+            for name, count in endpoints:
+                stats = run_endpoint(host, port, getattr(scenarios, name), count, args.concurrency)
+                results['endpoints'][name] = stats
+                print(f"{name:<20} {stats['requests']:>6} {stats['errors']:>5} {stats['throughput_rps']:>9.1f} "
+                      f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}",
+                      file=sys.stderr)
+            if sink is not None:
+                results['meta']['emails_delivered'] = sink.messages
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+            if sink is not None:
+                sink.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Minimal local Redis stand-in: an in-memory key-value store over RESP.
+
+Speaks just enough of the protocol for the shared student cache (GET, SET
+with EX, DEL, PING and the HELLO/CLIENT/SELECT handshake redis-py sends), so
+benchmarks can exercise the shared layer without a Redis server installed.
+"""
+import socketserver
+import threading
+import time
+
+# Reply to HELLO: the RESP3 map redis-py reads the server version from
+HELLO_REPLY = b'%3\r\n$6\r\nserver\r\n$5\r\nredis\r\n$7\r\nversion\r\n$5\r\n7.2.0\r\n$5\r\nproto\r\n:3\r\n'
+
+
+class RedisSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.data = {}
+        self.commands = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self.port}/0'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is HELLO_REPLY:
+            self.wfile.write(value)
+        elif value is None:
+            self.wfile.write(b'_\r\n' if self.resp3 else b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, bytes):
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+        else:
+            self.wfile.write(f'{value}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        self.resp3 = False
+        while True:
+            args = self.read_command()
+            if not args:
+                return
+            command = args[0].upper()
+            with server._lock:
+                server.commands += 1
+                if command == b'GET':
+                    entry = server.data.get(args[1])
+                    if entry and entry[1] is not None and entry[1] < time.monotonic():
+                        del server.data[args[1]]
+                        entry = None
+                    result = entry[0] if entry else None
+                elif command == b'SET':
+                    expires = None
+                    if len(args) >= 5 and args[3].upper() == b'EX':
+                        expires = time.monotonic() + int(args[4])
+                    server.data[args[1]] = (args[2], expires)
+                    result = '+OK'
+                elif command == b'DEL':
+                    result = sum(server.data.pop(key, None) is not None for key in args[1:])
+                elif command == b'PING':
+                    result = '+PONG'
+                elif command == b'HELLO':
+                    self.resp3 = args[1:2] == [b'3']
+                    result = HELLO_REPLY
+                elif command in (b'CLIENT', b'SELECT'):
+                    result = '+OK'
+                else:
+                    result = f"-ERR unknown command '{command.decode(errors='replace')}'"
+            self.reply(result)
@@ -0,0 +1,73 @@
+"""Minimal local SMTP server that accepts and counts messages.
+
+Stands in for the real mail server in benchmarks so nothing leaves the
+machine. ``connect_delay`` emulates the handshake cost (TLS, auth) of a
+remote server, which is what connection reuse saves.
+"""
+import socketserver
+import threading
+import time
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, connect_delay=0.0):
+        super().__init__((host, port), _Handler)
+        self.connect_delay = connect_delay
+        self.messages = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server._lock:
+            server.connections += 1
+        time.sleep(server.connect_delay)
+        self.reply('220 sink ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-sink')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif command.startswith('HELO'):
+                self.reply('250 sink')
+            elif command.startswith('AUTH'):
+                self.reply('235 Authentication successful')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                with server._lock:
+                    server.messages += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
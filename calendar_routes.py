@@ -0,0 +1,140 @@
+"""School calendar: working days, per-class schedules and holidays"""
+import logging
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+
+import school_calendar
+from db import get_db, transaction
+from school_calendar import CalendarError
+from web import current_account, parse_school_day_range
+
+bp = Blueprint('calendar', __name__)
+
+# Longest holiday range one request may add or remove
+MAX_HOLIDAY_DAYS = 366
+
+def calendar_scope(data):
+    """(class, section) a calendar change applies to; both empty for the whole school"""
+    return (data.get('class') or '').strip(), (data.get('section') or '').strip()
+
+def holiday_range(data):
+    """Read from/to ISO dates from a request body, raising ValueError when malformed"""
+    start = datetime.strptime(data.get('from') or data.get('date') or '', '%Y-%m-%d').date()
+    end = datetime.strptime(data['to'], '%Y-%m-%d').date() if data.get('to') else start
+    if start > end:
+        raise ValueError('from must not be after to')
+    if (end - start).days >= MAX_HOLIDAY_DAYS:
+        raise ValueError(f'at most {MAX_HOLIDAY_DAYS} days at a time')
+    return start, end
+
+def teacher_session():
+    """Error response unless a teacher is logged in; calendars apply school-wide"""
+    session_account = current_account()
+    if not session_account:
+        return jsonify({'error': 'Invalid or expired session'}), 401
+    if session_account['role'] != 'teacher':
+        return jsonify({'error': 'Only teachers can change the calendar'}), 403
+    return None
+
+@bp.route('/calendar', methods=['GET'])
+def get_calendar():
+    """Working days, holidays and the school-day count for a class/section (or the school)"""
+    try:
+        try:
+            start, end = parse_school_day_range(lambda end: end.replace(month=1, day=1))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date range: {e}'}), 400
+        
+        class_name, section = calendar_scope(request.args)
+        cursor = get_db().cursor()
+        return jsonify(school_calendar.describe(cursor, class_name, section, start, end)), 200
+    
+    except Exception as e:
+        logging.error(f"Error getting calendar: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/calendar/schedule', methods=['PUT'])
+def set_schedule():
+    """Set the working days of the school, a class or a class/section"""
+    try:
+        denied = teacher_session()
+        if denied:
+            return denied
+        
+        data = request.get_json() or {}
+        weekdays = data.get('weekdays', False)
+        if weekdays is not None and not isinstance(weekdays, list):
+            return jsonify({'error': 'weekdays must be a list such as ["mon", "tue"], or null '
+                                     'to follow the wider calendar'}), 400
+        
+        class_name, section = calendar_scope(data)
+        try:
+            with transaction() as cursor:
+                school_calendar.set_schedule(cursor, class_name, section,
+                                             None if weekdays is None else [str(day).lower() for day in weekdays])
+        except CalendarError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'message': 'Schedule updated', 'class': class_name, 'section': section}), 200
+    
+    except Exception as e:
+        logging.error(f"Error setting schedule: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/calendar/holidays', methods=['POST'])
+def add_holidays():
+    """Add a holiday (or a from/to range of them) for the school, a class or a class/section"""
+    try:
+        denied = teacher_session()
+        if denied:
+            return denied
+        
+        data = request.get_json() or {}
+        name = (data.get('name') or '').strip()
+        if not name:
+            return jsonify({'error': 'Holiday name is required'}), 400
+        try:
+            start, end = holiday_range(data)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date range: {e}'}), 400
+        
+        class_name, section = calendar_scope(data)
+        try:
+            with transaction() as cursor:
+                added = school_calendar.add_holidays(cursor, class_name, section, start, end, name)
+        except CalendarError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'message': f'{added} holiday(s) added', 'added': added}), 200
+    
+    except Exception as e:
+        logging.error(f"Error adding holidays: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/calendar/holidays', methods=['DELETE'])
+def remove_holidays():
+    """Remove the holidays of the school, a class or a class/section in a date range"""
+    try:
+        denied = teacher_session()
+        if denied:
+            return denied
+        
+        data = request.get_json(silent=True) or request.args
+        try:
+            start, end = holiday_range(data)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date range: {e}'}), 400
+        
+        class_name, section = calendar_scope(data)
+        try:
+            with transaction() as cursor:
+                removed = school_calendar.remove_holidays(cursor, class_name, section, start, end)
+        except CalendarError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'message': f'{removed} holiday(s) removed', 'removed': removed}), 200
+    
+    except Exception as e:
+        logging.error(f"Error removing holidays: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,315 @@
+"""Shared SQLite access layer, one database file per school.
+
+Each school (tenant) has its own database: the default school keeps
+school.db and every other one lives in ``TENANT_DB_DIR/<school>.db``, so a
+bulk import in one school never holds the write lock another school is
+waiting on. ``get_db()`` and ``transaction()`` use the school selected for
+the current request or task (``set_tenant()``/``use_tenant()``, a context
+variable). ``migrate_all()`` brings every file up to date at startup, and
+one created later is migrated the first time a process opens it.
+
+Every thread keeps one long-lived connection per school, reused across
+requests, and closes its least recently used one beyond MAX_OPEN_TENANTS.
+Connections run in WAL mode so readers never block the writer, and writes
+go through ``transaction()`` which takes the write lock up front (BEGIN
+IMMEDIATE) so concurrent workers queue on the busy timeout instead of
+failing with "database is locked".
+
+Connections use ``TimedConnection`` so every executed statement is counted
+and timed for the request metrics (see metrics.py).
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+
+DB_PATH = os.environ.get('DATABASE_PATH', 'school.db')
+
+# Where the databases of schools other than the default one live
+TENANT_DB_DIR = os.environ.get('TENANT_DB_DIR', 'tenants')
+DEFAULT_TENANT = 'default'
+TENANT_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+# Connections each thread keeps open, one per school it has served recently
+MAX_OPEN_TENANTS = int(os.environ.get('SQLITE_MAX_OPEN_TENANTS', 32))
+
+# How long a connection waits on a locked database before giving up
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# Extra attempts at acquiring the write lock once the busy timeout expires
+LOCK_RETRIES = int(os.environ.get('SQLITE_LOCK_RETRIES', 3))
+
+# Number of compiled statements kept per connection for reuse
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),        # 16 MiB page cache per connection
+    ('mmap_size', 268435456),      # 256 MiB memory-mapped I/O
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's execution time to metrics"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.record_sql(time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.record_sql(time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class UnknownTenant(LookupError):
+    """Raised for a school name that is malformed or has no database"""
+
+
+_current_tenant = contextvars.ContextVar('tenant', default=DEFAULT_TENANT)
+_known_tenants = {DEFAULT_TENANT}
+
+
+def current_tenant():
+    return _current_tenant.get()
+
+
+def set_tenant(tenant):
+    """Select a school for the current context; returns a token for reset_tenant()"""
+    return _current_tenant.set(tenant)
+
+
+def reset_tenant(token):
+    _current_tenant.reset(token)
+
+
+@contextmanager
+def use_tenant(tenant):
+    """Run a block against one school's database"""
+    token = set_tenant(tenant)
+    try:
+        yield
+    finally:
+        reset_tenant(token)
+
+
+def tenant_path(tenant=None):
+    """Database file for a school (the current one by default)"""
+    tenant = tenant or current_tenant()
+    if tenant == DEFAULT_TENANT:
+        return DB_PATH
+    return os.path.join(TENANT_DB_DIR, f'{tenant}.db')
+
+
+def tenant_exists(tenant):
+    """Whether a school name is valid and has a database"""
+    if tenant in _known_tenants:
+        return True
+    if not TENANT_PATTERN.match(tenant) or not os.path.exists(tenant_path(tenant)):
+        return False
+    _known_tenants.add(tenant)
+    return True
+
+
+def tenants():
+    """Every school with a database, default first"""
+    names = []
+    if os.path.isdir(TENANT_DB_DIR):
+        names = sorted(name[:-3] for name in os.listdir(TENANT_DB_DIR)
+                       if name.endswith('.db') and TENANT_PATTERN.match(name[:-3]))
+    return [DEFAULT_TENANT] + [name for name in names if name != DEFAULT_TENANT]
+
+
+def create_tenant(tenant):
+    """Create and migrate a school's database, if it does not exist yet"""
+    if not TENANT_PATTERN.match(tenant):
+        raise UnknownTenant(tenant)
+    os.makedirs(TENANT_DB_DIR, exist_ok=True)
+    ensure_migrated(tenant_path(tenant))
+    _known_tenants.add(tenant)
+
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def ensure_migrated(path, conn=None):
+    """Apply pending migrations to a database file once per process"""
+    if path in _migrated:
+        return
+    # migrations imports rollups, which imports this module
+    from migrations import migrate, current_version, LATEST_VERSION
+
+    with _migrate_lock:
+        if path in _migrated:
+            return
+        own = conn is None
+        conn = conn or connect(path)
+        try:
+            # Usually already current (migrate_all() ran at startup), which a
+            # plain read can tell without queueing for the write lock
+            if current_version(conn.cursor()) < LATEST_VERSION:
+                _begin_immediate(conn)
+                try:
+                    migrate(conn.cursor())
+                except BaseException:
+                    conn.rollback()
+                    raise
+                conn.commit()
+        finally:
+            if own:
+                conn.close()
+        _migrated.add(path)
+
+
+def migrate_all():
+    """Bring every school's database up to date; run once at startup"""
+    # school_calendar imports this module
+    import school_calendar
+
+    for tenant in tenants():
+        ensure_migrated(tenant_path(tenant))
+        # The school-day index runs a fixed number of years ahead
+        with use_tenant(tenant):
+            school_calendar.ensure_horizon()
+
+
+def connect(path=None):
+    """Open a new tuned connection (prefer get_db() inside the app)"""
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection,
+    )
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class ConnectionPool:
+    """Hands out one connection per thread and database file, reopened after a fork"""
+
+    def __init__(self, max_open=MAX_OPEN_TENANTS):
+        self.max_open = max_open
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def get(self, path):
+        """Return the calling thread's connection to path, opening it if needed"""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conns = OrderedDict()
+            self._local.pid = os.getpid()
+        conns = self._local.conns
+        conn = conns.get(path)
+        if conn is not None:
+            conns.move_to_end(path)
+            return conn
+
+        conn = connect(path)
+        ensure_migrated(path, conn)
+        conns[path] = conn
+        with self._lock:
+            self._connections.append(conn)
+        if len(conns) > self.max_open:
+            self._evict(conns)
+        return conn
+
+    def _evict(self, conns):
+        """Close this thread's least recently used connection that is not mid-transaction"""
+        for path, conn in conns.items():
+            if not conn.in_transaction:
+                del conns[path]
+                with self._lock:
+                    self._connections.remove(conn)
+                conn.close()
+                return
+
+    def close_all(self):
+        """Close every connection opened by this pool"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+pool = ConnectionPool()
+
+
+def get_db():
+    """Return this thread's pooled connection to the current school's database"""
+    tenant = current_tenant()
+    if tenant != DEFAULT_TENANT and not tenant_exists(tenant):
+        raise UnknownTenant(tenant)
+    return pool.get(tenant_path(tenant))
+
+
+def _is_locked(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _begin_immediate(conn):
+    """Take the write lock, backing off if the busy timeout runs out"""
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or attempt == LOCK_RETRIES:
+                raise
+            logging.warning(f"Database locked, retrying write (attempt {attempt + 1})")
+            time.sleep(0.05 * (2 ** attempt))
+
+
+@contextmanager
+def transaction():
+    """Run a block of writes in a single IMMEDIATE transaction"""
+    conn = get_db()
+    if conn.in_transaction:
+        # Nested use joins the outer transaction
+        yield conn.cursor()
+        return
+
+    _begin_immediate(conn)
+    cursor = conn.cursor()
+    try:
+        yield cursor
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
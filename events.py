@@ -0,0 +1,275 @@
+"""In-process publish/subscribe behind the /events Server-Sent Events stream.
+
+Attendance and roster changes are published to topics - ``teacher:<id>``
+and ``student:<student_id>``, prefixed with the school (``<school>/``) since
+IDs repeat across school databases - and fanned out to every subscriber of those
+topics in this process, so dashboards can apply deltas instead of
+re-fetching. Each subscriber buffers at most MAX_PENDING events (a stalled
+client drops its oldest ones), and the last HISTORY_SIZE events are kept so
+a reconnecting EventSource resumes from its Last-Event-ID.
+
+Without a relay, subscribers only see events published by the same
+process, as with ``uvicorn asgi:app`` (one coroutine per subscriber). Under
+gunicorn with more than one worker, gunicorn.conf.py sets EVENT_RELAY_PATH
+and EVENT_EPOCH: every worker then writes its events to that SQLite file and
+delivers what any worker wrote, polling it every RELAY_POLL_INTERVAL, so
+event IDs (the relay's row IDs) and Last-Event-ID replay hold across workers.
+"""
+import os
+import json
+import asyncio
+import logging
+import secrets
+import itertools
+import threading
+from collections import deque
+
+import db
+from db import current_tenant
+
+MAX_PENDING = 100
+HISTORY_SIZE = 1000
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+
+# Event IDs are "<epoch>.<n>"; after a restart the epoch differs and old IDs are not replayed
+EPOCH = os.environ.get('EVENT_EPOCH') or secrets.token_hex(4)
+
+# Shared by the processes serving /events when set (see above)
+RELAY_PATH = os.environ.get('EVENT_RELAY_PATH')
+RELAY_POLL_INTERVAL = float(os.environ.get('EVENT_RELAY_POLL_INTERVAL', 0.25))
+# Every this many events the relay drops all but the last HISTORY_SIZE
+RELAY_PRUNE_EVERY = 100
+
+
+class Event:
+    __slots__ = ('id', 'seq', 'topics', 'name', 'data')
+
+    def __init__(self, seq, topics, name, data):
+        self.seq = seq
+        self.id = f'{EPOCH}.{seq}'
+        self.topics = topics
+        self.name = name
+        self.data = json.dumps(data, separators=(',', ':'))
+
+    def encode(self):
+        return f'id: {self.id}\nevent: {self.name}\ndata: {self.data}\n\n'
+
+
+class Subscription:
+    """Events for one client, consumed from a thread"""
+
+    def __init__(self, broker, topics):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self._pending = deque(maxlen=MAX_PENDING)
+        self._ready = threading.Event()
+
+    def push(self, event):
+        self._pending.append(event)
+        self._ready.set()
+
+    def _drain(self):
+        events = []
+        while self._pending:
+            events.append(self._pending.popleft())
+        return events
+
+    def get(self, timeout=HEARTBEAT_SECONDS):
+        """Wait up to timeout for events; returns [] on timeout"""
+        self._ready.clear()
+        if not self._pending:
+            self._ready.wait(timeout)
+        return self._drain()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """Events for one client, consumed from a coroutine"""
+
+    def __init__(self, broker, topics):
+        super().__init__(broker, topics)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+    def push(self, event):
+        self._pending.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Loop already closed; the subscription is going away
+            pass
+
+    async def get(self, timeout=HEARTBEAT_SECONDS):
+        self._wakeup.clear()
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._drain()
+
+
+class Broker:
+    def __init__(self, relay_path=None):
+        self._subscribers = {}
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+        self.relay = Relay(self, relay_path) if relay_path else None
+
+    def subscribe(self, topics, last_event_id=None, subscription_class=Subscription):
+        """Register a subscriber, replaying events it missed since last_event_id"""
+        if self.relay is not None:
+            self.relay.start()
+        subscription = subscription_class(self, topics)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+            missed = [event for event in self._history
+                      if event.seq > _resume_after(last_event_id) and subscription.topics & event.topics]
+        for event in missed:
+            subscription.push(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def publish(self, topics, name, data):
+        """Send an event to every subscriber of any of the topics"""
+        if self.relay is not None:
+            # This process delivers it from the relay too, like every other
+            self.relay.send(topics, name, data)
+        else:
+            self.deliver(topics, name, data)
+
+    def deliver(self, topics, name, data, seq=None):
+        """Record an event for replay and push it to this process's subscribers"""
+        with self._lock:
+            event = Event(seq or next(self._sequence), frozenset(topics), name, data)
+            self._history.append(event)
+            targets = set()
+            for topic in event.topics:
+                targets.update(self._subscribers.get(topic, ()))
+        for subscription in targets:
+            subscription.push(event)
+        return event
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+
+class Relay:
+    """Shares events between the processes using one SQLite file"""
+
+    def __init__(self, broker, path, interval=RELAY_POLL_INTERVAL):
+        self.broker = broker
+        self.path = path
+        self.interval = interval
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        self._last = 0
+
+    def start(self):
+        """Catch up on recent events and start polling in this process if not running"""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            with self._lock:
+                self._conn = db.connect(self.path)
+                self._conn.execute('''
+                    CREATE TABLE IF NOT EXISTS events (
+                        id INTEGER PRIMARY KEY, topics TEXT NOT NULL, name TEXT NOT NULL, data TEXT NOT NULL
+                    )
+                ''')
+                newest = self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+                # Enough history for a client reconnecting from another worker
+                self._last = max(0, newest - HISTORY_SIZE)
+            self.poll()
+            threading.Thread(target=self.run_forever, name='event-relay', daemon=True).start()
+            self._pid = os.getpid()
+
+    def send(self, topics, name, data):
+        """Add an event for every process to deliver"""
+        self.start()
+        with self._lock:
+            seq = self._conn.execute('INSERT INTO events (topics, name, data) VALUES (?, ?, ?)',
+                                     (json.dumps(sorted(topics)), name, json.dumps(data))).lastrowid
+            if seq % RELAY_PRUNE_EVERY == 0:
+                self._conn.execute('DELETE FROM events WHERE id <= ?', (seq - HISTORY_SIZE,))
+        # Deliver it here now rather than after the poll interval
+        self._wake.set()
+
+    def poll(self):
+        """Deliver the events added since the last poll, in order"""
+        with self._lock:
+            rows = self._conn.execute('SELECT id, topics, name, data FROM events WHERE id > ? ORDER BY id',
+                                      (self._last,)).fetchall()
+            if rows:
+                self._last = rows[-1][0]
+        for seq, topics, name, data in rows:
+            self.broker.deliver(json.loads(topics), name, json.loads(data), seq)
+
+    def run_forever(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error(f"Event relay poll failed: {e}")
+
+
+def _resume_after(last_event_id):
+    """Sequence number to replay after, or infinity if the ID is unusable"""
+    epoch, _, seq = (last_event_id or '').partition('.')
+    if epoch != EPOCH or not seq.isdigit():
+        return float('inf')
+    return int(seq)
+
+
+broker = Broker(RELAY_PATH)
+
+
+def account_topics(session_account):
+    """Topics a logged-in account may subscribe to"""
+    if session_account['role'] == 'teacher':
+        return [f"{session_account['tenant']}/teacher:{session_account['id']}"]
+    return [f"{session_account['tenant']}/student:{session_account['id']}"]
+
+
+def stream_preamble():
+    return f'retry: {RETRY_MILLISECONDS}\n\n'
+
+
+def heartbeat():
+    return ': keep-alive\n\n'
+
+
+def attendance_marked(student_id, name, teacher_id, date, status='present'):
+    tenant = current_tenant()
+    broker.publish((f'{tenant}/teacher:{teacher_id}', f'{tenant}/student:{student_id}'), 'attendance', {
+        'student_id': student_id,
+        'name': name,
+        'date': date,
+        'status': status
+    })
+
+
+def students_added(teacher_id, students):
+    """Publish new roster entries (dicts with the get_students fields)"""
+    if students:
+        broker.publish((f'{current_tenant()}/teacher:{teacher_id}',), 'roster',
+                       {'action': 'added', 'students': students})
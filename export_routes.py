@@ -0,0 +1,100 @@
+"""Roster and attendance downloads as CSV or XLSX"""
+import logging
+
+from flask import Blueprint, Response, request, jsonify
+from werkzeug.utils import secure_filename
+
+import exports
+import jobs
+from web import job_accepted, wants_job, parse_report_range, current_account
+
+bp = Blueprint('exports', __name__)
+
+@jobs.handler('export')
+def run_export_job(job):
+    """Write an export to a file for later download, its query rebuilt from the stored filters"""
+    params = job.params
+    title, columns, query, query_params = exports.export_query(params['kind'], params['filters'])
+    rows = exports.save(job.output_path(params['filename']), params['format'], title, columns,
+                        query, query_params, progress=job.progress)
+    return {'filename': params['filename'], 'mimetype': exports.FORMATS[params['format']], 'rows': rows}
+
+def export_response(output, filename, kind, filters):
+    """Stream an export with download headers, or queue it as a job with ?async=1"""
+    if wants_job():
+        # Only the validated filters are stored; the job builds the SQL itself
+        return job_accepted(jobs.enqueue('export', {
+            'format': output, 'filename': secure_filename(filename), 'kind': kind, 'filters': filters
+        }))
+    title, columns, query, params = exports.export_query(kind, filters)
+    return Response(exports.stream(output, title, columns, query, params),
+                    mimetype=exports.FORMATS[output],
+                    headers={'Content-Disposition': f'attachment; filename="{secure_filename(filename)}"',
+                             'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+def export_denied(session_account, teacher_id):
+    """Error response unless a teacher is logged in and teacher_id, if given, is theirs"""
+    if not session_account:
+        return jsonify({'error': 'Invalid or expired session'}), 401
+    if session_account['role'] != 'teacher':
+        return jsonify({'error': 'Only teachers can export'}), 403
+    if teacher_id is not None and teacher_id != session_account['id']:
+        return jsonify({'error': 'Teachers can only export their own students'}), 403
+    return None
+
+@bp.route('/export/roster/<int:teacher_id>', methods=['GET'])
+def export_roster(teacher_id):
+    """Download a teacher's roster as CSV or XLSX, optionally for one class/section"""
+    try:
+        denied = export_denied(current_account(), teacher_id)
+        if denied:
+            return denied
+        
+        output = request.args.get('format', 'csv')
+        if output not in exports.FORMATS:
+            return jsonify({'error': 'Format must be csv or xlsx'}), 400
+        
+        class_name = request.args.get('class')
+        section = request.args.get('section')
+        
+        filename = '_'.join(filter(None, ['roster', str(teacher_id), class_name, section])) + f'.{output}'
+        return export_response(output, filename, 'roster',
+                               {'teacher_id': teacher_id, 'class': class_name, 'section': section})
+    
+    except Exception as e:
+        logging.error(f"Error exporting roster: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/export/attendance', methods=['GET'])
+def export_attendance():
+    """Download the logged-in teacher's students' attendance over a date range as CSV or XLSX"""
+    try:
+        session_account = current_account()
+        denied = export_denied(session_account, request.args.get('teacher_id', type=int))
+        if denied:
+            return denied
+        
+        output = request.args.get('format', 'csv')
+        if output not in exports.FORMATS:
+            return jsonify({'error': 'Format must be csv or xlsx'}), 400
+        
+        try:
+            start, end = parse_report_range(lambda end: end.replace(month=1, day=1))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date range: {e}'}), 400
+        
+        # Always scoped to the teacher's own students
+        teacher_id = session_account['id']
+        class_name = request.args.get('class')
+        section = request.args.get('section')
+        
+        scope = [str(teacher_id), class_name, section]
+        filename = '_'.join(filter(None, ['attendance', *scope, start.isoformat(), end.isoformat()])) + f'.{output}'
+        return export_response(output, filename, 'attendance', {
+            'from': start.isoformat(), 'to': end.isoformat(),
+            'teacher_id': teacher_id, 'class': class_name, 'section': section
+        })
+    
+    except Exception as e:
+        logging.error(f"Error exporting attendance: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
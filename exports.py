@@ -0,0 +1,194 @@
+"""Streaming roster and attendance exports as CSV or XLSX.
+
+Rows are read with ``fetchmany`` from a dedicated connection inside a read
+transaction (one consistent snapshot for the whole download) and written
+out as they arrive, so memory stays flat whether the export holds a class
+roster or a whole school's year of attendance:
+
+* CSV is produced by a generator yielding ~EXPORT_CHUNK_BYTES pieces, which
+  the server sends with chunked transfer encoding.
+* XLSX uses openpyxl's write-only workbook, which spools rows to a
+  temporary file; the finished file is then streamed in chunks and removed.
+  The first byte only goes out once the workbook is complete.
+
+The queries walk an index in export order (students, then each student's
+attendance by date), so SQLite never sorts the result. ``save()`` writes the
+same output to a file for exports run as background jobs, which store the
+export's kind and filters and rebuild its query with ``export_query()``.
+"""
+import io
+import os
+import csv
+import logging
+import tempfile
+from datetime import date
+
+import db
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+ROSTER_COLUMNS = ('student_id', 'name', 'email', 'class', 'section', 'roll_no', 'created_at')
+ATTENDANCE_COLUMNS = ('date', 'student_id', 'name', 'class', 'section', 'roll_no', 'status')
+
+# Rows fetched from SQLite per round trip
+EXPORT_BATCH_ROWS = 1000
+
+# Bytes buffered before a CSV chunk (or a slice of the XLSX file) is sent
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def roster_query(teacher_id, class_name=None, section=None):
+    """SQL and parameters for a teacher's roster in get_students order"""
+    query = f"SELECT {', '.join(ROSTER_COLUMNS)} FROM students WHERE teacher_id = ?"
+    params = [teacher_id]
+    if class_name:
+        query += ' AND class = ?'
+        params.append(class_name)
+    if section:
+        query += ' AND section = ?'
+        params.append(section)
+    return query + ' ORDER BY name, student_id', params
+
+
+def attendance_query(start, end, teacher_id=None, class_name=None, section=None):
+    """SQL and parameters for attendance between two dates, one student at a time"""
+    query = '''
+        SELECT a.date, s.student_id, s.name, s.class, s.section, s.roll_no, a.status
+        FROM students s
+        JOIN attendance a ON a.student_id = s.student_id AND a.date BETWEEN ? AND ?
+    '''
+    params = [start.isoformat(), end.isoformat()]
+    conditions = []
+    if class_name:
+        conditions.append('s.class = ?')
+        params.append(class_name)
+    if section:
+        conditions.append('s.section = ?')
+        params.append(section)
+    if teacher_id:
+        conditions.append('s.teacher_id = ?')
+        params.append(teacher_id)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+
+    # Orders that match idx_students_teacher_name / idx_students_class_section,
+    # followed by idx_attendance_student_date, so no temp B-tree is needed
+    if teacher_id and not class_name:
+        query += ' ORDER BY s.name, s.rowid, a.date'
+    else:
+        query += ' ORDER BY s.class, s.section, s.rowid, a.date'
+    return query, params
+
+
+def export_query(kind, filters):
+    """Title, columns, SQL and parameters of a roster or attendance export
+
+    filters holds JSON values (dates as ISO strings), so background jobs
+    store them in place of the SQL.
+    """
+    if kind == 'roster':
+        query, params = roster_query(filters['teacher_id'], filters.get('class'), filters.get('section'))
+        return 'Roster', ROSTER_COLUMNS, query, params
+    if kind == 'attendance':
+        query, params = attendance_query(date.fromisoformat(filters['from']), date.fromisoformat(filters['to']),
+                                         filters.get('teacher_id'), filters.get('class'), filters.get('section'))
+        return 'Attendance', ATTENDANCE_COLUMNS, query, params
+    raise ValueError(f'Unknown export {kind!r}')
+
+
+def iter_rows(path, query, params):
+    """Yield result rows in batches from a snapshot on a private connection"""
+    conn = db.connect(path)
+    try:
+        # A deferred read transaction keeps every batch on the same snapshot
+        conn.execute('BEGIN')
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            yield rows
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def csv_chunks(columns, batches):
+    """Encode row batches as CSV, yielding roughly EXPORT_CHUNK_BYTES at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def xlsx_chunks(title, columns, batches):
+    """Write row batches to a write-only workbook and stream the saved file"""
+    # Imported here so workers that never export XLSX don't load openpyxl
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(columns)
+    for rows in batches:
+        for row in rows:
+            sheet.append(row)
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as f:
+            while chunk := f.read(EXPORT_CHUNK_BYTES):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def stream(output, title, columns, query, params):
+    """Response body generator for an export from the current school's database"""
+    # Resolve the file now: the body is produced after the request has ended
+    return _stream(db.tenant_path(), output, title, columns, query, params)
+
+
+def _stream(path, output, title, columns, query, params):
+    batches = iter_rows(path, query, params)
+    chunks = csv_chunks(columns, batches) if output == 'csv' else xlsx_chunks(title, columns, batches)
+    try:
+        yield from chunks
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated download
+        logging.error(f"Error streaming {title} export: {e}")
+        raise
+
+
+def save(dest, output, title, columns, query, params, progress=None):
+    """Write an export from the current school to a file; returns the row count
+
+    Used by background export jobs. progress(rows) is called after each batch.
+    """
+    written = 0
+
+    def counted(batches):
+        nonlocal written
+        for rows in batches:
+            yield rows
+            written += len(rows)
+            if progress:
+                progress(written)
+
+    batches = counted(iter_rows(db.tenant_path(), query, params))
+    chunks = csv_chunks(columns, batches) if output == 'csv' else xlsx_chunks(title, columns, batches)
+    with open(dest, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return written
@@ -0,0 +1,40 @@
+"""Gunicorn settings, read by ``gunicorn app:app`` when run from this directory.
+
+Schema migrations run once in the master before any worker is forked, so
+workers start against up-to-date databases and skip the check.
+
+Every open dashboard holds an /events stream for as long as it stays open,
+so requests are served from threads (gthread) rather than one sync worker
+per request, which such a stream would hold until the worker timeout. A
+worker accepts at most MAX_EVENT_STREAMS streams (half its threads by
+default) and answers 503 past that, so the other threads stay free for
+ordinary requests; raise WEB_CONCURRENCY or GUNICORN_THREADS for more
+dashboards, or serve /events from ``uvicorn asgi:app``.
+
+With more than one worker, events are relayed between them through the
+EVENT_RELAY_PATH file (see events.py), recreated at every start along with
+the EVENT_EPOCH their IDs share.
+"""
+import os
+import secrets
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Open event streams plus concurrent ordinary requests, per worker
+threads = int(os.environ.get('GUNICORN_THREADS', 64))
+
+
+def on_starting(server):
+    import db
+    db.migrate_all()
+    # Set here, in the master, for every worker to inherit; the stream limit
+    # follows --threads too, not only GUNICORN_THREADS
+    os.environ.setdefault('MAX_EVENT_STREAMS', str(max(1, server.cfg.threads // 2)))
+    if server.cfg.workers > 1:
+        relay_path = os.environ.setdefault('EVENT_RELAY_PATH', 'event_relay.db')
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(relay_path + suffix)
+            except FileNotFoundError:
+                pass
+        os.environ['EVENT_EPOCH'] = secrets.token_hex(4)
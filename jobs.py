@@ -0,0 +1,331 @@
+"""Background jobs for work that outlives an HTTP request.
+
+A route calls ``enqueue()``, which writes a row to the ``jobs`` table and
+returns the new job's ID straight away; the client then polls
+``/jobs/<id>``. A ``JobRunner`` in each worker (or a standalone
+``python jobs.py`` process) claims queued jobs from every school's database
+and runs the handler registered for the job's kind on one of JOB_WORKERS
+threads.
+
+Handlers report through ``Job.progress()``, which stores the progress
+count, per-row result items and a checkpoint. Called inside the handler's
+own write transaction it commits together with the work it describes, so
+when a worker dies its job is claimed again once the heartbeat is
+JOB_STALE_SECONDS old and resumes from the last checkpoint. Files a job
+produces (exports, QR sheets) are kept under JOB_OUTPUT_DIR until the job
+is purged, JOB_RETENTION_SECONDS after it finished. A file a job reads
+(``params['upload']``, e.g. an uploaded sheet) is removed by its handler
+once it is done with it, or here when the job fails without the handler
+running again.
+"""
+import os
+import json
+import time
+import shutil
+import secrets
+import logging
+import threading
+
+from db import get_db, transaction, tenants, current_tenant, use_tenant
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 5))
+MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_OUTPUT_DIR = os.environ.get('JOB_OUTPUT_DIR', 'job_files')
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 7 * 24 * 3600))
+
+# Running jobs are touched this often; one untouched for JOB_STALE_SECONDS
+# belongs to a runner that died and is claimed again
+HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 60))
+
+# Progress-only updates (no items or checkpoint) are written at most this often
+PROGRESS_INTERVAL = 1.0
+
+PURGE_INTERVAL = 600
+MAX_ITEMS_PAGE = 1000
+
+# Set JOB_RUNNER=external when running `python jobs.py` separately
+IN_PROCESS = os.environ.get('JOB_RUNNER', 'thread') == 'thread'
+
+# kind -> handler(job), filled in by @handler
+handlers = {}
+
+
+def handler(kind):
+    """Register a function as the handler for a job kind"""
+    def register(fn):
+        handlers[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, params):
+    """Queue a job in the current school and return its ID"""
+    if kind not in handlers:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    # Unguessable, since results can include new students' passwords
+    job_id = secrets.token_hex(16)
+    with transaction() as cursor:
+        cursor.execute('INSERT INTO jobs (id, kind, params) VALUES (?, ?, ?)',
+                       (job_id, kind, json.dumps(params)))
+    if runner is not None:
+        runner.wake()
+    return job_id
+
+
+def job_status(job_id, after=0, limit=MAX_ITEMS_PAGE):
+    """Return a job's status and the result items after seq `after`, or None"""
+    cursor = get_db().cursor()
+    cursor.execute('''
+        SELECT id, kind, status, progress, total, items, result, error, attempts,
+               created_at, started_at, finished_at
+        FROM jobs WHERE id = ?
+    ''', (job_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    cursor.execute('SELECT seq, ok, data FROM job_items WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?',
+                   (job_id, after, min(limit, MAX_ITEMS_PAGE)))
+    items = [dict(json.loads(data), seq=seq, ok=bool(ok)) for seq, ok, data in cursor.fetchall()]
+    return {
+        'job_id': row[0],
+        'kind': row[1],
+        'status': row[2],
+        'progress': row[3],
+        'total': row[4],
+        'items_total': row[5],
+        'result': json.loads(row[6]) if row[6] else None,
+        'error': row[7],
+        'attempts': row[8],
+        'created_at': row[9],
+        'started_at': row[10],
+        'finished_at': row[11],
+        'items': items,
+        'next_after': items[-1]['seq'] if items else after
+    }
+
+
+def output_dir(tenant, job_id):
+    return os.path.join(JOB_OUTPUT_DIR, tenant, job_id)
+
+
+def remove_upload(params):
+    """Delete the uploaded file a job reads, if it has one and it is still there"""
+    path = params.get('upload')
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class Job:
+    """A claimed job as seen by its handler"""
+
+    def __init__(self, job_id, kind, params, checkpoint, items):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.checkpoint = checkpoint
+        self.items = items
+        self.tenant = current_tenant()
+        self._last_progress = 0.0
+
+    def output_path(self, filename):
+        """Path for a file this job produces, served by /jobs/<id>/download"""
+        directory = output_dir(self.tenant, self.id)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def progress(self, done, total=None, checkpoint=None, items=()):
+        """Record progress, result items (ok, data) and a checkpoint to resume from"""
+        items = list(items)
+        now = time.time()
+        if not items and checkpoint is None and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        with transaction() as cursor:
+            cursor.executemany('INSERT INTO job_items (job_id, seq, ok, data) VALUES (?, ?, ?, ?)',
+                               [(self.id, self.items + n, int(ok), json.dumps(data))
+                                for n, (ok, data) in enumerate(items, 1)])
+            cursor.execute('''
+                UPDATE jobs SET progress = ?, total = COALESCE(?, total), items = ?,
+                    checkpoint = COALESCE(?, checkpoint), claimed_at = ?
+                WHERE id = ?
+            ''', (done, total, self.items + len(items),
+                  None if checkpoint is None else json.dumps(checkpoint), now, self.id))
+        self.items += len(items)
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+
+
+class JobRunner:
+    """Claims queued jobs across every school and runs them on worker threads"""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        # (school, job ID) of jobs running in this process, for the heartbeat
+        self._running = set()
+        self._last_purge = 0.0
+
+    def start(self):
+        """Start the worker and heartbeat threads in this process if not running"""
+        with self._lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._running = set()
+            self._threads = [threading.Thread(target=self.run_forever, name=f'job-runner-{n}', daemon=True)
+                             for n in range(self.workers)]
+            self._threads.append(threading.Thread(target=self.heartbeat_forever, name='job-heartbeat',
+                                                  daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def wake(self):
+        """Nudge the runner, starting it first after a fork"""
+        if IN_PROCESS:
+            self.start()
+        self._wake.set()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            ran = False
+            # At most one job per school per pass, so one school's backlog
+            # does not starve the others
+            for tenant in tenants():
+                try:
+                    with use_tenant(tenant):
+                        job = self.claim()
+                        if job:
+                            self.run(job)
+                            ran = True
+                except Exception as e:
+                    logging.error(f"Job runner error for {tenant}: {e}")
+            if not ran:
+                self.purge()
+                self._wake.wait(POLL_INTERVAL)
+
+    def claim(self):
+        """Mark the oldest queued (or abandoned) job as running and return it"""
+        now = time.time()
+        with transaction() as cursor:
+            cursor.execute('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, claimed_at = ?,
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' OR (status = 'running' AND claimed_at < ?)
+                    ORDER BY rowid LIMIT 1
+                )
+                RETURNING id, kind, params, checkpoint, items, attempts
+            ''', (now, now - JOB_STALE_SECONDS))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        job_id, kind, params, checkpoint, items, attempts = row
+        params = json.loads(params)
+        if attempts > MAX_ATTEMPTS:
+            self.finish(job_id, 'failed', error=f'Job was interrupted {MAX_ATTEMPTS} times')
+            remove_upload(params)
+            return None
+        return Job(job_id, kind, params, json.loads(checkpoint) if checkpoint else None, items)
+
+    def run(self, job):
+        key = (job.tenant, job.id)
+        self._running.add(key)
+        try:
+            fn = handlers.get(job.kind)
+            if fn is None:
+                raise ValueError(f'Unknown job kind {job.kind!r}')
+            result = fn(job)
+        except ValueError as e:
+            # Bad input the client should see, e.g. an unreadable sheet
+            self.finish(job.id, 'failed', error=str(e))
+        except Exception as e:
+            logging.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            self.finish(job.id, 'failed', error='Internal server error')
+        else:
+            self.finish(job.id, 'done', result=result)
+        finally:
+            self._running.discard(key)
+
+    def finish(self, job_id, status, result=None, error=None):
+        with transaction() as cursor:
+            cursor.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, claimed_at = NULL,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, None if result is None else json.dumps(result), error, job_id))
+
+    def heartbeat_forever(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            for tenant, job_id in list(self._running):
+                try:
+                    with use_tenant(tenant), transaction() as cursor:
+                        cursor.execute("UPDATE jobs SET claimed_at = ? WHERE id = ? AND status = 'running'",
+                                       (time.time(), job_id))
+                except Exception as e:
+                    logging.error(f"Job heartbeat failed for {job_id}: {e}")
+
+    def purge(self):
+        """Delete jobs, items and files finished more than JOB_RETENTION_SECONDS ago"""
+        if time.time() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.time()
+        for tenant in tenants():
+            with use_tenant(tenant), transaction() as cursor:
+                cursor.execute('''
+                    DELETE FROM jobs WHERE status IN ('done', 'failed')
+                        AND finished_at < datetime('now', ?)
+                    RETURNING id, params
+                ''', (f'-{JOB_RETENTION_SECONDS} seconds',))
+                expired = cursor.fetchall()
+                cursor.executemany('DELETE FROM job_items WHERE job_id = ?', [(job_id,) for job_id, _ in expired])
+            for job_id, params in expired:
+                shutil.rmtree(output_dir(tenant, job_id), ignore_errors=True)
+                remove_upload(json.loads(params))
+
+
+# Set by init_runner(); None means enqueue only
+runner = None
+
+
+def init_runner():
+    """Create this process's runner and start it when running in-process"""
+    global runner
+    runner = JobRunner()
+    if IN_PROCESS:
+        runner.start()
+    return runner
+
+
+if __name__ == '__main__':
+    # Stop the app's own import from starting an in-process runner or mail
+    # dispatcher; this process only runs jobs (`python mailer.py` sends mail)
+    os.environ['JOB_RUNNER'] = 'external'
+    os.environ['MAIL_DISPATCHER'] = 'external'
+    import app  # noqa: F401 -- registers the job handlers
+    import jobs
+    logging.info(f"Running {JOB_WORKERS} job workers as a standalone process")
+    standalone = jobs.JobRunner()
+    standalone.start()
+    standalone.join()
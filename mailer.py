@@ -0,0 +1,241 @@
+"""Background outbound email dispatcher.
+
+Requests call ``enqueue_email()``, which only writes a row to the
+``email_queue`` table and returns. A ``MailDispatcher`` thread in each
+worker (or a standalone ``python mailer.py`` process) claims due messages in
+batches and sends each batch over one reused Flask-Mail SMTP connection.
+Failures are retried with exponential backoff until MAX_ATTEMPTS. Each
+school's database has its own queue and the dispatcher drains them in turn.
+
+Account emails carry a student's password, so a body is cleared as soon as
+its row is sent or has failed for good, and sent and failed rows are
+deleted MAIL_RETENTION_SECONDS after they were queued.
+"""
+import os
+import threading
+import time
+import logging
+
+import metrics
+from db import get_db, transaction, tenants, use_tenant
+
+BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+POLL_INTERVAL = float(os.environ.get('MAIL_POLL_INTERVAL', 5))
+MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 5))
+RETRY_BASE_SECONDS = float(os.environ.get('MAIL_RETRY_BASE_SECONDS', 30))
+RETRY_MAX_SECONDS = 3600
+
+# Rows claimed longer ago than this belong to a dispatcher that died
+CLAIM_TIMEOUT_SECONDS = 600
+
+# Sent and failed rows are kept this long for /email_status, then deleted
+MAIL_RETENTION_SECONDS = int(os.environ.get('MAIL_RETENTION_SECONDS', 7 * 24 * 3600))
+PURGE_INTERVAL = 600
+
+# Set MAIL_DISPATCHER=external when running `python mailer.py` separately
+IN_PROCESS = os.environ.get('MAIL_DISPATCHER', 'thread') == 'thread'
+
+
+def enqueue_email(to_email, subject, body):
+    """Queue an email for background delivery and return its queue ID"""
+    with transaction() as cursor:
+        cursor.execute('INSERT INTO email_queue (recipient, subject, body) VALUES (?, ?, ?)',
+                       (to_email, subject, body))
+        email_id = cursor.lastrowid
+    if dispatcher is not None:
+        dispatcher.wake()
+    return email_id
+
+
+def email_status(email_id):
+    """Return the delivery status of a queued email, or None"""
+    cursor = get_db().cursor()
+    cursor.execute('''
+        SELECT id, recipient, status, attempts, last_error, created_at, sent_at
+        FROM email_queue WHERE id = ?
+    ''', (email_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        'email_id': row[0],
+        'recipient': row[1],
+        'status': row[2],
+        'attempts': row[3],
+        'last_error': row[4],
+        'created_at': row[5],
+        'sent_at': row[6]
+    }
+
+
+def queue_summary():
+    """Count queued emails by status"""
+    cursor = get_db().cursor()
+    cursor.execute('SELECT status, COUNT(*) FROM email_queue GROUP BY status')
+    return dict(cursor.fetchall())
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt after `attempts` failures"""
+    return min(RETRY_BASE_SECONDS * (2 ** (attempts - 1)), RETRY_MAX_SECONDS)
+
+
+class MailDispatcher:
+    """Drains email_queue over a single reused SMTP connection per batch"""
+
+    def __init__(self, app, mail=None):
+        self.app = app
+        self._mail = mail
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    @property
+    def mail(self):
+        """The app's Flask-Mail, created for the first batch so idle workers never import it"""
+        if self._mail is None:
+            from flask_mail import Mail
+            self._mail = Mail(self.app)
+        return self._mail
+
+    def start(self):
+        """Start the dispatcher thread in this process if not running"""
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run_forever, name='mail-dispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Nudge the dispatcher, starting it first after a fork"""
+        if IN_PROCESS:
+            self.start()
+        self._wake.set()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            claimed = 0
+            for tenant in tenants():
+                try:
+                    with use_tenant(tenant):
+                        claimed = max(claimed, self.dispatch_once())
+                except Exception as e:
+                    logging.error(f"Mail dispatcher error for {tenant}: {e}")
+            # Keep draining while any school has a backlog, otherwise sleep
+            if claimed < BATCH_SIZE:
+                self.purge()
+                self._wake.wait(POLL_INTERVAL)
+
+    def claim(self):
+        """Mark up to BATCH_SIZE due emails as sending and return them"""
+        now = time.time()
+        with transaction() as cursor:
+            cursor.execute('''
+                UPDATE email_queue SET status = 'sending', claimed_at = ?
+                WHERE id IN (
+                    SELECT id FROM email_queue
+                    WHERE (status = 'pending' AND next_attempt_at <= ?)
+                       OR (status = 'sending' AND claimed_at < ?)
+                    ORDER BY id LIMIT ?
+                )
+                RETURNING id, recipient, subject, body, attempts
+            ''', (now, now, now - CLAIM_TIMEOUT_SECONDS, BATCH_SIZE))
+            return cursor.fetchall()
+
+    def dispatch_once(self):
+        """Send one batch of due emails; returns how many were claimed"""
+        batch = self.claim()
+        if not batch:
+            return 0
+
+        from flask_mail import Message
+        sent, failed = [], []
+        with self.app.app_context(), metrics.timed('email'):
+            try:
+                with self.mail.connect() as connection:
+                    for email_id, recipient, subject, body, attempts in batch:
+                        try:
+                            connection.send(Message(subject=subject, recipients=[recipient], body=body))
+                            sent.append(email_id)
+                        except Exception as e:
+                            failed.append((email_id, attempts, str(e)))
+            except Exception as e:
+                # Connecting (or closing) failed: retry whatever wasn't sent
+                logging.error(f"SMTP connection failed: {e}")
+                done = set(sent) | {f[0] for f in failed}
+                failed.extend((email_id, attempts, str(e))
+                              for email_id, _, _, _, attempts in batch if email_id not in done)
+
+        self.record(sent, failed)
+        return len(batch)
+
+    def record(self, sent, failed):
+        now = time.time()
+        with transaction() as cursor:
+            cursor.executemany('''
+                UPDATE email_queue SET status = 'sent', attempts = attempts + 1, body = NULL,
+                    last_error = NULL, claimed_at = NULL, sent_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', [(email_id,) for email_id in sent])
+            cursor.executemany('''
+                UPDATE email_queue SET status = ?, attempts = ?, last_error = ?,
+                    claimed_at = NULL, next_attempt_at = ?
+                WHERE id = ?
+            ''', [('failed' if attempts + 1 >= MAX_ATTEMPTS else 'pending', attempts + 1, error,
+                   now + retry_delay(attempts + 1), email_id)
+                  for email_id, attempts, error in failed])
+            # A message that has failed for good is never sent, so its body goes too
+            cursor.executemany("UPDATE email_queue SET body = NULL WHERE id = ? AND status = 'failed'",
+                               [(email_id,) for email_id, _, _ in failed])
+        for email_id, attempts, error in failed:
+            logging.warning(f"Failed to send email {email_id} (attempt {attempts + 1}): {error}")
+
+    def purge(self):
+        """Delete sent and failed emails queued more than MAIL_RETENTION_SECONDS ago"""
+        if time.time() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.time()
+        for tenant in tenants():
+            try:
+                with use_tenant(tenant), transaction() as cursor:
+                    cursor.execute('''
+                        DELETE FROM email_queue WHERE status IN ('sent', 'failed')
+                            AND created_at < datetime('now', ?)
+                    ''', (f'-{MAIL_RETENTION_SECONDS} seconds',))
+            except Exception as e:
+                logging.error(f"Mail purge error for {tenant}: {e}")
+
+
+# Set by init_dispatcher(); None means enqueue only
+dispatcher = None
+
+
+def init_dispatcher(app, mail=None):
+    """Create this process's dispatcher and start it when running in-process"""
+    global dispatcher
+    dispatcher = MailDispatcher(app, mail)
+    if IN_PROCESS:
+        dispatcher.start()
+    return dispatcher
+
+
+if __name__ == '__main__':
+    # Stop the app's own import from starting an in-process dispatcher or
+    # job runner; this process only sends mail (`python jobs.py` runs jobs)
+    os.environ['MAIL_DISPATCHER'] = 'external'
+    os.environ['JOB_RUNNER'] = 'external'
+    from app import app
+    logging.info("Running mail dispatcher as a standalone process")
+    MailDispatcher(app).run_forever()
@@ -1,4 +1,5 @@
-from app import app
-
 if __name__ == '__main__':
+    # Imported here, not at the top: process pool children re-import this
+    # script and must not build (and start) another app
+    from app import app
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,246 @@
+"""Request metrics and sampling profiler, exposed at /metrics.
+
+``init_app()`` installs request hooks that record, per route:
+
+* latency and request counts by status
+* SQL statements executed and time spent in them (fed by db.py's
+  instrumented cursors through ``record_sql()``)
+* time spent in named operations - password hashing, pandas sheet
+  parsing, SMTP delivery - wrapped in ``timed()`` or added with
+  ``add_time()``
+
+``render()`` returns everything in the Prometheus text exposition format.
+Metrics live in process memory, so with several gunicorn workers each
+worker reports its own series.
+
+Set PROFILE_EVERY_N_REQUESTS to run cProfile on every Nth request and dump
+the stats to PROFILE_DIR (open them with ``python -m pstats`` or snakeviz).
+"""
+import os
+import re
+import time
+import cProfile
+import itertools
+import threading
+import logging
+from contextlib import contextmanager
+
+from flask import request, g
+
+PROFILE_EVERY_N_REQUESTS = int(os.environ.get('PROFILE_EVERY_N_REQUESTS', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+_local = threading.local()
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts plus a running sum and total count
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                names = self.labelnames + ('le',)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} '
+                                 f'{cumulative}')
+                lines.append(f'{self.name}_bucket{_format_labels(names, labels + ("+Inf",))} {count}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+                lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+requests_total = Counter(
+    'http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status'))
+request_duration = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route'))
+request_sql_queries = Histogram(
+    'http_request_sql_queries', 'SQL statements executed per request', ('route',), QUERY_COUNT_BUCKETS)
+request_sql_seconds = Histogram(
+    'http_request_sql_seconds', 'Time spent executing SQL per request', ('route',))
+request_operation_seconds = Histogram(
+    'http_request_operation_seconds', 'Time spent per request in hashing, pandas and email',
+    ('route', 'operation'))
+operation_seconds = Histogram(
+    'app_operation_seconds', 'Time spent in hashing, pandas and email in any thread', ('operation',))
+sql_queries_total = Counter('app_sql_queries_total', 'SQL statements executed in any thread')
+profiles_total = Counter('app_profiles_written_total', 'cProfile dumps written to disk')
+student_cache_lookups = Counter(
+    'app_student_cache_lookups_total', 'Student profile lookups by where they were answered '
+    '(local, shared, database, missing)', ('source',))
+unsigned_scans = Counter(
+    'app_unsigned_scans_total', 'Scans accepted with a bare student_id instead of a signed QR token')
+
+REGISTRY = [requests_total, request_duration, request_sql_queries, request_sql_seconds,
+            request_operation_seconds, operation_seconds, sql_queries_total, profiles_total,
+            student_cache_lookups, unsigned_scans]
+
+
+class RequestStats:
+    """What one request spent its time on"""
+
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.operations = {}
+
+
+def record_sql(seconds):
+    """Count one executed SQL statement against the current request"""
+    sql_queries_total.inc()
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.sql_queries += 1
+        stats.sql_seconds += seconds
+
+
+def add_time(operation, seconds):
+    """Attribute seconds of work to a named operation"""
+    operation_seconds.observe(seconds, operation)
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.operations[operation] = stats.operations.get(operation, 0.0) + seconds
+
+
+@contextmanager
+def timed(operation):
+    """Time a block as a named operation; nested blocks of the same name count once"""
+    active = _local.__dict__.setdefault('active', set())
+    if operation in active:
+        yield
+        return
+    active.add(operation)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.discard(operation)
+        add_time(operation, time.perf_counter() - start)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+_request_counter = itertools.count(1)
+
+
+def _start_profiler():
+    if not PROFILE_EVERY_N_REQUESTS or next(_request_counter) % PROFILE_EVERY_N_REQUESTS:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another thread is already being profiled
+        return None
+    return profiler
+
+
+def _dump_profile(profiler, route):
+    profiler.disable()
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = re.sub(r'[^\w]+', '_', route).strip('_') or 'index'
+        path = os.path.join(PROFILE_DIR, f'{int(time.time() * 1000)}-{os.getpid()}-{name}.prof')
+        profiler.dump_stats(path)
+        profiles_total.inc()
+    except OSError as e:
+        logging.warning(f"Could not write profile: {e}")
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def init_app(app):
+    """Record metrics for every request handled by app"""
+
+    @app.before_request
+    def start_request_metrics():
+        _local.stats = RequestStats()
+        g.metrics_started = time.perf_counter()
+        g.metrics_profiler = _start_profiler()
+
+    @app.after_request
+    def record_request_metrics(response):
+        stats = getattr(_local, 'stats', None)
+        started = g.pop('metrics_started', None)
+        if stats is None or started is None:
+            return response
+        _local.stats = None
+
+        route = _route()
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            _dump_profile(profiler, route)
+
+        requests_total.inc(request.method, route, str(response.status_code))
+        request_duration.observe(time.perf_counter() - started, request.method, route)
+        request_sql_queries.observe(stats.sql_queries, route)
+        request_sql_seconds.observe(stats.sql_seconds, route)
+        for operation, seconds in stats.operations.items():
+            request_operation_seconds.observe(seconds, route, operation)
+        return response
@@ -0,0 +1,485 @@
+"""Versioned schema migrations for school.db.
+
+The applied schema version is kept in SQLite's ``PRAGMA user_version``.
+``migrate()`` runs every migration newer than that, in order, and bumps the
+version as it goes, so init_db() is safe to call on every startup.
+"""
+import rollups
+import school_calendar
+
+
+def _base_tables(cursor):
+    """Create the original teachers, students and attendance tables"""
+    # Teachers table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS teachers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Students table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            class TEXT NOT NULL,
+            section TEXT NOT NULL,
+            roll_no TEXT NOT NULL,
+            teacher_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (teacher_id) REFERENCES teachers (id)
+        )
+    ''')
+    
+    # Attendance table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            status TEXT DEFAULT 'present',
+            marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES students (student_id)
+        )
+    ''')
+
+
+def _lookup_indexes(cursor):
+    """Index the columns attendance, reports and rosters filter on"""
+    # The old SELECT-then-INSERT could race and mark a student twice a day;
+    # keep the earliest mark so the unique index can be built
+    cursor.execute('''
+        DELETE FROM attendance WHERE id NOT IN (
+            SELECT MIN(id) FROM attendance GROUP BY student_id, date
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_date
+        ON attendance (student_id, date)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_students_teacher_name
+        ON students (teacher_id, name)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_students_class_section
+        ON students (class, section)
+    ''')
+
+
+def _email_queue(cursor):
+    """Persistent outbound email queue drained by mailer.MailDispatcher"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_email_queue_status_due
+        ON email_queue (status, next_attempt_at)
+    ''')
+
+
+def _attendance_rollups(cursor):
+    """Per-student monthly and per-class daily rollups kept by triggers"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_monthly (
+            student_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            present_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (student_id, month)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS class_daily (
+            class TEXT NOT NULL,
+            section TEXT NOT NULL,
+            date DATE NOT NULL,
+            present INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (class, section, date)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS attendance_rollup_insert
+        AFTER INSERT ON attendance WHEN NEW.status = 'present'
+        BEGIN
+            INSERT INTO attendance_monthly (student_id, month, present_days)
+            VALUES (NEW.student_id, substr(NEW.date, 1, 7), 1)
+            ON CONFLICT (student_id, month) DO UPDATE SET present_days = present_days + 1;
+            INSERT INTO class_daily (class, section, date, present)
+            SELECT class, section, NEW.date, 1 FROM students WHERE student_id = NEW.student_id
+            ON CONFLICT (class, section, date) DO UPDATE SET present = present + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS attendance_rollup_delete
+        AFTER DELETE ON attendance WHEN OLD.status = 'present'
+        BEGIN
+            UPDATE attendance_monthly SET present_days = present_days - 1
+            WHERE student_id = OLD.student_id AND month = substr(OLD.date, 1, 7);
+            UPDATE class_daily SET present = present - 1
+            WHERE date = OLD.date AND (class, section) IN (
+                SELECT class, section FROM students WHERE student_id = OLD.student_id
+            );
+        END
+    ''')
+    rollups.rebuild(cursor)
+
+
+def _roster_versions(cursor):
+    """Per-teacher roster version, bumped by triggers on every student change"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS roster_versions (
+            teacher_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS roster_version_insert
+        AFTER INSERT ON students WHEN NEW.teacher_id IS NOT NULL
+        BEGIN
+            INSERT INTO roster_versions (teacher_id, version) VALUES (NEW.teacher_id, 1)
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS roster_version_delete
+        AFTER DELETE ON students WHEN OLD.teacher_id IS NOT NULL
+        BEGIN
+            INSERT INTO roster_versions (teacher_id, version) VALUES (OLD.teacher_id, 1)
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+        END
+    ''')
+    # An update bumps the new owner and, when a student moves, the old one too
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS roster_version_update
+        AFTER UPDATE ON students
+        BEGIN
+            INSERT INTO roster_versions (teacher_id, version)
+            SELECT NEW.teacher_id, 1 WHERE NEW.teacher_id IS NOT NULL
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+            INSERT INTO roster_versions (teacher_id, version)
+            SELECT OLD.teacher_id, 1 WHERE OLD.teacher_id IS NOT NULL AND OLD.teacher_id IS NOT NEW.teacher_id
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+        END
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO roster_versions (teacher_id, version)
+        SELECT DISTINCT teacher_id, 1 FROM students WHERE teacher_id IS NOT NULL
+    ''')
+
+
+def _accounts_view(cursor):
+    """Single view over both roles so login resolves an email in one query"""
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS accounts AS
+        SELECT 'teacher' AS role, id AS account_id, name, email, password_hash,
+               NULL AS class, NULL AS section, NULL AS roll_no
+        FROM teachers
+        UNION ALL
+        SELECT 'student', student_id, name, email, password_hash, class, section, roll_no
+        FROM students
+    ''')
+
+
+def _jobs(cursor):
+    """Background job queue and per-row job results, used by jobs.JobRunner"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            items INTEGER NOT NULL DEFAULT 0,
+            checkpoint TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_claimed
+        ON jobs (status, claimed_at)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_items (
+            job_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            ok INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (job_id, seq)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _offline_sync(cursor):
+    """Per-student roster changes for delta sync and received offline scans"""
+    # One row per (teacher, student) holding the roster version of its last
+    # change; deleted marks a student who left that teacher's roster
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS roster_changes (
+            teacher_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (teacher_id, student_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_roster_changes_version
+        ON roster_changes (teacher_id, version)
+    ''')
+    # Replace the version triggers with ones that also record which student
+    # changed. Updates only count columns a roster shows, so a password
+    # rehash on login no longer invalidates every cached roster.
+    for name in ('roster_version_insert', 'roster_version_delete', 'roster_version_update'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute('''
+        CREATE TRIGGER roster_version_insert
+        AFTER INSERT ON students WHEN NEW.teacher_id IS NOT NULL
+        BEGIN
+            INSERT INTO roster_versions (teacher_id, version) VALUES (NEW.teacher_id, 1)
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+            INSERT INTO roster_changes (teacher_id, student_id, version, deleted)
+            SELECT teacher_id, NEW.student_id, version, 0 FROM roster_versions WHERE teacher_id = NEW.teacher_id
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET version = excluded.version, deleted = 0;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER roster_version_delete
+        AFTER DELETE ON students WHEN OLD.teacher_id IS NOT NULL
+        BEGIN
+            INSERT INTO roster_versions (teacher_id, version) VALUES (OLD.teacher_id, 1)
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+            INSERT INTO roster_changes (teacher_id, student_id, version, deleted)
+            SELECT teacher_id, OLD.student_id, version, 1 FROM roster_versions WHERE teacher_id = OLD.teacher_id
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET version = excluded.version, deleted = 1;
+        END
+    ''')
+    # A student who moves (or is renumbered) is removed from the old roster
+    cursor.execute('''
+        CREATE TRIGGER roster_version_update
+        AFTER UPDATE OF student_id, name, email, class, section, roll_no, teacher_id ON students
+        BEGIN
+            INSERT INTO roster_versions (teacher_id, version)
+            SELECT NEW.teacher_id, 1 WHERE NEW.teacher_id IS NOT NULL
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+            INSERT INTO roster_changes (teacher_id, student_id, version, deleted)
+            SELECT teacher_id, NEW.student_id, version, 0 FROM roster_versions WHERE teacher_id = NEW.teacher_id
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET version = excluded.version, deleted = 0;
+            INSERT INTO roster_versions (teacher_id, version)
+            SELECT OLD.teacher_id, 1 WHERE OLD.teacher_id IS NOT NULL AND OLD.teacher_id IS NOT NEW.teacher_id
+            ON CONFLICT (teacher_id) DO UPDATE SET version = version + 1;
+            INSERT INTO roster_changes (teacher_id, student_id, version, deleted)
+            SELECT teacher_id, OLD.student_id, version, 1 FROM roster_versions
+            WHERE teacher_id = OLD.teacher_id
+                AND (OLD.teacher_id IS NOT NEW.teacher_id OR OLD.student_id IS NOT NEW.student_id)
+            ON CONFLICT (teacher_id, student_id) DO UPDATE SET version = excluded.version, deleted = 1;
+        END
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO roster_changes (teacher_id, student_id, version)
+        SELECT s.teacher_id, s.student_id, v.version
+        FROM students s JOIN roster_versions v ON v.teacher_id = s.teacher_id
+    ''')
+    # Result of every offline scan received, keyed by the client's scan ID,
+    # so a retried upload gets the same answer instead of a second mark
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_scans (
+            client_id TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            received_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sync_scans_received
+        ON sync_scans (received_at)
+    ''')
+
+
+def _present_marks_index(cursor):
+    """Index present marks by student so histories never read the table"""
+    # Every query over present marks filters on status, which the unique
+    # (student_id, date) index can't answer without a table lookup per row
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_attendance_present
+        ON attendance (student_id, date) WHERE status = 'present'
+    ''')
+
+
+def _school_calendar(cursor):
+    """Working days, holidays and per-class schedules, and the school-day index"""
+    # weekmask: seven 0/1 flags, Monday first; NULL follows the wider calendar
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calendars (
+            class TEXT NOT NULL,
+            section TEXT NOT NULL,
+            weekmask TEXT,
+            PRIMARY KEY (class, section)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO calendars (class, section, weekmask) VALUES ('', '', '1111100')")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS holidays (
+            class TEXT NOT NULL,
+            section TEXT NOT NULL,
+            date DATE NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (class, section, date)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS school_days (
+            class TEXT NOT NULL,
+            section TEXT NOT NULL,
+            date DATE NOT NULL,
+            day_no INTEGER NOT NULL,
+            PRIMARY KEY (class, section, date)
+        ) WITHOUT ROWID
+    ''')
+    # The range the index covers, and a version bumped by every rebuild
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS school_day_index (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            first DATE NOT NULL,
+            last DATE NOT NULL,
+            version INTEGER NOT NULL
+        )
+    ''')
+    school_calendar.rebuild(cursor)
+
+
+def _drop_monthly_rollup(cursor):
+    """Drop attendance_monthly; student reports count school days from raw attendance"""
+    # A month's present days cannot tell school days from holidays, so nothing
+    # reads it since the school calendar; keep only the class_daily triggers
+    cursor.execute('DROP TRIGGER IF EXISTS attendance_rollup_insert')
+    cursor.execute('DROP TRIGGER IF EXISTS attendance_rollup_delete')
+    cursor.execute('''
+        CREATE TRIGGER attendance_rollup_insert
+        AFTER INSERT ON attendance WHEN NEW.status = 'present'
+        BEGIN
+            INSERT INTO class_daily (class, section, date, present)
+            SELECT class, section, NEW.date, 1 FROM students WHERE student_id = NEW.student_id
+            ON CONFLICT (class, section, date) DO UPDATE SET present = present + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER attendance_rollup_delete
+        AFTER DELETE ON attendance WHEN OLD.status = 'present'
+        BEGIN
+            UPDATE class_daily SET present = present - 1
+            WHERE date = OLD.date AND (class, section) IN (
+                SELECT class, section FROM students WHERE student_id = OLD.student_id
+            );
+        END
+    ''')
+    cursor.execute('DROP TABLE IF EXISTS attendance_monthly')
+
+
+def _email_body_retention(cursor):
+    """Let email_queue bodies be cleared once sent, and clear those already sent"""
+    # Account emails carry passwords; SQLite cannot drop NOT NULL in place,
+    # so copy the queue into a table whose body is nullable
+    cursor.execute('''
+        CREATE TABLE email_queue_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO email_queue_new
+        SELECT id, recipient, subject, CASE WHEN status IN ('sent', 'failed') THEN NULL ELSE body END,
+            status, attempts, last_error, next_attempt_at, claimed_at, created_at, sent_at
+        FROM email_queue
+    ''')
+    # Keep IDs handed out before (and since deleted) from being reused
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'email_queue_new'")
+    cursor.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'email_queue_new', seq FROM sqlite_sequence WHERE name = 'email_queue'
+    ''')
+    cursor.execute('DROP TABLE email_queue')
+    cursor.execute('ALTER TABLE email_queue_new RENAME TO email_queue')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_email_queue_status_due
+        ON email_queue (status, next_attempt_at)
+    ''')
+
+
+def _job_item_passwords(cursor):
+    """Remove new students' passwords from stored import job results"""
+    cursor.execute('''
+        UPDATE job_items SET data = json_remove(data, '$.password')
+        WHERE json_extract(data, '$.password') IS NOT NULL
+    ''')
+
+
+# (version, description, function) -- append only, never renumber
+MIGRATIONS = [
+    (1, 'base tables', _base_tables),
+    (2, 'attendance and student lookup indexes', _lookup_indexes),
+    (3, 'outbound email queue', _email_queue),
+    (4, 'attendance rollup tables', _attendance_rollups),
+    (5, 'per-teacher roster versions', _roster_versions),
+    (6, 'accounts view across teachers and students', _accounts_view),
+    (7, 'background jobs', _jobs),
+    (8, 'roster changes and offline scan sync', _offline_sync),
+    (9, 'present attendance by student index', _present_marks_index),
+    (10, 'school calendar and school-day index', _school_calendar),
+    (11, 'drop the per-student monthly rollup', _drop_monthly_rollup),
+    (12, 'nullable email bodies, cleared once sent', _email_body_retention),
+    (13, 'no passwords in import job results', _job_item_passwords),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor):
+    """Return the schema version recorded in the database"""
+    cursor.execute('PRAGMA user_version')
+    return cursor.fetchone()[0]
+
+
+def migrate(cursor, target=None):
+    """Apply pending migrations up to target (default: latest)"""
+    target = LATEST_VERSION if target is None else target
+    version = current_version(cursor)
+    for number, description, apply in MIGRATIONS:
+        if version < number <= target:
+            apply(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            version = number
+    return version
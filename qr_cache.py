@@ -0,0 +1,140 @@
+"""Content-addressed QR code cache.
+
+A student's QR PNG is stored as ``qr_codes/<student_id>_<kind>_<key>.png``
+where ``kind`` is the token kind (printed or windowed, see qr_tokens.py)
+and ``key`` is a hash of the encoded payload. A new token changes the key,
+so stale images are never served; older files of the same student and kind
+are removed when the new one is written, so a student's printed and
+windowed codes are cached side by side. The key also serves as the HTTP
+ETag.
+
+Callers get the PNG bytes rather than a path: another request may remove
+a file as soon as a newer one is written, so a cached file is read in one
+go and a file that has just gone counts as a miss.
+"""
+import os
+import io
+import glob
+import hashlib
+import zipfile
+import threading
+
+from workers import parallel_map
+
+QR_DIR = 'qr_codes'
+
+# Bulk renders below this size are not worth a trip to the process pool
+PARALLEL_RENDER_THRESHOLD = 16
+
+
+def payload_key(payload):
+    """Short content hash of a payload, used for file names and ETags"""
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def render_png(payload):
+    """Render a payload to PNG bytes (top-level so process pools can pickle it)"""
+    # qrcode pulls in PIL; most requests are served from the cache without either
+    import qrcode
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def payload_kind(payload):
+    """Token kind of a payload ('P' or 'W'), so each kind keeps its own file"""
+    return payload.split(':', 1)[0]
+
+
+def cache_path(student_id, payload):
+    return os.path.join(QR_DIR, f'{student_id}_{payload_kind(payload)}_{payload_key(payload)}.png')
+
+
+def cached(student_id, payload):
+    """A payload's stored PNG bytes, or None"""
+    try:
+        with open(cache_path(student_id, payload), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def store(student_id, payload, png):
+    """Atomically write a rendered PNG and drop the student's older ones of the same kind"""
+    path = cache_path(student_id, payload)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    pattern = f'{glob.escape(student_id)}_{glob.escape(payload_kind(payload))}_*.png'
+    for old in glob.glob(os.path.join(QR_DIR, pattern)):
+        if old != path:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+
+def get_qr(student_id, payload):
+    """Return (PNG bytes, key) for a payload, rendering it on a miss"""
+    png = cached(student_id, payload)
+    if png is None:
+        png = render_png(payload)
+        store(student_id, payload, png)
+    return png, payload_key(payload)
+
+
+def get_many(items):
+    """Return PNG bytes for (student_id, payload) pairs, rendering misses in parallel"""
+    images = [cached(student_id, payload) for student_id, payload in items]
+    missing = [i for i, png in enumerate(images) if png is None]
+    rendered = parallel_map(render_png, [items[i][1] for i in missing], PARALLEL_RENDER_THRESHOLD)
+    for i, png in zip(missing, rendered):
+        store(*items[i], png)
+        images[i] = png
+    return images
+
+
+def build_zip(entries):
+    """Zip (filename, PNG bytes) entries; PNGs are already compressed so store them"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for filename, png in entries:
+            archive.writestr(filename, png)
+    buffer.seek(0)
+    return buffer
+
+
+def build_pdf_sheet(entries, columns=3, rows=4, dpi=150):
+    """Lay out (label, PNG bytes) entries as a printable A4 PDF grid"""
+    from PIL import Image, ImageDraw
+
+    page_size = (int(8.27 * dpi), int(11.69 * dpi))
+    margin = dpi // 2
+    cell_w = (page_size[0] - 2 * margin) // columns
+    cell_h = (page_size[1] - 2 * margin) // rows
+    qr_size = min(cell_w, cell_h) - 40
+
+    pages = []
+    per_page = columns * rows
+    for start in range(0, len(entries), per_page):
+        page = Image.new('RGB', page_size, 'white')
+        draw = ImageDraw.Draw(page)
+        for i, (label, png) in enumerate(entries[start:start + per_page]):
+            x = margin + (i % columns) * cell_w
+            y = margin + (i // columns) * cell_h
+            with Image.open(io.BytesIO(png)) as img:
+                qr_img = img.convert('RGB').resize((qr_size, qr_size), Image.NEAREST)
+            page.paste(qr_img, (x + (cell_w - qr_size) // 2, y))
+            draw.text((x + cell_w // 2, y + qr_size + 8), label, fill='black', anchor='mt')
+        pages.append(page)
+
+    buffer = io.BytesIO()
+    if pages:
+        pages[0].save(buffer, format='PDF', save_all=True, append_images=pages[1:], resolution=dpi)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,184 @@
+"""Student QR codes: one at a time, as PNG images and bulk sheets for a class"""
+import io
+import json
+import base64
+import logging
+
+from flask import Blueprint, request, jsonify, send_file
+from werkzeug.utils import secure_filename
+
+import jobs
+import qr_cache
+import student_cache
+from db import get_db
+from web import qr_signer, current_account, may_view_student, job_accepted, wants_job
+
+bp = Blueprint('qr', __name__)
+
+def load_student_qr(student_id):
+    """Look up a student and return (student profile, QR PNG bytes, key, token)"""
+    student = student_cache.get_profile(student_id)
+    if not student:
+        return None, None, None, None
+    
+    token = qr_signer.sign(student_id)
+    png, key = qr_cache.get_qr(student_id, token)
+    return student, png, key, token
+
+def qr_access_denied(student_id):
+    """Error response unless the student or a teacher is logged in; QR codes carry signed tokens"""
+    session_account = current_account()
+    if not session_account:
+        return jsonify({'error': 'Invalid or expired session'}), 401
+    if not may_view_student(session_account, student_id):
+        return jsonify({'error': "Not allowed to view this student's QR code"}), 403
+    return None
+
+def qr_response_etag(token, student):
+    """ETag for generate_qr, covering the token and the student details shown with it"""
+    return qr_cache.payload_key(json.dumps([token, *student]))
+
+def qr_response_body(student_id, student, qr_base64, token):
+    """JSON for generate_qr; windowed codes say when to fetch a fresh one"""
+    return {
+        'student_id': student_id,
+        'name': student[0],
+        'qr_image': f"data:image/png;base64,{qr_base64}",
+        'qr_url': f"/qr/{student_id}.png",
+        'qr_expires_at': qr_signer.expires_at(token),
+        'qr_data': {
+            'student_id': student_id,
+            'name': student[0],
+            'class': student[1],
+            'section': student[2],
+            'roll_no': student[3]
+        }
+    }
+
+@bp.route('/generate_qr/<student_id>', methods=['GET'])
+def generate_qr(student_id):
+    """Generate QR code for a student"""
+    try:
+        denied = qr_access_denied(student_id)
+        if denied:
+            return denied
+        
+        student, png, _, token = load_student_qr(student_id)
+        
+        if not student:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        etag = qr_response_etag(token, student)
+        if request.if_none_match.contains(etag):
+            return '', 304
+        
+        # Convert the cached PNG to base64 for frontend display
+        qr_base64 = base64.b64encode(png).decode()
+        
+        response = jsonify(qr_response_body(student_id, student, qr_base64, token))
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
+    
+    except Exception as e:
+        logging.error(f"Error generating QR code: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/qr/<student_id>.png', methods=['GET'])
+def qr_image(student_id):
+    """Serve a student's QR code as a PNG with ETag revalidation (?token= for <img> tags)"""
+    try:
+        denied = qr_access_denied(student_id)
+        if denied:
+            return denied
+        
+        student, png, key, _ = load_student_qr(student_id)
+        
+        if not student:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        response = send_file(io.BytesIO(png), mimetype='image/png', etag=key, conditional=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    except Exception as e:
+        logging.error(f"Error serving QR image: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Students rendered between progress updates in a bulk QR job
+QR_JOB_BATCH = 200
+
+def class_students(class_name, section, teacher_id=None):
+    """Students of a class and section in sheet order, as (id, name, class, section, roll_no)"""
+    cursor = get_db().cursor()
+    query = 'SELECT student_id, name, class, section, roll_no FROM students WHERE class = ? AND section = ?'
+    params = [class_name, section]
+    if teacher_id:
+        query += ' AND teacher_id = ?'
+        params.append(teacher_id)
+    cursor.execute(query + ' ORDER BY roll_no, name', params)
+    return cursor.fetchall()
+
+def printed_qr_images(students):
+    """PNGs of printed codes, which never expire; cache misses render across the process pool"""
+    return qr_cache.get_many([(s[0], qr_signer.sign(s[0], windowed=False)) for s in students])
+
+def build_qr_bundle(output, students, images):
+    """Pack rendered codes into a zip or printable PDF sheet; returns (buffer, mimetype)"""
+    if output == 'pdf':
+        labels = [f"{s[1]} ({s[4]})" for s in students]
+        return qr_cache.build_pdf_sheet(list(zip(labels, images))), 'application/pdf'
+    filenames = [secure_filename(f"{s[4]}_{s[1]}_{s[0]}.png") for s in students]
+    return qr_cache.build_zip(list(zip(filenames, images))), 'application/zip'
+
+@jobs.handler('qr_bulk')
+def run_qr_bulk_job(job):
+    """Render a class's QR codes in batches and save the zip or PDF"""
+    params = job.params
+    students = class_students(params['class'], params['section'], params.get('teacher_id'))
+    if not students:
+        raise ValueError('No students found for this class and section')
+    
+    images = []
+    for start in range(0, len(students), QR_JOB_BATCH):
+        images.extend(printed_qr_images(students[start:start + QR_JOB_BATCH]))
+        job.progress(len(images), len(students))
+    
+    buffer, mimetype = build_qr_bundle(params['format'], students, images)
+    with open(job.output_path(params['filename']), 'wb') as f:
+        f.write(buffer.getbuffer())
+    return {'filename': params['filename'], 'mimetype': mimetype, 'students': len(students)}
+
+@bp.route('/generate_qr_bulk/<class_name>/<section>', methods=['GET'])
+def generate_qr_bulk(class_name, section):
+    """Generate QR codes for a whole class as a zip or printable PDF sheet (?async=1 for a job)"""
+    try:
+        session_account = current_account()
+        if not session_account:
+            return jsonify({'error': 'Invalid or expired session'}), 401
+        if session_account['role'] != 'teacher':
+            return jsonify({'error': 'Only teachers can print QR codes'}), 403
+        
+        output = request.args.get('format', 'zip')
+        teacher_id = request.args.get('teacher_id')
+        
+        if output not in ('zip', 'pdf'):
+            return jsonify({'error': 'Format must be zip or pdf'}), 400
+        
+        download_name = secure_filename(f"qr_{class_name}_{section}.{output}")
+        if wants_job():
+            return job_accepted(jobs.enqueue('qr_bulk', {
+                'class': class_name, 'section': section, 'teacher_id': teacher_id,
+                'format': output, 'filename': download_name
+            }))
+        
+        students = class_students(class_name, section, teacher_id)
+        if not students:
+            return jsonify({'error': 'No students found for this class and section'}), 404
+        
+        buffer, mimetype = build_qr_bundle(output, students, printed_qr_images(students))
+        return send_file(buffer, mimetype=mimetype, as_attachment=True, download_name=download_name)
+    
+    except Exception as e:
+        logging.error(f"Error generating bulk QR codes: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
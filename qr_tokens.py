@@ -0,0 +1,126 @@
+"""Compact signed tokens encoded in student QR codes.
+
+A token is ``<kind>:<key id>:<student id>:<issued>:<mac>``, for example
+``P:0:K7Q2M9XA:T3BQ00:7LZQ4D2N5XW3K6JA``. The issue time is Unix seconds in
+base 36 and the MAC is a truncated HMAC-SHA256 in base 32. Every character
+is in the QR alphanumeric set, so the code needs a much smaller QR version
+than the old JSON payload.
+
+Two kinds exist:
+
+* ``P`` (printed) codes never expire. Their issue time is the start of the
+  UTC day, so a student's code, and its cached PNG, only change once a day.
+* ``W`` (windowed) codes are issued for the current QR_TOKEN_WINDOW_SECONDS
+  window and stop verifying one window after it ends. A screenshot is then
+  only good for as long as the code was on screen. ``generate_qr`` hands
+  these out when the window is set.
+
+Keys rotate through QR_SIGNING_KEYS (``id:secret,id:secret``). The first
+key signs, and the rest still verify until they are removed. Verifying is
+pure computation, so forged or expired codes are rejected without touching
+the database.
+"""
+import os
+import re
+import time
+import hmac
+import base64
+import hashlib
+
+TOKEN_KINDS = ('P', 'W')
+
+# Seconds a windowed code stays valid; 0 issues printed codes only
+QR_TOKEN_WINDOW_SECONDS = int(os.environ.get('QR_TOKEN_WINDOW_SECONDS', 0))
+
+# Tolerance for scanner and server clocks disagreeing
+MAX_CLOCK_SKEW_SECONDS = 30
+
+MAC_BYTES = 10
+PRINTED_GRANULARITY = 24 * 3600
+KEY_ID_PATTERN = re.compile(r'^[0-9A-Z]{1,4}$')
+BASE36_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class InvalidQRToken(ValueError):
+    """Raised when a scanned token is malformed, forged, revoked or expired"""
+
+
+def to_base36(value):
+    digits = ''
+    while True:
+        value, digit = divmod(value, 36)
+        digits = BASE36_DIGITS[digit] + digits
+        if not value:
+            return digits
+
+
+def parse_keys(spec):
+    """Parse ``id:secret,id:secret`` into an ordered {id: key bytes} dict"""
+    keys = {}
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        key_id, _, secret = entry.partition(':')
+        if not KEY_ID_PATTERN.match(key_id) or not secret:
+            raise ValueError(f'Invalid QR signing key entry {key_id!r}: expected <ID>:<secret> '
+                             f'with an ID of 1-4 uppercase letters or digits')
+        keys[key_id] = secret.encode()
+    return keys
+
+
+class Signer:
+    def __init__(self, keys, window_seconds=QR_TOKEN_WINDOW_SECONDS):
+        if not keys:
+            raise ValueError('At least one QR signing key is required')
+        self.keys = dict(keys)
+        self.current_key_id = next(iter(self.keys))
+        self.window_seconds = window_seconds
+
+    @classmethod
+    def from_env(cls, secret_key):
+        """Keys from QR_SIGNING_KEYS, or one derived from the app's secret key"""
+        spec = os.environ.get('QR_SIGNING_KEYS')
+        if spec:
+            return cls(parse_keys(spec))
+        derived = hmac.new(secret_key.encode(), b'qr-token', hashlib.sha256).digest()
+        return cls({'0': derived})
+
+    def _mac(self, key_id, message):
+        digest = hmac.new(self.keys[key_id], message.encode(), hashlib.sha256).digest()
+        return base64.b32encode(digest[:MAC_BYTES]).decode().rstrip('=')
+
+    def sign(self, student_id, now=None, windowed=None):
+        """Token for a student; windowed defaults to whether a window is configured"""
+        now = int(time.time() if now is None else now)
+        if windowed is None:
+            windowed = self.window_seconds > 0
+        if windowed:
+            kind, issued = 'W', now - now % self.window_seconds
+        else:
+            kind, issued = 'P', now - now % PRINTED_GRANULARITY
+        message = f'{kind}:{self.current_key_id}:{student_id}:{to_base36(issued)}'
+        return f'{message}:{self._mac(self.current_key_id, message)}'
+
+    def expires_at(self, token):
+        """Unix time a windowed token stops being shown, or None for printed codes"""
+        kind, _, _, issued, _ = token.split(':')
+        return int(issued, 36) + self.window_seconds if kind == 'W' else None
+
+    def verify(self, token, now=None):
+        """Return the student ID in a valid token, raising InvalidQRToken otherwise"""
+        parts = token.split(':') if isinstance(token, str) else []
+        if len(parts) != 5 or parts[0] not in TOKEN_KINDS:
+            raise InvalidQRToken('Unrecognised QR code')
+        kind, key_id, student_id, issued, mac = parts
+        if key_id not in self.keys:
+            raise InvalidQRToken('QR code was signed with a retired key')
+        if not hmac.compare_digest(mac, self._mac(key_id, token.rsplit(':', 1)[0])):
+            raise InvalidQRToken('QR code signature is invalid')
+
+        now = time.time() if now is None else now
+        issued = int(issued, 36)
+        if issued > now + MAX_CLOCK_SKEW_SECONDS:
+            raise InvalidQRToken('QR code is not valid yet')
+        if kind == 'W':
+            # Valid for its own window plus one more, for codes shown just before rollover
+            if not self.window_seconds or now > issued + 2 * self.window_seconds + MAX_CLOCK_SKEW_SECONDS:
+                raise InvalidQRToken('QR code has expired')
+        return student_id
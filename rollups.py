@@ -0,0 +1,108 @@
+"""The attendance rollup table and the reports served from it.
+
+``class_daily`` holds present students per class/section per day. It is
+kept current by triggers on ``attendance`` (see migrations), so every insert
+path updates it in the same transaction. ``rebuild()`` recomputes it from
+raw attendance.
+
+Reports count only school days: they join the school-day index of the
+class's calendar (see school_calendar), so weekends, holidays and days a
+class has no lessons neither dilute percentages nor show up as periods.
+Student reports read a student's present marks on those days straight from
+``attendance`` (a year is a few hundred index lookups); a per-month rollup
+could not tell a holiday's marks from a school day's.
+"""
+from datetime import date
+
+from db import get_db
+from school_calendar import CALENDAR_OF
+
+
+def rebuild(cursor):
+    """Recompute class_daily from the raw attendance rows"""
+    cursor.execute('DELETE FROM class_daily')
+    cursor.execute('''
+        INSERT INTO class_daily (class, section, date, present)
+        SELECT s.class, s.section, a.date, COUNT(*)
+        FROM attendance a JOIN students s ON s.student_id = a.student_id
+        WHERE a.status = 'present'
+        GROUP BY s.class, s.section, a.date
+    ''')
+
+
+def percentage(present, possible):
+    return round(present * 100.0 / possible, 1) if possible else None
+
+
+def class_report(class_name, section, start, end, granularity='daily'):
+    """Attendance for a class/section on its school days between two dates, from class_daily"""
+    cursor = get_db().cursor()
+    cursor.execute('SELECT COUNT(*) FROM students WHERE class = ? AND section = ?', (class_name, section))
+    enrolled = cursor.fetchone()[0]
+
+    end = min(end, date.today())
+    # Every school day of the class's calendar, present or not
+    days = f'''
+        WITH calendar AS ({CALENDAR_OF})
+        SELECT d.date, COALESCE(c.present, 0) AS present FROM calendar k
+        JOIN school_days d ON d.class = k.class AND d.section = k.section
+        LEFT JOIN class_daily c ON c.class = ? AND c.section = ? AND c.date = d.date
+        WHERE d.date BETWEEN ? AND ?
+    '''
+    params = (class_name, section, class_name, section, start.isoformat(), end.isoformat())
+    if granularity == 'monthly':
+        cursor.execute(f'''
+            SELECT substr(date, 1, 7), COUNT(*), SUM(present) FROM ({days})
+            GROUP BY substr(date, 1, 7) ORDER BY 1
+        ''', params)
+        periods = [{'month': month, 'school_days': school_days, 'present': present,
+                    'percentage': percentage(present, enrolled * school_days)}
+                   for month, school_days, present in cursor.fetchall()]
+        school_days = sum(p['school_days'] for p in periods)
+    else:
+        cursor.execute(f'{days} ORDER BY d.date', params)
+        periods = [{'date': day, 'present': present, 'percentage': percentage(present, enrolled)}
+                   for day, present in cursor.fetchall()]
+        school_days = len(periods)
+
+    total_present = sum(p['present'] for p in periods)
+    return {
+        'class': class_name,
+        'section': section,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'enrolled': enrolled,
+        'school_days': school_days,
+        'present': total_present,
+        'percentage': percentage(total_present, enrolled * school_days),
+        granularity: periods
+    }
+
+
+def student_report(student_id, class_name, section, start, end):
+    """Monthly attendance for a student on the school days of their class's calendar"""
+    cursor = get_db().cursor()
+    end = min(end, date.today())
+    cursor.execute(f'''
+        WITH calendar AS ({CALENDAR_OF})
+        SELECT substr(d.date, 1, 7), COUNT(*), COUNT(a.date) FROM calendar k
+        JOIN school_days d ON d.class = k.class AND d.section = k.section
+        LEFT JOIN attendance a ON a.student_id = ? AND a.date = d.date AND a.status = 'present'
+        WHERE d.date BETWEEN ? AND ?
+        GROUP BY substr(d.date, 1, 7) ORDER BY 1
+    ''', (class_name, section, student_id, start.isoformat(), end.isoformat()))
+    months = [{'month': month, 'present': present, 'school_days': school_days,
+               'percentage': percentage(present, school_days)}
+              for month, school_days, present in cursor.fetchall()]
+
+    total_present = sum(m['present'] for m in months)
+    total_days = sum(m['school_days'] for m in months)
+    return {
+        'student_id': student_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'present': total_present,
+        'school_days': total_days,
+        'percentage': percentage(total_present, total_days),
+        'monthly': months
+    }
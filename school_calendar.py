@@ -0,0 +1,232 @@
+"""School calendar: working days, holidays and per-class schedules, and the school-day index.
+
+A calendar is a row in ``calendars``: the school's own ('', ''), and
+optionally one for a class (class, '') or a single class/section. Its
+``weekmask`` holds seven 0/1 flags, Monday first; NULL keeps the working
+days of the wider calendar. A holiday applies to the calendar it names and
+every narrower one, so a class/section is off on the school's holidays, its
+class's and its own. A class/section follows the most specific calendar
+that exists (``CALENDAR_OF``).
+
+``school_days`` lists every school day of every calendar, numbered
+consecutively per calendar (``day_no``), from the first day with attendance
+(or the start of last year, if earlier) to the end of the year
+CALENDAR_YEARS_AHEAD years from now. Reports join it
+in SQL instead of generating dates in Python, so weekends, holidays and a
+class's own schedule are left out of every percentage. The index is rebuilt
+in the same transaction as any calendar change, which also bumps
+``school_day_index.version``; startup extends it as the years pass
+(``ensure_horizon()``), and a report over earlier dates extends it back to
+its start, at most CALENDAR_YEARS_BACK years (``ensure_covers()``).
+"""
+import os
+from datetime import date, timedelta
+
+from db import get_db, transaction
+
+# How far past the current year the index runs
+CALENDAR_YEARS_AHEAD = int(os.environ.get('CALENDAR_YEARS_AHEAD', 1))
+# How far before the current year reports may reach; every calendar change
+# regenerates all of it
+CALENDAR_YEARS_BACK = int(os.environ.get('CALENDAR_YEARS_BACK', 10))
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+SCHOOL = ('', '')
+
+# The calendar a class/section keeps, from (class, section) parameters: its
+# own, else its class's, else the school's
+CALENDAR_OF = '''
+    SELECT class, section FROM calendars
+    WHERE class IN (?, '') AND section IN (?, '')
+    ORDER BY class DESC, section DESC LIMIT 1
+'''
+
+
+class CalendarError(ValueError):
+    """A calendar change that makes no sense, e.g. a school with no working days"""
+
+
+def weekmask(weekdays):
+    """'1111100' from ['mon', ..., 'fri']"""
+    unknown = [day for day in weekdays if day not in WEEKDAYS]
+    if unknown:
+        raise CalendarError(f'Unknown weekdays: {unknown}')
+    if not weekdays:
+        raise CalendarError('A schedule needs at least one working day')
+    return ''.join('1' if day in weekdays else '0' for day in WEEKDAYS)
+
+
+def scopes(class_name, section):
+    """The calendars a class/section inherits from, widest first"""
+    if not class_name:
+        return [SCHOOL]
+    if not section:
+        return [SCHOOL, (class_name, '')]
+    return [SCHOOL, (class_name, ''), (class_name, section)]
+
+
+def working_days(masks, calendar):
+    """A calendar's weekmask, inherited from the narrowest scope that sets one"""
+    return next(masks[scope] for scope in reversed(scopes(*calendar)) if masks.get(scope))
+
+
+def check_scope(class_name, section):
+    if section and not class_name:
+        raise CalendarError('A section needs its class')
+
+
+def horizon(today=None):
+    today = today or date.today()
+    return date(today.year + CALENDAR_YEARS_AHEAD, 12, 31)
+
+
+def calendar_of(cursor, class_name, section):
+    cursor.execute(CALENDAR_OF, (class_name, section))
+    return cursor.fetchone()
+
+
+def index_version(cursor):
+    """Bumped by every rebuild; part of any cache key built from school days"""
+    cursor.execute('SELECT version FROM school_day_index')
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def rebuild(cursor, first=None):
+    """Regenerate every calendar's school days, from first or where the index starts"""
+    # A class calendar with no schedule or holidays of its own adds nothing
+    cursor.execute('''
+        DELETE FROM calendars WHERE weekmask IS NULL AND NOT EXISTS (
+            SELECT 1 FROM holidays h WHERE h.class = calendars.class AND h.section = calendars.section
+        )
+    ''')
+    cursor.execute('SELECT first FROM school_day_index')
+    row = cursor.fetchone()
+    start = row[0] if row else None
+    if start is None:
+        cursor.execute('SELECT MIN(date) FROM attendance')
+        start = cursor.fetchone()[0]
+    # Never later than the start of last year, so recent reports and
+    # backdated offline scans in a new school are covered too
+    first = min([date.fromisoformat(day) for day in (first, start) if day]
+                + [date(date.today().year - 1, 1, 1)])
+    last = horizon()
+
+    cursor.execute('SELECT class, section, weekmask FROM calendars')
+    masks = {(class_name, section): mask for class_name, section, mask in cursor.fetchall()}
+    cursor.execute('SELECT class, section, date FROM holidays WHERE date BETWEEN ? AND ?',
+                   (first.isoformat(), last.isoformat()))
+    holidays = {}
+    for class_name, section, day in cursor.fetchall():
+        holidays.setdefault((class_name, section), set()).add(day)
+
+    rows = []
+    for key in masks:
+        inherited = scopes(*key)
+        mask = working_days(masks, key)
+        off = set().union(*(holidays.get(scope, ()) for scope in inherited))
+        day, day_no = first, 0
+        while day <= last:
+            if mask[day.weekday()] == '1' and day.isoformat() not in off:
+                day_no += 1
+                rows.append((key[0], key[1], day.isoformat(), day_no))
+            day += timedelta(days=1)
+
+    cursor.execute('DELETE FROM school_days')
+    cursor.executemany('INSERT INTO school_days (class, section, date, day_no) VALUES (?, ?, ?, ?)', rows)
+    cursor.execute('''
+        INSERT INTO school_day_index (id, first, last, version) VALUES (1, ?, ?, 1)
+        ON CONFLICT (id) DO UPDATE SET first = excluded.first, last = excluded.last, version = version + 1
+    ''', (first.isoformat(), last.isoformat()))
+    return len(rows)
+
+
+def ensure_horizon():
+    """Extend the current school's index once the years have caught up with it"""
+    cursor = get_db().cursor()
+    cursor.execute('SELECT last FROM school_day_index')
+    row = cursor.fetchone()
+    if row is None or row[0] < horizon().isoformat():
+        with transaction() as cursor:
+            rebuild(cursor)
+
+
+def ensure_covers(start, end):
+    """Extend the current school's index to cover start..end, or raise CalendarError"""
+    earliest = date(date.today().year - CALENDAR_YEARS_BACK, 1, 1)
+    if start < earliest or end > horizon():
+        raise CalendarError(f'school days are only known from {earliest} to {horizon()}')
+    cursor = get_db().cursor()
+    cursor.execute('SELECT first, last FROM school_day_index')
+    row = cursor.fetchone()
+    if row is None or start.isoformat() < row[0] or end.isoformat() > row[1]:
+        with transaction() as cursor:
+            rebuild(cursor, start.isoformat())
+
+
+def set_schedule(cursor, class_name, section, weekdays):
+    """Set a calendar's working days; None makes a class follow the wider calendar again"""
+    check_scope(class_name, section)
+    if weekdays is None and not class_name:
+        raise CalendarError('The school calendar needs its working days')
+    mask = None if weekdays is None else weekmask(weekdays)
+    cursor.execute('''
+        INSERT INTO calendars (class, section, weekmask) VALUES (?, ?, ?)
+        ON CONFLICT (class, section) DO UPDATE SET weekmask = excluded.weekmask
+    ''', (class_name, section, mask))
+    rebuild(cursor)
+
+
+def add_holidays(cursor, class_name, section, start, end, name):
+    """Mark every day from start to end off for a calendar; returns the days added"""
+    check_scope(class_name, section)
+    cursor.execute('INSERT OR IGNORE INTO calendars (class, section, weekmask) VALUES (?, ?, NULL)',
+                   (class_name, section))
+    days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    cursor.executemany('''
+        INSERT INTO holidays (class, section, date, name) VALUES (?, ?, ?, ?)
+        ON CONFLICT (class, section, date) DO UPDATE SET name = excluded.name
+    ''', [(class_name, section, day, name) for day in days])
+    rebuild(cursor)
+    return len(days)
+
+
+def remove_holidays(cursor, class_name, section, start, end):
+    """Drop a calendar's holidays from start to end; returns how many there were"""
+    check_scope(class_name, section)
+    cursor.execute('DELETE FROM holidays WHERE class = ? AND section = ? AND date BETWEEN ? AND ?',
+                   (class_name, section, start.isoformat(), end.isoformat()))
+    removed = cursor.rowcount
+    if removed:
+        rebuild(cursor)
+    return removed
+
+
+def describe(cursor, class_name, section, start, end):
+    """A class/section's calendar between two dates: working days, holidays and school days"""
+    calendar = calendar_of(cursor, class_name, section)
+    cursor.execute('SELECT class, section, weekmask FROM calendars')
+    mask = working_days({(c, s): m for c, s, m in cursor.fetchall()}, calendar)
+
+    inherited = scopes(*calendar)
+    placeholders = ' OR '.join('(class = ? AND section = ?)' for _ in inherited)
+    cursor.execute(f'''
+        SELECT date, name, class, section FROM holidays
+        WHERE ({placeholders}) AND date BETWEEN ? AND ? ORDER BY date
+    ''', [value for scope in inherited for value in scope] + [start.isoformat(), end.isoformat()])
+    holidays = [{'date': day, 'name': name, 'class': c, 'section': s}
+                for day, name, c, s in cursor.fetchall()]
+
+    cursor.execute('''
+        SELECT COUNT(*) FROM school_days WHERE class = ? AND section = ? AND date BETWEEN ? AND ?
+    ''', (calendar[0], calendar[1], start.isoformat(), end.isoformat()))
+    return {
+        'class': class_name,
+        'section': section,
+        'calendar': {'class': calendar[0], 'section': calendar[1]},
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'weekdays': [day for day, flag in zip(WEEKDAYS, mask) if flag == '1'],
+        'holidays': holidays,
+        'school_days': cursor.fetchone()[0],
+    }
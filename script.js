@@ -10,6 +10,14 @@ let authMode = 'login'; // 'login' or 'register'
 const isLocal = window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1';
 const API_BASE_URL = isLocal ? 'http://localhost:5000' : ' https://aa561eaedf47.ngrok-free.app';
 
+// Each school has its own link (index.html?school=<id>); remembered for later visits
+const SCHOOL_ID = new URLSearchParams(window.location.search).get('school') || localStorage.getItem('schoolId') || '';
+if (SCHOOL_ID) localStorage.setItem('schoolId', SCHOOL_ID);
+
+function schoolHeaders(headers) {
+    return SCHOOL_ID ? { ...headers, 'X-School': SCHOOL_ID } : headers;
+}
+
 // Initialize the application
 document.addEventListener('DOMContentLoaded', function() {
     initializeApp();
@@ -23,7 +31,7 @@ function initializeApp() {
     const savedUser = localStorage.getItem('currentUser');
     if (savedUser) {
         currentUser = JSON.parse(savedUser);
-        redirectToDashboard();
+        checkSession();
     } else {
         showLanding();
     }
@@ -104,7 +112,7 @@ function handleTeacherLogin(event) {
     showLoading();
     fetch(`${API_BASE_URL}/login`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: schoolHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({ email, password })
     })
     .then(res => res.json())
@@ -144,7 +152,7 @@ function handleTeacherRegister(event) {
     showLoading();
     fetch(`${API_BASE_URL}/register_teacher`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: schoolHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({ name, email, password })
     })
     .then(res => res.json())
@@ -179,7 +187,7 @@ function handleStudentLogin(event) {
     showLoading();
     fetch(`${API_BASE_URL}/login`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: schoolHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({ email, password })
     })
     .then(res => res.json())
@@ -213,6 +221,27 @@ function redirectToDashboard() {
     else if (currentUser.role === 'student') window.location.href = 'student_dashboard.html';
 }
 
+// Resume a saved login only while its session token is still valid
+function checkSession() {
+    if (!currentUser || !currentUser.token) {
+        clearUserData();
+        showLanding();
+        return;
+    }
+    fetch(`${API_BASE_URL}/session`, {
+        headers: { 'Authorization': `Bearer ${currentUser.token}` }
+    })
+    .then(res => {
+        if (res.status === 401) {
+            clearUserData();
+            showLanding();
+        } else {
+            redirectToDashboard();
+        }
+    })
+    .catch(() => redirectToDashboard());
+}
+
 function clearUserData() {
     currentUser = null;
     localStorage.removeItem('currentUser');
@@ -0,0 +1,28 @@
+"""Frontend pages and assets, and the /metrics endpoint; none of these use a school's database"""
+from flask import Blueprint, Response, jsonify
+
+import metrics
+import static_assets
+
+bp = Blueprint('site', __name__)
+
+@bp.route('/')
+def index():
+    """Serve the main page"""
+    response = static_assets.serve('index.html')
+    if response is None:
+        return jsonify({'error': 'Frontend files not found'}), 404
+    return response
+
+@bp.route('/<path:filename>')
+def serve_static(filename):
+    """Serve static files from the in-memory asset cache"""
+    response = static_assets.serve(filename)
+    if response is None:
+        return jsonify({'error': 'File not found'}), 404
+    return response
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request metrics for this worker in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
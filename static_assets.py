@@ -0,0 +1,168 @@
+"""In-memory static asset cache for the frontend files.
+
+Each file is read once and kept in memory together with precomputed gzip
+(and brotli, when the optional ``brotli`` package is installed) variants,
+an ETag and its Last-Modified time. Entries are revalidated against the
+file's mtime on every request, so edits show up without a restart.
+
+HTML pages are rewritten so local ``styles.css``/``script.js`` references
+carry a ``?v=<hash>`` fingerprint; fingerprinted URLs are served with a
+one-year immutable Cache-Control while the HTML itself is revalidated.
+"""
+import os
+import re
+import gzip
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+    '.webp': 'image/webp',
+}
+
+# Text formats worth compressing; images are already compressed
+COMPRESSIBLE = {'.html', '.css', '.js', '.svg'}
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+# Local href/src references in HTML that get a version fingerprint
+ASSET_REFERENCE = re.compile(r'''(\b(?:href|src)=")([\w./-]+\.(?:css|js|png|jpe?g|gif|svg|ico|webp))(")''')
+
+
+class Asset:
+    """A cached file body with its compressed variants and validators"""
+
+    def __init__(self, path, mtime, data, content_type, compress, dependencies=()):
+        self.path = path
+        self.mtime = mtime
+        self.data = data
+        self.content_type = content_type
+        self.version = hashlib.sha256(data).hexdigest()[:12]
+        self.etag = self.version
+        self.last_modified = datetime.fromtimestamp(mtime, timezone.utc)
+        self.dependencies = dependencies
+        self.encodings = {}
+        if compress and len(data) >= MIN_COMPRESS_SIZE:
+            self.encodings['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(data)
+
+
+class AssetCache:
+    def __init__(self, root=ROOT):
+        self.root = root
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, filename):
+        """Map a URL path to a servable file, or None"""
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if not path.startswith(self.root + os.sep):
+            return None
+        if os.path.splitext(path)[1].lower() not in CONTENT_TYPES:
+            return None
+        if any(part.startswith('.') for part in os.path.relpath(path, self.root).split(os.sep)):
+            return None
+        return path if os.path.isfile(path) else None
+
+    def get(self, filename):
+        """Return the current Asset for filename, reloading it if stale"""
+        path = self.resolve(filename)
+        if path is None:
+            return None
+
+        mtime = os.stat(path).st_mtime
+        asset = self._assets.get(path)
+        if asset is not None and asset.mtime == mtime and self._dependencies_fresh(asset):
+            return asset
+
+        asset = self._load(path, mtime)
+        with self._lock:
+            self._assets[path] = asset
+        return asset
+
+    def _dependencies_fresh(self, asset):
+        for filename, version in asset.dependencies:
+            dependency = self.get(filename)
+            if dependency is None or dependency.version != version:
+                return False
+        return True
+
+    def _load(self, path, mtime):
+        extension = os.path.splitext(path)[1].lower()
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        dependencies = []
+        if extension == '.html':
+            base = os.path.dirname(os.path.relpath(path, self.root))
+
+            def fingerprint(match):
+                reference = os.path.normpath(os.path.join(base, match.group(2)))
+                dependency = self.get(reference)
+                if dependency is None:
+                    return match.group(0)
+                dependencies.append((reference, dependency.version))
+                return f'{match.group(1)}{match.group(2)}?v={dependency.version}{match.group(3)}'
+
+            data = ASSET_REFERENCE.sub(fingerprint, data.decode('utf-8')).encode('utf-8')
+
+        return Asset(path, mtime, data, CONTENT_TYPES[extension],
+                     extension in COMPRESSIBLE, tuple(dependencies))
+
+    def clear(self):
+        with self._lock:
+            self._assets.clear()
+
+
+cache = AssetCache()
+
+
+def _choose_encoding(asset):
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.encodings and accepted[encoding]:
+            return encoding
+    return None
+
+
+def serve(filename):
+    """Build the response for a static file, or None if it isn't servable"""
+    asset = cache.get(filename)
+    if asset is None:
+        return None
+
+    # Byte ranges only make sense against the identity representation
+    encoding = None if request.range else _choose_encoding(asset)
+    body = asset.encodings[encoding] if encoding else asset.data
+
+    response = Response(body, content_type=asset.content_type)
+    response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+    response.last_modified = asset.last_modified
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+
+    fingerprinted = request.args.get('v') == asset.version
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE if fingerprinted else REVALIDATE_CACHE
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
@@ -0,0 +1,121 @@
+"""Email delivery and background job status, and the live event stream"""
+import os
+import logging
+import threading
+
+from flask import Blueprint, Response, request, jsonify, send_file
+
+import db
+import events
+import jobs
+from mailer import email_status, queue_summary
+from web import current_account
+
+bp = Blueprint('status', __name__)
+
+# Each open /events stream holds one of the worker's GUNICORN_THREADS for as
+# long as the dashboard stays open; past this many per worker new streams get
+# 503 and the dashboards retry after EVENT_STREAM_RETRY_SECONDS, so ordinary
+# requests always keep the rest of the threads
+MAX_EVENT_STREAMS = int(os.environ.get('MAX_EVENT_STREAMS', max(1, int(os.environ.get('GUNICORN_THREADS', 64)) // 2)))
+EVENT_STREAM_RETRY_SECONDS = 30
+
+_event_stream_slots = threading.BoundedSemaphore(MAX_EVENT_STREAMS)
+
+@bp.route('/email_status', methods=['GET'])
+def get_email_queue_summary():
+    """Get counts of queued emails by delivery status"""
+    try:
+        return jsonify({'email_queue': queue_summary()}), 200
+    
+    except Exception as e:
+        logging.error(f"Error getting email queue summary: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/email_status/<int:email_id>', methods=['GET'])
+def get_email_status(email_id):
+    """Get the delivery status of a queued email"""
+    try:
+        status = email_status(email_id)
+        if not status:
+            return jsonify({'error': 'Email not found'}), 404
+        
+        return jsonify(status), 200
+    
+    except Exception as e:
+        logging.error(f"Error getting email status: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/events', methods=['GET'])
+def event_stream():
+    """Stream attendance and roster events for the logged-in account (SSE)"""
+    session_account = current_account()
+    if not session_account:
+        return jsonify({'error': 'Invalid or expired session'}), 401
+    
+    if not _event_stream_slots.acquire(blocking=False):
+        return (jsonify({'error': 'Too many open event streams, please try again'}), 503,
+                {'Retry-After': str(EVENT_STREAM_RETRY_SECONDS)})
+    
+    try:
+        subscription = events.broker.subscribe(events.account_topics(session_account),
+                                               request.headers.get('Last-Event-ID'))
+    except BaseException:
+        _event_stream_slots.release()
+        raise
+    
+    def stream():
+        try:
+            yield events.stream_preamble()
+            while True:
+                batch = subscription.get()
+                if not batch:
+                    yield events.heartbeat()
+                for event in batch:
+                    yield event.encode()
+        finally:
+            subscription.close()
+            _event_stream_slots.release()
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and per-row results of a background job (?after=<seq> for the next page)"""
+    try:
+        limit = max(0, request.args.get('limit', jobs.MAX_ITEMS_PAGE, type=int))
+        status = jobs.job_status(job_id, request.args.get('after', 0, type=int), limit)
+        if not status:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        if status['status'] == 'done' and (status['result'] or {}).get('filename'):
+            status['download_url'] = f'/jobs/{job_id}/download'
+        return jsonify(status), 200
+    
+    except Exception as e:
+        logging.error(f"Error getting job status: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/jobs/<job_id>/download', methods=['GET'])
+def download_job_output(job_id):
+    """Download the file a finished export or bulk QR job produced"""
+    try:
+        status = jobs.job_status(job_id, limit=0)
+        if not status:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        result = status['result'] or {}
+        if status['status'] != 'done' or not result.get('filename'):
+            return jsonify({'error': 'Job has no file to download yet', 'status': status['status']}), 409
+        
+        path = os.path.join(jobs.output_dir(db.current_tenant(), job_id), result['filename'])
+        if not os.path.exists(path):
+            return jsonify({'error': 'Job output has expired'}), 410
+        
+        return send_file(os.path.abspath(path), mimetype=result['mimetype'], as_attachment=True,
+                         download_name=result['filename'])
+    
+    except Exception as e:
+        logging.error(f"Error downloading job output: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,186 @@
+"""Read-through cache of the student details scans, reports and QR codes show.
+
+``get_profile()`` answers from, in order:
+
+1. a per-process LRU of up to STUDENT_CACHE_SIZE profiles, each kept for
+   STUDENT_CACHE_TTL seconds
+2. an optional shared Redis (STUDENT_CACHE_URL, e.g. redis://localhost:6379/0)
+   so every gunicorn worker benefits from one worker's miss
+3. the school database, filling both layers on the way back
+
+Writes that change a student call ``invalidate()``, which drops the entry
+here and in Redis. Other workers' in-process copies can lag by up to the
+TTL, which is why it is short. Unknown students are never cached, so a
+student added in one worker is found by the others straight away.
+
+With the database on local disk a Redis round trip costs more than the
+indexed query it replaces, so the shared layer is off unless configured;
+it pays off when many workers would otherwise each miss on a slow disk.
+
+Lookups are counted by the layer that answered (``app_student_cache_lookups_total``
+in /metrics). Set STUDENT_CACHE_SIZE=0 to turn the cache off.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+import metrics
+from db import get_db, current_tenant
+
+STUDENT_CACHE_SIZE = int(os.environ.get('STUDENT_CACHE_SIZE', 10000))
+STUDENT_CACHE_TTL = float(os.environ.get('STUDENT_CACHE_TTL', 60))
+
+# Optional shared layer; entries there are dropped on write, so they live longer
+STUDENT_CACHE_URL = os.environ.get('STUDENT_CACHE_URL')
+STUDENT_CACHE_SHARED_TTL = int(os.environ.get('STUDENT_CACHE_SHARED_TTL', 3600))
+
+# After a Redis error, go straight to the database for this long
+SHARED_RETRY_SECONDS = 30
+
+PROFILE_QUERY = 'SELECT name, class, section, roll_no, teacher_id FROM students WHERE student_id = ?'
+
+StudentProfile = namedtuple('StudentProfile', ('name', 'class_name', 'section', 'roll_no', 'teacher_id'))
+
+
+class LocalCache:
+    """Thread-safe LRU with a per-entry time to live"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class SharedCache:
+    """Profiles in Redis, shared by every worker; errors fall back to the database"""
+
+    def __init__(self, url, ttl):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.ttl = ttl
+        self._down_until = 0.0
+
+    def _call(self, fn, *args):
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            return fn(*args)
+        except Exception as e:
+            logging.warning(f"Shared student cache unavailable, using the database: {e}")
+            self._down_until = time.monotonic() + SHARED_RETRY_SECONDS
+            return None
+
+    def get(self, key):
+        value = self._call(self.client.get, key)
+        return StudentProfile(*json.loads(value)) if value else None
+
+    def put(self, key, profile):
+        self._call(lambda: self.client.set(key, json.dumps(profile), ex=self.ttl))
+
+    def delete(self, keys):
+        if keys:
+            self._call(self.client.delete, *keys)
+
+
+local = LocalCache(STUDENT_CACHE_SIZE, STUDENT_CACHE_TTL)
+shared = SharedCache(STUDENT_CACHE_URL, STUDENT_CACHE_SHARED_TTL) if STUDENT_CACHE_URL and STUDENT_CACHE_SIZE else None
+
+
+def cache_key(student_id, tenant=None):
+    return f'student:{tenant or current_tenant()}:{student_id}'
+
+
+def cached(student_id):
+    """The profile from the in-process or shared layer, or None on a miss"""
+    if not STUDENT_CACHE_SIZE:
+        return None
+    key = cache_key(student_id)
+    profile = local.get(key)
+    if profile is not None:
+        metrics.student_cache_lookups.inc('local')
+        return profile
+    if shared is not None:
+        profile = shared.get(key)
+        if profile is not None:
+            metrics.student_cache_lookups.inc('shared')
+            local.put(key, profile)
+            return profile
+    return None
+
+
+def remember(student_id, row):
+    """Record a profile loaded from the database (row as PROFILE_QUERY returns it)"""
+    if row is None:
+        metrics.student_cache_lookups.inc('missing')
+        return None
+    metrics.student_cache_lookups.inc('database')
+    profile = StudentProfile(*row)
+    if STUDENT_CACHE_SIZE:
+        key = cache_key(student_id)
+        local.put(key, profile)
+        if shared is not None:
+            shared.put(key, profile)
+    return profile
+
+
+def get_profile(student_id):
+    """StudentProfile for a student in the current school, or None if there is none"""
+    profile = cached(student_id)
+    if profile is None:
+        cursor = get_db().cursor()
+        cursor.execute(PROFILE_QUERY, (student_id,))
+        profile = remember(student_id, cursor.fetchone())
+    return profile
+
+
+async def get_profile_async(pool, student_id):
+    """get_profile() for the ASGI app, loading misses through an aiosqlite pool"""
+    if shared is None:
+        profile = cached(student_id)
+    else:
+        # Redis calls block; keep them off the event loop
+        profile = await asyncio.to_thread(cached, student_id)
+    if profile is not None:
+        return profile
+    async with pool.read() as conn:
+        rows = await conn.execute_fetchall(PROFILE_QUERY, (student_id,))
+    if shared is None:
+        return remember(student_id, rows[0] if rows else None)
+    return await asyncio.to_thread(remember, student_id, rows[0] if rows else None)
+
+
+def invalidate(student_ids):
+    """Drop students from both layers after their details changed"""
+    keys = [cache_key(student_id) for student_id in student_ids]
+    local.delete(keys)
+    if shared is not None:
+        shared.delete(keys)
@@ -0,0 +1,297 @@
+"""Adding students (one at a time or from a sheet) and reading rosters"""
+import os
+import json
+import base64
+import hashlib
+import logging
+import secrets
+import sqlite3
+
+from flask import Blueprint, request, jsonify
+from werkzeug.utils import secure_filename
+
+import accounts
+import events
+import jobs
+import student_cache
+from db import get_db, transaction
+from student_import import import_students, count_rows, check_extension, InvalidSheetError
+from web import (generate_student_id, generate_password, send_email, account_email_body, job_accepted)
+
+bp = Blueprint('students', __name__)
+
+@bp.route('/add_student', methods=['POST'])
+def add_student():
+    """Add a single student"""
+    try:
+        data = request.get_json() or {}
+        name = data.get('name')
+        email = data.get('email')
+        class_name = data.get('class')
+        section = data.get('section')
+        roll_no = data.get('roll_no')
+        teacher_id = data.get('teacher_id')
+        
+        if not all([name, email, class_name, section, roll_no, teacher_id]):
+            return jsonify({'error': 'All fields are required'}), 400
+        
+        cursor = get_db().cursor()
+        
+        # Check if student already exists
+        cursor.execute('SELECT student_id FROM students WHERE email = ?', (email,))
+        if cursor.fetchone():
+            return jsonify({'error': 'Student with this email already exists'}), 400
+        
+        # Generate student ID and password
+        student_id = generate_student_id()
+        password = generate_password()
+        password_hash = accounts.hash_password(password)
+        
+        # Insert student
+        try:
+            with transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO students (student_id, name, email, password_hash, class, section, roll_no, teacher_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (student_id, name, email, password_hash, class_name, section, roll_no, teacher_id))
+        except sqlite3.IntegrityError:
+            return jsonify({'error': 'Student with this email already exists'}), 400
+        
+        # Unknown IDs are never cached, but drop any stale entry for a reused one
+        student_cache.invalidate([student_id])
+        
+        events.students_added(teacher_id, [{
+            'student_id': student_id, 'name': name, 'email': email,
+            'class': class_name, 'section': section, 'roll_no': roll_no
+        }])
+        
+        # Send email to student
+        email_body = account_email_body(name, student_id, password, class_name, section, roll_no)
+        email_id = send_email(email, "Your Student Account Details", email_body)
+        
+        return jsonify({
+            'message': 'Student added successfully',
+            'student_id': student_id,
+            'password': password,
+            'email_id': email_id
+        }), 201
+    
+    except Exception as e:
+        logging.error(f"Error adding student: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def sheet_upload_path(filename):
+    """Where an uploaded student sheet is kept until its import job finishes"""
+    return os.path.join('student_sheets', f"{secrets.token_hex(8)}_{secure_filename(filename or 'upload.xlsx')}")
+
+def queue_sheet_import(filepath, teacher_id):
+    """Queue an import job for a saved sheet; returns the job ID"""
+    return jobs.enqueue('import_students', {'upload': filepath, 'teacher_id': teacher_id})
+
+@jobs.handler('import_students')
+def run_import_job(job):
+    """Import a saved sheet chunk by chunk, resuming after the last checkpoint"""
+    filepath = job.params['upload']
+    teacher_id = job.params['teacher_id']
+    checkpoint = job.checkpoint or {'row': 0, 'added': 0, 'errors': 0}
+    
+    def on_chunk(added, errors, rows_done):
+        # Runs in the chunk's insert transaction, so the queued emails, results
+        # and checkpoint commit together with the students. Passwords only go
+        # out in the emails, whose bodies are cleared once sent; the results
+        # are kept for JOB_RETENTION_SECONDS and never hold them
+        items = []
+        for student in added:
+            email_body = account_email_body(student['name'], student['student_id'], student['password'],
+                                            student['class'], student['section'], student['roll_no'])
+            email_id = send_email(student['email'], "Your Student Account Details", email_body)
+            items.append((True, {'row': student['row'], 'student_id': student['student_id'], 'name': student['name'],
+                                 'email': student['email'], 'email_id': email_id}))
+        items.extend((False, {'error': message}) for message in errors)
+        checkpoint.update(row=rows_done, added=checkpoint['added'] + len(added),
+                          errors=checkpoint['errors'] + len(errors))
+        job.progress(rows_done, total, dict(checkpoint), items)
+        
+        student_cache.invalidate([student['student_id'] for student in added])
+        events.students_added(teacher_id, [
+            {key: student[key] for key in ('student_id', 'name', 'email', 'class', 'section', 'roll_no')}
+            for student in added
+        ])
+    
+    try:
+        total = count_rows(filepath)
+        result = import_students(filepath, teacher_id, generate_student_id, generate_password,
+                                 checkpoint['row'], on_chunk)
+    finally:
+        # Only reached once the job is over; a crashed worker leaves the sheet
+        # for the retry, and jobs.py removes it if the job is never resumed
+        jobs.remove_upload(job.params)
+    
+    return {
+        'message': f"Added {checkpoint['added']} students successfully",
+        'added': checkpoint['added'],
+        'errors': checkpoint['errors'],
+        'timings': result['timings']
+    }
+
+@bp.route('/add_students_excel', methods=['POST'])
+def add_students_excel():
+    """Queue an import of students from an Excel or CSV file; poll /jobs/<id> for the results"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        teacher_id = request.form.get('teacher_id')
+        
+        if not teacher_id:
+            return jsonify({'error': 'Teacher ID is required'}), 400
+        
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        try:
+            check_extension(file.filename)
+        except InvalidSheetError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Save the upload for the job; parsing, hashing and inserts happen in the background
+        filepath = sheet_upload_path(file.filename)
+        file.save(filepath)
+        
+        return job_accepted(queue_sheet_import(filepath, teacher_id))
+    
+    except Exception as e:
+        logging.error(f"Error adding students from Excel: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Columns get_students can return, in response order
+STUDENT_FIELDS = ('student_id', 'name', 'email', 'class', 'section', 'roll_no', 'created_at')
+MAX_PAGE_SIZE = 500
+
+def encode_page_cursor(name, student_id):
+    """Opaque keyset cursor pointing after (name, student_id)"""
+    return base64.urlsafe_b64encode(json.dumps([name, student_id]).encode()).decode()
+
+def decode_page_cursor(value):
+    name, student_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+    return str(name), str(student_id)
+
+def roster_version(cursor, teacher_id):
+    """Current roster version for a teacher (bumped by triggers)"""
+    cursor.execute('SELECT version FROM roster_versions WHERE teacher_id = ?', (teacher_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+@bp.route('/get_students/<int:teacher_id>', methods=['GET'])
+def get_students(teacher_id):
+    """Get a teacher's students with optional filters, projection and keyset paging"""
+    try:
+        fields = request.args.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(STUDENT_FIELDS)
+        unknown = [f for f in fields if f not in STUDENT_FIELDS]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {unknown}'}), 400
+        
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({'error': f'Limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+        
+        cursor = get_db().cursor()
+        
+        # The roster version plus the query string identify the response
+        version = roster_version(cursor, teacher_id)
+        query_key = hashlib.sha1(request.query_string).hexdigest()[:12]
+        etag = f"roster-{teacher_id}-{version}-{query_key}"
+        if request.if_none_match.contains(etag):
+            return '', 304
+        
+        query = 'SELECT student_id, name, email, class, section, roll_no, created_at FROM students WHERE teacher_id = ?'
+        params = [teacher_id]
+        for column in ('class', 'section'):
+            if request.args.get(column):
+                query += f' AND {column} = ?'
+                params.append(request.args[column])
+        name_prefix = request.args.get('name_prefix')
+        if name_prefix:
+            # A range keeps the (teacher_id, name) index usable, unlike LIKE
+            query += ' AND name >= ? AND name < ?'
+            params += [name_prefix, name_prefix + '\U0010ffff']
+        after = request.args.get('cursor')
+        if after:
+            try:
+                after_name, after_id = decode_page_cursor(after)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query += ' AND (name > ? OR (name = ? AND student_id > ?))'
+            params += [after_name, after_name, after_id]
+        query += ' ORDER BY name, student_id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit + 1)
+        
+        cursor.execute(query, params)
+        students = cursor.fetchall()
+        
+        next_cursor = None
+        if limit and len(students) > limit:
+            students = students[:limit]
+            next_cursor = encode_page_cursor(students[-1][1], students[-1][0])
+        
+        indexes = [STUDENT_FIELDS.index(f) for f in fields]
+        student_list = [{field: student[i] for field, i in zip(fields, indexes)} for student in students]
+        
+        response = jsonify({
+            'students': student_list,
+            'next_cursor': next_cursor,
+            'roster_version': version
+        })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
+    
+    except Exception as e:
+        logging.error(f"Error getting students: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/sync/roster/<int:teacher_id>', methods=['GET'])
+def sync_roster(teacher_id):
+    """Students changed or removed since a roster version, or the full roster"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        cursor = get_db().cursor()
+        
+        # Read the version first: anything changed after it is sent again next time
+        version = roster_version(cursor, teacher_id)
+        columns = ', '.join(f's.{field}' for field in STUDENT_FIELDS)
+        # A version from before a reset (or another school) can't be diffed against
+        full = since <= 0 or since > version
+        if full:
+            cursor.execute(f'SELECT {columns} FROM students s WHERE s.teacher_id = ? ORDER BY s.name, s.student_id',
+                           (teacher_id,))
+            students, removed = cursor.fetchall(), []
+        else:
+            cursor.execute(f'''
+                SELECT {columns} FROM roster_changes c
+                JOIN students s ON s.student_id = c.student_id AND s.teacher_id = c.teacher_id
+                WHERE c.teacher_id = ? AND c.version > ? AND c.deleted = 0
+            ''', (teacher_id, since))
+            students = cursor.fetchall()
+            cursor.execute('''
+                SELECT student_id FROM roster_changes
+                WHERE teacher_id = ? AND version > ? AND deleted = 1
+            ''', (teacher_id, since))
+            removed = [row[0] for row in cursor.fetchall()]
+        
+        response = jsonify({
+            'roster_version': version,
+            'full': full,
+            'students': [dict(zip(STUDENT_FIELDS, student)) for student in students],
+            'removed': removed
+        })
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
+    
+    except Exception as e:
+        logging.error(f"Error syncing roster: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,86 @@
+"""Fixtures shared by the tests: a fresh school database per test and a Flask test client.
+
+The app is imported once, with its mail dispatcher and job runner switched
+off (tests drive them directly) and the cheapest password hash, against a
+throwaway database. Each test then gets its own empty, migrated school.db
+in a temporary directory, which is also the working directory so QR codes,
+uploads and job files land there.
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+os.environ.setdefault('MAIL_DISPATCHER', 'external')
+os.environ.setdefault('JOB_RUNNER', 'external')
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(prefix='school-tests-'), 'school.db'))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+import accounts
+import db
+import student_cache
+from app import app as flask_app
+from db import transaction
+
+PASSWORD = 'password'
+
+
+@pytest.fixture
+def school(tmp_path, monkeypatch):
+    """Point the default school at an empty database in a temporary working directory"""
+    monkeypatch.chdir(tmp_path)
+    for directory in ('qr_codes', 'student_sheets'):
+        os.makedirs(directory)
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'school.db'))
+    # Cached profiles would otherwise carry over between tests
+    monkeypatch.setattr(student_cache, 'local', student_cache.LocalCache(1000, 60))
+    return tmp_path
+
+
+@pytest.fixture
+def client(school):
+    return flask_app.test_client()
+
+
+def add_teacher(name='Teacher 1A', email='teacher1a@example.com'):
+    """Insert a teacher and return their ID"""
+    with transaction() as cursor:
+        cursor.execute('INSERT INTO teachers (name, email, password_hash) VALUES (?, ?, ?)',
+                       (name, email, accounts.hash_password(PASSWORD)))
+        return cursor.lastrowid
+
+
+def add_student(student_id, teacher_id, class_name='1', section='A', enrolled=None):
+    """Insert a student of a teacher's class, enrolled on a date (today by default)"""
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT INTO students (student_id, name, email, password_hash, class, section, roll_no,
+                                  teacher_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (student_id, f'Student {student_id}', f'{student_id.lower()}@example.com',
+              accounts.hash_password(PASSWORD), class_name, section, student_id[-2:], teacher_id,
+              (enrolled or date.today()).isoformat()))
+
+
+def mark_present(student_id, days):
+    with transaction() as cursor:
+        cursor.executemany('INSERT INTO attendance (student_id, date) VALUES (?, ?)',
+                           [(student_id, day.isoformat()) for day in days])
+
+
+def login(client, email):
+    """Log in and send the session token with the client's later requests"""
+    response = client.post('/login', json={'email': email, 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.get_json()['token']}"
+    return response.get_json()
+
+
+def weekdays(start, end):
+    """Every Monday-Friday from start to end"""
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)
+            if (start + timedelta(days=n)).weekday() < 5]
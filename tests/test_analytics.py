@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+import analytics
+from conftest import add_teacher, add_student, mark_present, weekdays
+
+TODAY = date.today()
+ENROLLED = TODAY - timedelta(days=28)
+
+
+def students_by_id(result):
+    return {student['student_id']: student for student in result['students']}
+
+
+def test_student_never_marked_present_is_at_risk(school):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id, enrolled=ENROLLED)
+
+    result = analytics.at_risk(teacher_id, refresh=True, today=TODAY)
+
+    school_days = len(weekdays(ENROLLED, TODAY - timedelta(days=1)))
+    student = students_by_id(result)['S01']
+    assert student['present'] == 0
+    assert student['school_days'] == school_days
+    assert student['current_streak'] == school_days
+    assert set(student['reasons']) == {'absence_streak', 'low_attendance', 'recent_drop'}
+
+
+def test_absences_before_first_mark_count(school):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id, enrolled=ENROLLED)
+    add_student('S02', teacher_id, enrolled=ENROLLED)
+    last_week = weekdays(TODAY - timedelta(days=7), TODAY - timedelta(days=1))
+    mark_present('S01', last_week)
+    mark_present('S02', weekdays(ENROLLED, TODAY - timedelta(days=1)))
+
+    students = students_by_id(analytics.at_risk(teacher_id, window=len(last_week), everyone=True,
+                                                 refresh=True, today=TODAY))
+
+    school_days = len(weekdays(ENROLLED, TODAY - timedelta(days=1)))
+    assert students['S01']['school_days'] == school_days
+    assert students['S01']['present'] == len(last_week)
+    assert students['S01']['longest_streak'] == school_days - len(last_week)
+    assert students['S01']['reasons'] == ['low_attendance']
+    assert not students['S02']['at_risk']
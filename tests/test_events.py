@@ -0,0 +1,119 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import events
+import status_routes
+from conftest import add_teacher, add_student, login
+from web import qr_signer
+
+
+def parse(chunk):
+    """(id, event name, data) of one encoded event"""
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+    return fields['id'], fields['event'], json.loads(fields['data'])
+
+
+@contextmanager
+def stream(client, token, last_event_id=None):
+    """Open /events and yield an iterator over its chunks, past the retry preamble"""
+    headers = {'Last-Event-ID': last_event_id} if last_event_id else {}
+    response = client.get(f'/events?token={token}', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.iter_encoded()
+    assert next(chunks).startswith(b'retry:')
+    try:
+        yield chunks
+    finally:
+        response.close()
+
+
+def session_token(client, email):
+    token = login(client, email)['token']
+    del client.environ_base['HTTP_AUTHORIZATION']
+    return token
+
+
+def mark(client, student_id):
+    response = client.post('/mark_attendance', json={'token': qr_signer.sign(student_id, windowed=False)})
+    assert response.status_code == 200, response.get_json()
+
+
+def test_mark_reaches_every_subscriber_of_its_topics(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+    add_student('S02', teacher_id)
+    teacher = session_token(client, 'teacher1a@example.com')
+    student = session_token(client, 's01@example.com')
+
+    with stream(client, teacher) as first, stream(client, teacher) as second, stream(client, student) as own:
+        assert events.broker.subscriber_count() >= 3
+        mark(client, 'S02')
+        started = time.perf_counter()
+        mark(client, 'S01')
+
+        for chunks in (first, second):
+            assert [parse(next(chunks))[2]['student_id'] for _ in range(2)] == ['S02', 'S01']
+        # The student's stream skips the classmate's mark
+        _, name, data = parse(next(own))
+        assert (name, data['student_id'], data['status']) == ('attendance', 'S01', 'present')
+        assert time.perf_counter() - started < 1
+
+
+def test_reconnect_replays_missed_events(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+    add_student('S02', teacher_id)
+    teacher = session_token(client, 'teacher1a@example.com')
+
+    with stream(client, teacher) as chunks:
+        mark(client, 'S01')
+        last_event_id, _, _ = parse(next(chunks))
+    mark(client, 'S02')
+
+    with stream(client, teacher, last_event_id) as chunks:
+        _, _, data = parse(next(chunks))
+        assert data['student_id'] == 'S02'
+
+
+def test_events_require_a_session(client):
+    assert client.get('/events').status_code == 401
+    assert client.get('/events?token=forged').status_code == 401
+
+
+def test_streams_past_the_limit_get_503(client, monkeypatch):
+    monkeypatch.setattr(status_routes, '_event_stream_slots', threading.BoundedSemaphore(1))
+    add_teacher()
+    teacher = session_token(client, 'teacher1a@example.com')
+
+    with stream(client, teacher):
+        response = client.get(f'/events?token={teacher}')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(status_routes.EVENT_STREAM_RETRY_SECONDS)
+
+    # Closing the stream frees its slot
+    with stream(client, teacher):
+        pass
+
+
+def test_relay_delivers_events_across_brokers(tmp_path):
+    path = str(tmp_path / 'event_relay.db')
+    first, second = events.Broker(path), events.Broker(path)
+    on_first = first.subscribe(['teacher:1'])
+    on_second = second.subscribe(['teacher:1'])
+
+    first.publish(['teacher:1'], 'attendance', {'student_id': 'S01'})
+    second.publish(['teacher:1'], 'attendance', {'student_id': 'S02'})
+
+    for subscription in (on_first, on_second):
+        received = []
+        while len(received) < 2:
+            batch = subscription.get(timeout=2)
+            assert batch
+            received += batch
+        assert [json.loads(event.data)['student_id'] for event in received] == ['S01', 'S02']
+    # Both number the events the same, so either can resume the other's stream
+    replayed = second.subscribe(['teacher:1'], received[0].id).get(timeout=0)
+    assert [event.id for event in replayed] == [received[1].id]
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+from datetime import date
+
+import jobs
+from conftest import add_teacher, add_student, login, mark_present
+from db import get_db
+
+
+def run_queued_job():
+    runner = jobs.JobRunner()
+    job = runner.claim()
+    runner.run(job)
+    return job
+
+
+def download_rows(client, job_id):
+    response = client.get(f'/jobs/{job_id}/download')
+    assert response.status_code == 200, response.get_json()
+    return list(csv.reader(io.StringIO(response.data.decode())))
+
+
+def test_export_job_stores_filters_not_sql(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id, '1', 'A')
+    add_student('S02', teacher_id, '1', 'B')
+    login(client, 'teacher1a@example.com')
+
+    response = client.get(f'/export/roster/{teacher_id}?section=A&async=1')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    cursor = get_db().cursor()
+    cursor.execute('SELECT params FROM jobs WHERE id = ?', (job_id,))
+    params = json.loads(cursor.fetchone()[0])
+    assert params['kind'] == 'roster'
+    assert params['filters'] == {'teacher_id': teacher_id, 'class': None, 'section': 'A'}
+    assert 'query' not in params and 'params' not in params
+
+    run_queued_job()
+    rows = download_rows(client, job_id)
+    assert [row[0] for row in rows] == ['student_id', 'S01']
+
+
+def test_export_job_with_unknown_kind_fails(client):
+    add_teacher()
+    job_id = jobs.enqueue('export', {'format': 'csv', 'filename': 'x.csv', 'kind': 'DROP TABLE students',
+                                     'filters': {}})
+
+    run_queued_job()
+
+    status = client.get(f'/jobs/{job_id}').get_json()
+    assert status['status'] == 'failed'
+    assert 'Unknown export' in status['error']
+
+
+def test_exports_require_a_teacher_session(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+
+    assert client.get('/export/attendance').status_code == 401
+    assert client.get(f'/export/roster/{teacher_id}').status_code == 401
+    login(client, 's01@example.com')
+    assert client.get('/export/attendance').status_code == 403
+    assert client.get(f'/export/roster/{teacher_id}').status_code == 403
+
+
+def test_teachers_export_only_their_own_students(client):
+    own = add_teacher()
+    other = add_teacher('Teacher 1B', 'teacher1b@example.com')
+    add_student('S01', own)
+    add_student('S02', other, section='B')
+    mark_present('S01', [date(2026, 3, 2)])
+    mark_present('S02', [date(2026, 3, 2)])
+    login(client, 'teacher1a@example.com')
+
+    response = client.get('/export/attendance?from=2026-03-01&to=2026-03-31')
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.data.decode())))
+    assert [row[1] for row in rows[1:]] == ['S01']
+    assert client.get(f'/export/attendance?teacher_id={other}').status_code == 403
+    assert client.get(f'/export/roster/{other}').status_code == 403
@@ -0,0 +1,72 @@
+import os
+import threading
+
+import qr_cache
+import qr_tokens
+from conftest import add_teacher, add_student, login
+from web import qr_signer
+
+# Hands out windowed codes, which the app only does when QR_TOKEN_WINDOW_SECONDS is set
+windowed_signer = qr_tokens.Signer({'0': b'secret'}, window_seconds=60)
+
+
+def cached_files(student_id):
+    return sorted(name for name in os.listdir(qr_cache.QR_DIR) if name.startswith(f'{student_id}_'))
+
+
+def test_printed_and_windowed_codes_keep_their_own_files(school):
+    printed = qr_signer.sign('S01', windowed=False)
+    windowed = windowed_signer.sign('S01')
+
+    qr_cache.get_qr('S01', printed)
+    qr_cache.get_qr('S01', windowed)
+    newer = qr_signer.sign('S01', now=10 ** 10, windowed=False)
+    qr_cache.get_qr('S01', newer)
+
+    assert cached_files('S01') == sorted([os.path.basename(qr_cache.cache_path('S01', windowed)),
+                                          os.path.basename(qr_cache.cache_path('S01', newer))])
+
+
+def test_file_removed_by_another_request_is_a_miss(school):
+    token = qr_signer.sign('S01', windowed=False)
+    png, key = qr_cache.get_qr('S01', token)
+    os.remove(qr_cache.cache_path('S01', token))
+
+    assert qr_cache.get_qr('S01', token) == (png, key)
+    assert qr_cache.get_many([('S01', token)]) == [png]
+
+
+def test_concurrent_renders_of_every_kind_succeed(school):
+    tokens = [qr_signer.sign('S01', now=day * 86400, windowed=False) for day in range(1, 9)]
+    tokens += [windowed_signer.sign('S01', now=n * 60) for n in range(1, 9)]
+    errors = []
+
+    def fetch(token):
+        try:
+            png, _ = qr_cache.get_qr('S01', token)
+            assert png.startswith(b'\x89PNG')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch, args=(token,)) for token in tokens * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # At most one file per kind is left (none if the last two writers pruned each other's)
+    kinds = [name.split('_')[1] for name in cached_files('S01')]
+    assert sorted(set(kinds)) == sorted(kinds)
+
+
+def test_qr_image_revalidates(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+    login(client, 'teacher1a@example.com')
+
+    response = client.get('/qr/S01.png')
+    assert response.status_code == 200
+    assert response.data.startswith(b'\x89PNG')
+    again = client.get('/qr/S01.png', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+
+import pytest
+
+import school_calendar
+from conftest import add_teacher, add_student, mark_present, login
+
+TODAY = date.today()
+# Two full weeks, Monday to Sunday, ending at least a week ago
+START = TODAY - timedelta(days=TODAY.weekday() + 21)
+END = START + timedelta(days=13)
+HOLIDAY = START + timedelta(days=2)
+EVERY_DAY = [START + timedelta(days=n) for n in range(14)]
+
+
+@pytest.fixture
+def calendar(client):
+    """A school holiday on the first Wednesday, and class 1-B taught Monday, Wednesday and Friday"""
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id, '1', 'A')
+    add_student('S02', teacher_id, '1', 'B')
+    login(client, 'teacher1a@example.com')
+    response = client.post('/calendar/holidays', json={'date': HOLIDAY.isoformat(), 'name': 'Founders day'})
+    assert response.status_code == 200
+    response = client.put('/calendar/schedule', json={'class': '1', 'section': 'B', 'weekdays': ['mon', 'wed', 'fri']})
+    assert response.status_code == 200
+    return client
+
+
+def report_range():
+    return f'from={START.isoformat()}&to={END.isoformat()}'
+
+
+def test_class_report_counts_school_days_only(calendar):
+    # Marks on weekends and the holiday (e.g. stray offline scans) are not school days
+    mark_present('S01', EVERY_DAY)
+
+    report = calendar.get(f'/class_report/1/A?{report_range()}').get_json()
+
+    school_days = [day.isoformat() for day in EVERY_DAY if day.weekday() < 5 and day != HOLIDAY]
+    assert [period['date'] for period in report['daily']] == school_days
+    assert (report['school_days'], report['present'], report['percentage']) == (9, 9, 100.0)
+
+
+def test_class_report_follows_class_schedule(calendar):
+    mark_present('S02', EVERY_DAY[:5])
+
+    report = calendar.get(f'/class_report/1/B?{report_range()}&granularity=monthly').get_json()
+
+    # Monday and Friday of the first week; Wednesday is the holiday
+    assert report['school_days'] == 5
+    assert report['present'] == 2
+    assert report['percentage'] == 40.0
+
+
+def test_student_report_counts_school_days_only(calendar):
+    mark_present('S02', EVERY_DAY)
+
+    report = calendar.get(f'/student_report/S02?{report_range()}').get_json()
+
+    assert (report['school_days'], report['present'], report['percentage']) == (5, 5, 100.0)
+    assert sum(month['school_days'] for month in report['monthly']) == 5
+
+
+def test_weekly_report_skips_days_off(calendar):
+    yesterday = TODAY - timedelta(days=1)
+    response = calendar.post('/calendar/holidays', json={'date': yesterday.isoformat(), 'name': 'Storm'})
+    assert response.status_code == 200
+    mark_present('S02', [TODAY - timedelta(days=n) for n in range(7)])
+
+    report = calendar.get('/weekly_report/S02').get_json()
+
+    expected = [TODAY - timedelta(days=n) for n in range(7)]
+    expected = [day.isoformat() for day in expected if day.weekday() in (0, 2, 4) and day != yesterday]
+    assert [day['date'] for day in report['weekly_attendance']] == expected
+    assert {day['status'] for day in report['weekly_attendance']} == {'present'}
+
+
+def test_reports_before_the_index_extend_it(calendar):
+    # Well before the start of last year, where the index starts in a new school
+    start = date(TODAY.year - 5, 3, 1)
+    end = date(TODAY.year - 5, 3, 31)
+    mark_present('S01', [start])
+
+    report = calendar.get(f'/class_report/1/A?from={start}&to={end}&granularity=monthly').get_json()
+
+    weekdays = [start + timedelta(days=n) for n in range(31) if (start + timedelta(days=n)).weekday() < 5]
+    assert (report['school_days'], report['present']) == (len(weekdays), 1)
+    response = calendar.get(f'/calendar?class=1&section=B&from={start}&to={end}')
+    assert response.get_json()['school_days'] == len([day for day in weekdays if day.weekday() in (0, 2, 4)])
+
+
+def test_reports_outside_the_calendar_are_rejected(calendar):
+    too_early = date(TODAY.year - school_calendar.CALENDAR_YEARS_BACK - 1, 12, 31)
+    too_late = school_calendar.horizon() + timedelta(days=1)
+
+    for query in (f'from={too_early}&to={TODAY}', f'from={TODAY}&to={too_late}'):
+        response = calendar.get(f'/student_report/S01?{query}')
+        assert response.status_code == 400
+        assert 'school days are only known' in response.get_json()['error']
@@ -0,0 +1,84 @@
+import io
+import os
+import json
+
+import jobs
+from conftest import add_teacher
+from db import get_db, transaction
+from migrations import migrate
+
+SHEET = 'name,email,class,section,roll_no\nAsha,asha@example.com,1,A,1\nRavi,ravi@example.com,1,A,2\n'
+
+
+def upload(client, teacher_id, data, filename='students.csv'):
+    response = client.post('/add_students_excel', data={'teacher_id': str(teacher_id),
+                                                        'file': (io.BytesIO(data.encode()), filename)})
+    assert response.status_code == 202, response.get_json()
+    return response.get_json()['job_id']
+
+
+def run_queued_job():
+    runner = jobs.JobRunner()
+    runner.run(runner.claim())
+
+
+def test_import_results_hold_no_passwords(client):
+    teacher_id = add_teacher()
+    job_id = upload(client, teacher_id, SHEET)
+
+    run_queued_job()
+
+    status = client.get(f'/jobs/{job_id}').get_json()
+    assert status['status'] == 'done'
+    assert [item['name'] for item in status['items']] == ['Asha', 'Ravi']
+    assert all('password' not in item and item['email_id'] for item in status['items'])
+    cursor = get_db().cursor()
+    cursor.execute('SELECT data FROM job_items')
+    assert not any('password' in json.loads(data) for (data,) in cursor.fetchall())
+    # The passwords still reach the students, by email
+    cursor.execute('SELECT body FROM email_queue')
+    assert all('Password: ' in body for (body,) in cursor.fetchall())
+
+
+def test_uploaded_sheet_is_removed_after_import(client):
+    teacher_id = add_teacher()
+    upload(client, teacher_id, SHEET)
+    assert len(os.listdir('student_sheets')) == 1
+
+    run_queued_job()
+
+    assert os.listdir('student_sheets') == []
+
+
+def test_unreadable_sheet_is_removed(client):
+    teacher_id = add_teacher()
+    job_id = upload(client, teacher_id, 'no,such,columns\n1,2,3\n')
+
+    run_queued_job()
+
+    assert client.get(f'/jobs/{job_id}').get_json()['status'] == 'failed'
+    assert os.listdir('student_sheets') == []
+
+
+def test_sheet_of_abandoned_job_is_removed(client):
+    teacher_id = add_teacher()
+    job_id = upload(client, teacher_id, SHEET)
+    with transaction() as cursor:
+        cursor.execute("UPDATE jobs SET status = 'running', attempts = ?, claimed_at = 0 WHERE id = ?",
+                       (jobs.MAX_ATTEMPTS, job_id))
+
+    assert jobs.JobRunner().claim() is None
+
+    assert client.get(f'/jobs/{job_id}').get_json()['status'] == 'failed'
+    assert os.listdir('student_sheets') == []
+
+
+def test_migration_removes_stored_passwords(school):
+    with transaction() as cursor:
+        cursor.execute("INSERT INTO jobs (id, kind, params) VALUES ('j1', 'import_students', '{}')")
+        cursor.execute('''INSERT INTO job_items (job_id, seq, ok, data) VALUES ('j1', 1, 1, ?)''',
+                       (json.dumps({'student_id': 'S01', 'password': 'secret1'}),))
+        cursor.execute('PRAGMA user_version = 12')
+        migrate(cursor)
+        cursor.execute('SELECT data FROM job_items')
+        assert json.loads(cursor.fetchone()[0]) == {'student_id': 'S01'}
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from conftest import add_teacher, add_student
+from db import get_db
+from web import qr_signer
+
+
+def attendance(student_id):
+    cursor = get_db().cursor()
+    cursor.execute('SELECT date FROM attendance WHERE student_id = ? ORDER BY date', (student_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def scan(client_id, student_id, scanned_at):
+    # A printed code as issued on the day of the scan
+    return {'client_id': client_id, 'token': qr_signer.sign(student_id, scanned_at.timestamp(), windowed=False),
+            'scanned_at': scanned_at.isoformat(timespec='seconds')}
+
+
+def test_sync_replay_returns_first_result(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+    add_student('S02', teacher_id)
+    yesterday = datetime.now() - timedelta(days=1)
+    scans = [scan('phone-1', 'S01', yesterday), scan('phone-2', 'S02', yesterday)]
+
+    first = client.post('/sync/attendance', json={'scans': scans}).get_json()
+    replay = client.post('/sync/attendance', json={'scans': scans}).get_json()
+
+    assert first['summary'] == {'marked': 2}
+    assert [result['status'] for result in replay['results']] == ['marked', 'marked']
+    assert all(result['replayed'] for result in replay['results'])
+    assert attendance('S01') == attendance('S02') == [yesterday.date().isoformat()]
+
+
+def test_sync_repeated_and_new_scan_ids(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+    now = datetime.now()
+    repeated = scan('phone-1', 'S01', now)
+
+    response = client.post('/sync/attendance', json={'scans': [repeated, repeated]}).get_json()
+    # A second scan of the same student that day under a new ID is recorded as already marked
+    again = client.post('/sync/attendance', json={'scans': [scan('phone-2', 'S01', now)]}).get_json()
+
+    assert [result['status'] for result in response['results']] == ['marked', 'marked']
+    assert again['results'][0]['status'] == 'already_marked'
+    assert 'replayed' not in again['results'][0]
+    assert attendance('S01') == [now.date().isoformat()]
+
+
+def test_sync_rejects_scans_without_client_id(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+    scans = [{'token': qr_signer.sign('S01', windowed=False)}]
+
+    response = client.post('/sync/attendance', json={'scans': scans})
+
+    assert response.status_code == 400
+    assert attendance('S01') == []
+
+
+def test_batch_replay_marks_once(client):
+    teacher_id = add_teacher()
+    add_student('S01', teacher_id)
+    add_student('S02', teacher_id)
+    batch = {'scans': [{'token': qr_signer.sign(student_id, windowed=False)} for student_id in ('S01', 'S02')]}
+
+    first = client.post('/mark_attendance_batch', json=batch).get_json()
+    replay = client.post('/mark_attendance_batch', json=batch).get_json()
+
+    assert first['summary'] == {'marked': 2}
+    assert replay['summary'] == {'already_marked': 2}
+    assert attendance('S01') == attendance('S02') == [datetime.now().date().isoformat()]
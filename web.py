@@ -0,0 +1,125 @@
+"""Helpers shared by the route blueprints.
+
+Session lookup, the QR token signer, background-job responses and the
+details generated and emailed for new students. Kept free of Flask app
+state so the ASGI app can use them too.
+"""
+import os
+import secrets
+import string
+import logging
+from datetime import datetime
+
+from flask import request, jsonify
+
+import accounts
+import db
+import qr_tokens
+import school_calendar
+from mailer import enqueue_email
+
+# Signs session tokens and is the Flask secret key
+SECRET_KEY = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+
+# Signs the compact tokens encoded in student QR codes
+qr_signer = qr_tokens.Signer.from_env(SECRET_KEY)
+
+# Reverse proxies in front of the app (Replit's, ngrok) whose X-Forwarded-*
+# headers are trusted; 0 when clients connect to the server directly
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 1))
+
+# Accept scans carrying a bare student_id (old JSON QR codes, manual entry)
+# while old printed codes are replaced; each one is logged and counted in
+# app_unsigned_scans_total so the switch can be turned off again
+ALLOW_UNSIGNED_SCANS = os.environ.get('ALLOW_UNSIGNED_SCANS', 'false').lower() == 'true'
+
+def generate_student_id():
+    """Generate a unique student ID"""
+    return ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
+
+def generate_password():
+    """Generate a random password for students"""
+    return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(8))
+
+def send_email(to_email, subject, body):
+    """Queue an email to a student; returns the queue ID or None"""
+    try:
+        return enqueue_email(to_email, subject, body)
+    except Exception as e:
+        logging.error(f"Failed to queue email: {e}")
+        return None
+
+def account_email_body(name, student_id, password, class_name, section, roll_no):
+    """Build the account details email sent to a new student"""
+    return f"""
+        Dear {name},
+        
+        Your student account has been created successfully.
+        
+        Student ID: {student_id}
+        Password: {password}
+        Class: {class_name}
+        Section: {section}
+        Roll No: {roll_no}
+        
+        Please login to access your dashboard.
+        
+        Best regards,
+        School Management System
+        """
+
+def current_account():
+    """Return {role, id} from the request's bearer token, or None"""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return accounts.verify_token(SECRET_KEY, header[len('Bearer '):])
+    # EventSource cannot set headers, so /events passes the token in the query
+    token = request.args.get('token')
+    return accounts.verify_token(SECRET_KEY, token) if token else None
+
+def forwarded_client(forwarded_for, peer):
+    """Client address as ProxyFix resolves it: the entry TRUSTED_PROXY_HOPS from the end of X-Forwarded-For"""
+    hops = [value.strip() for value in (forwarded_for or '').split(',') if value.strip()]
+    if not TRUSTED_PROXY_HOPS or len(hops) < TRUSTED_PROXY_HOPS:
+        return peer
+    return hops[-TRUSTED_PROXY_HOPS]
+
+def may_view_student(session_account, student_id):
+    """Teachers may see any student of their school; students only themselves"""
+    return session_account['role'] == 'teacher' or session_account['id'] == student_id
+
+def resolve_tenant(session_account, requested):
+    """School for a request: the session's, else the requested one, else the default"""
+    if session_account:
+        tenant = session_account['tenant']
+    else:
+        tenant = requested or db.DEFAULT_TENANT
+    if tenant != db.DEFAULT_TENANT and not db.tenant_exists(tenant):
+        raise db.UnknownTenant(tenant)
+    return tenant
+
+def job_accepted(job_id):
+    """202 response pointing the client at a queued job"""
+    response = jsonify({'message': 'Job queued', 'job_id': job_id, 'status_url': f'/jobs/{job_id}'})
+    response.headers['Location'] = f'/jobs/{job_id}'
+    return response, 202
+
+def wants_job():
+    """Whether the client asked for a background job (?async=1) instead of waiting"""
+    return request.args.get('async', '').lower() in ('1', 'true')
+
+def parse_report_range(default_start):
+    """Read ?from=&to= ISO dates, raising ValueError when malformed"""
+    end = request.args.get('to')
+    end = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.now().date()
+    start = request.args.get('from')
+    start = datetime.strptime(start, '%Y-%m-%d').date() if start else default_start(end)
+    if start > end:
+        raise ValueError('from must not be after to')
+    return start, end
+
+def parse_school_day_range(default_start):
+    """parse_report_range() for reports that count school days, extending the index to cover it"""
+    start, end = parse_report_range(default_start)
+    school_calendar.ensure_covers(start, end)
+    return start, end
@@ -0,0 +1,58 @@
+"""Shared process pool for CPU-bound work (password hashing, QR rendering).
+
+The pool is created lazily on first use and recreated after a fork, so
+gunicorn workers each get their own and importing this module stays cheap.
+Its processes come from a forkserver rather than a fork of the worker: by
+the time the pool starts, the worker runs the log listener, mail dispatcher
+and job runner threads, and a forked child could inherit a lock one of them
+held (metrics, logging) and deadlock on it.
+
+The forkserver preloads PRELOAD_MODULES, which hold the functions the pool
+runs and start nothing on import, so each new process starts from a copy
+of them. It still re-imports the script that started the server (``python
+app.py``, ``asgi.py``, ...) as ``__mp_main__``, and that pulls in the app;
+``starting_child_process()`` lets the app skip its background threads then.
+"""
+import os
+import sys
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+POOL_WORKERS = int(os.environ.get('PROCESS_POOL_WORKERS', os.cpu_count() or 1))
+
+# Modules whose functions run in the pool: password hashing and QR rendering
+PRELOAD_MODULES = ['accounts', 'qr_cache']
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+
+def get_process_pool():
+    """Return this process's shared ProcessPoolExecutor"""
+    global _pool, _pool_pid
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(PRELOAD_MODULES)
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=context)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def starting_child_process():
+    """True while a new pool process re-imports the parent's main script"""
+    # multiprocessing makes __mp_main__ an alias of __main__ on import, and
+    # again in a child once the re-import is done; only during it do they
+    # differ. parent_process() is still None then, so it can't tell
+    return sys.modules.get('__mp_main__') is not sys.modules.get('__main__')
+
+
+def parallel_map(fn, items, threshold=32):
+    """Map fn over items, in the process pool when there are enough of them"""
+    items = list(items)
+    if len(items) < threshold or POOL_WORKERS < 2:
+        return [fn(item) for item in items]
+    chunksize = max(1, len(items) // (POOL_WORKERS * 4))
+    return list(get_process_pool().map(fn, items, chunksize=chunksize))